@@ -0,0 +1,257 @@
+# Performance baseline of the tax simulator: per-household latency, cost of each stage, batch throughput and peak
+# memory, on reproducible synthetic households. Results are saved as JSON, and can be compared with a previous run:
+#
+#   python benchmarks/benchmark.py -o before.json
+#   (change something)
+#   python benchmarks/benchmark.py -o after.json --compare before.json
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Optional
+
+# benchmark the working tree, not an installed version
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from easyfrenchtax import TaxField, TaxSimulator  # noqa: E402
+from easyfrenchtax.tax_simulator import stages  # noqa: E402
+
+# metrics where a lower value is better, compared between runs (the others are better when higher)
+LOWER_IS_BETTER = ("latency", "stage", "memory")
+# metrics whose regressions fail a comparison: the median and best latencies, and the cost of each stage. The others
+# are only reported: the tail of the latencies (mean, p95, max) depends on a few runs perturbed by the machine
+# (scheduling, GC...), and so do the throughputs: too noisy to fail on.
+GATED = ("latency_median_us", "latency_best_us", "stage_")
+
+
+# A reproducible population of households, covering: married or single, 0 to 4 children (with daycare fees for the
+# young ones), each rental regime (simplified, profit with previous deficits, deficit), furnished rentals, stock
+# options/RSU gains, capital gains, interests, PER transfers, donations, SME subscriptions and home services.
+def synthetic_households(n: int, seed: int = 0) -> list[dict[TaxField, Any]]:
+    rng = random.Random(seed)
+    households = []
+    for _ in range(n):
+        year = rng.choice([2021, 2022, 2023, 2024, 2025])
+        married = rng.random() < 0.6
+        nb_children = rng.choice([0, 0, 1, 2, 2, 3, 4])
+        household = {
+            TaxField.MARRIED: married,
+            TaxField.NB_CHILDREN: nb_children,
+            TaxField.SALARY_1_1AJ: rng.randrange(15000, 250000),
+        }
+        if married:
+            household[TaxField.SALARY_2_1BJ] = rng.randrange(0, 120000)
+        daycare_fields = [TaxField.CHILDREN_DAYCARE_FEES_7GA, TaxField.CHILDREN_DAYCARE_FEES_7GB,
+                          TaxField.CHILDREN_DAYCARE_FEES_7GC, TaxField.CHILDREN_DAYCARE_FEES_7GD]
+        birthyear_fields = [TaxField.CHILD_1_BIRTHYEAR, TaxField.CHILD_2_BIRTHYEAR, TaxField.CHILD_3_BIRTHYEAR,
+                            TaxField.CHILD_4_BIRTHYEAR]
+        nb_young_children = 0
+        for child in range(nb_children):
+            birthyear = rng.randrange(year - 18, year)
+            household[birthyear_fields[child]] = birthyear
+            if year - 1 - birthyear <= 6:
+                household[daycare_fields[nb_young_children]] = rng.randrange(500, 4000)
+                nb_young_children += 1
+        rental_regime = rng.choice(["none", "none", "simplified", "profit", "deficit"])
+        if rental_regime == "simplified":
+            household[TaxField.SIMPLIFIED_RENTAL_INCOME_4BE] = rng.randrange(1000, 15000)
+        elif rental_regime == "profit":
+            household[TaxField.REAL_RENTAL_PROFIT_4BA] = rng.randrange(1000, 30000)
+            if rng.random() < 0.5:
+                household[TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD] = rng.randrange(500, 20000)
+        elif rental_regime == "deficit":
+            household[TaxField.RENTAL_INCOME_GLOBAL_DEFICIT_4BC] = rng.randrange(0, 10700)
+            household[TaxField.REAL_RENTAL_INCOME_DEFICIT_4BB] = rng.randrange(0, 15000)
+        if rng.random() < 0.2:
+            household[TaxField.LMNP_MICRO_INCOME_1_5ND] = rng.randrange(2000, 30000)
+        if rng.random() < 0.3:
+            household[TaxField.EXERCISE_GAIN_1_1TT] = rng.randrange(1000, 50000)
+            household[TaxField.TAXABLE_ACQUISITION_GAIN_1TZ] = rng.randrange(1000, 60000)
+            household[TaxField.ACQUISITION_GAIN_50P_REBATES_1WZ] = rng.randrange(0, 20000)
+            household[TaxField.CAPITAL_GAIN_3VG] = rng.randrange(0, 40000)
+        if rng.random() < 0.3:
+            household[TaxField.FIXED_INCOME_INTERESTS_2TR] = round(rng.uniform(10, 3000), 2)
+        if rng.random() < 0.3:
+            household[TaxField.PER_TRANSFERS_1_6NS] = rng.randrange(1000, 20000)
+        if rng.random() < 0.4:
+            household[TaxField.CHARITY_DONATION_7UD] = rng.randrange(50, 2500)
+            household[TaxField.CHARITY_DONATION_7UF] = rng.randrange(0, 5000)
+        if rng.random() < 0.1:
+            household[TaxField.SME_CAPITAL_SUBSCRIPTION_7CH] = rng.randrange(1000, 60000)
+        if rng.random() < 0.3:
+            household[TaxField.HOME_SERVICES_7DB] = rng.randrange(500, 20000)
+        households.append({TaxField.YEAR: year, **household})
+    return households
+
+
+def _split_year(household: dict[TaxField, Any]) -> tuple[int, dict[TaxField, Any]]:
+    household = dict(household)
+    return household.pop(TaxField.YEAR), household
+
+
+def measure_latency(households: list[dict[TaxField, Any]], repeat: int) -> dict[str, float]:
+    # microseconds per TaxSimulator, best of the repeats for each household (the least perturbed run)
+    inputs = [_split_year(household) for household in households]
+    timings = []
+    for year, household in inputs:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            TaxSimulator(year, household)
+            best = min(best, time.perf_counter() - start)
+        timings.append(best * 1e6)
+    timings.sort()
+    return {
+        "latency_best_us": timings[0],
+        "latency_mean_us": statistics.fmean(timings),
+        "latency_median_us": timings[len(timings) // 2],
+        "latency_p95_us": timings[int(len(timings) * 0.95)],
+        "latency_max_us": timings[-1],
+    }
+
+
+def measure_stages(households: list[dict[TaxField, Any]]) -> dict[str, float]:
+    # mean microseconds per household spent in each stage, run in pipeline order on lazy simulations
+    totals = {stage.method: 0.0 for stage in stages}
+    for year, household in map(_split_year, households):
+        tax_sim = TaxSimulator(year, household, lazy=True)
+        for stage in stages:
+            method = getattr(tax_sim, stage.method)
+            start = time.perf_counter()
+            method()
+            totals[stage.method] += time.perf_counter() - start
+    return {f"stage_{method}_us": total / len(households) * 1e6 for method, total in totals.items()}
+
+
+def measure_throughput(households: list[dict[TaxField, Any]]) -> dict[str, float]:
+    # households per second: one simulation after the other, and in one vectorized batch (if NumPy is installed)
+    inputs = [_split_year(household) for household in households]
+    start = time.perf_counter()
+    for year, household in inputs:
+        TaxSimulator(year, household)
+    results = {"throughput_scalar_per_s": len(inputs) / (time.perf_counter() - start)}
+    try:
+        import numpy as np
+        from easyfrenchtax.batch_simulator import OPTIONAL_FIELDS, BatchTaxSimulator
+    except ImportError:
+        return results
+    by_year = {}
+    for year, household in inputs:
+        by_year.setdefault(year, []).append(household)
+    columns_by_year = {}
+    for year, year_households in by_year.items():
+        fields = set().union(*year_households)
+        columns = {}
+        for field in fields:
+            values = [h.get(field, np.nan) for h in year_households]
+            if all(field in h for h in year_households):
+                columns[field] = np.array(values)
+            else:
+                # absent values are NaN for optional fields, zeros (like a defaultdict) for the others
+                column = np.array(values, dtype=float)
+                columns[field] = column if field in OPTIONAL_FIELDS else np.nan_to_num(column)
+        columns_by_year[year] = columns
+    start = time.perf_counter()
+    for year, columns in columns_by_year.items():
+        BatchTaxSimulator(year, columns)
+    results["throughput_batch_per_s"] = len(inputs) / (time.perf_counter() - start)
+    return results
+
+
+def measure_memory(households: list[dict[TaxField, Any]]) -> dict[str, float]:
+    # peak bytes per household while keeping every simulation (default and compact state)
+    inputs = [_split_year(household) for household in households]
+    results = {}
+    for name, compact in [("memory_per_simulation_bytes", False), ("memory_per_compact_simulation_bytes", True)]:
+        tracemalloc.start()
+        simulations = [TaxSimulator(year, household, compact=compact) for year, household in inputs]
+        results[name] = tracemalloc.get_traced_memory()[1] / len(simulations)
+        tracemalloc.stop()
+        del simulations
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(n: int, seed: int, repeat: int) -> dict[str, Any]:
+    households = synthetic_households(n, seed)
+    for year, household in map(_split_year, households[:100]):  # warm-up (compiled tables, caches)
+        TaxSimulator(year, household)
+    metrics = {}
+    metrics.update(measure_latency(households, repeat))
+    metrics.update(measure_stages(households))
+    metrics.update(measure_throughput(households))
+    metrics.update(measure_memory(households))
+    return {
+        "metadata": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "households": n,
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "metrics": metrics,
+    }
+
+
+# Compares metrics with a previous run, returns those degraded by more than the threshold (as a ratio, e.g. 0.1 for
+# 10%), among the GATED ones (the others are only printed)
+def compare(results: dict[str, Any], previous: dict[str, Any], threshold: float) -> list[str]:
+    regressions = []
+    for name, value in results["metrics"].items():
+        before = previous["metrics"].get(name)
+        if not before:
+            continue
+        ratio = value / before
+        lower_is_better = name.startswith(LOWER_IS_BETTER)
+        degraded = ratio > 1 + threshold if lower_is_better else ratio < 1 - threshold
+        gated = name.startswith(GATED)
+        status = ("  REGRESSION" if gated else "  (not gated)") if degraded else ""
+        print(f"{name:60} {before:14.2f} -> {value:14.2f}  ({ratio - 1:+.1%}){status}")
+        if degraded and gated:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmarks the tax simulator on synthetic households.")
+    parser.add_argument("-n", "--households", type=int, default=2000, help="number of synthetic households")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic households")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per household for the latency (best is kept)")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="JSON file for the results")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.households, args.seed, args.repeat)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        regressions = compare(results, previous, args.threshold)
+        if regressions:
+            sys.exit(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+    else:
+        for name, value in results["metrics"].items():
+            print(f"{name:60} {value:14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,24 @@
-from .stock_helper import StockHelper, RsuTaxScheme, StockType
-from .tax_simulator import TaxSimulator, TaxField, TaxInfoFlag
\ No newline at end of file
+# The modules are only imported when one of their names is used (PEP 562): a process only simulating taxes doesn't
+# load the stock helper and its dependencies
+_exports = {
+    "StockHelper": "stock_helper",
+    "RsuTaxScheme": "stock_helper",
+    "StockType": "stock_helper",
+    "TaxSimulator": "tax_simulator",
+    "TaxField": "tax_simulator",
+    "TaxInfoFlag": "tax_simulator",
+}
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name in _exports:
+        from importlib import import_module
+        value = getattr(import_module(f".{_exports[name]}", __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,193 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator, Optional, TextIO, Union
+
+from .result_store import ResultStore
+from .tax_simulator import TaxField, TaxSimulator, income_tax_scales, year_tax_parameters
+
+# How flags are written: as their texts, as their numbers (the fields of FlagValue), or not at all (then not even kept by
+# the simulations)
+FLAGS_MODES = ("text", "values", "none")
+
+# Household shares for which the income tax tables are compiled when a worker starts (others are compiled on demand)
+WARM_HOUSEHOLD_SHARES = [1 + n / 2 for n in range(12)]
+
+# A record of the input file that could not be read as a household: its simulation gives an error result, in its place
+InvalidRecord = namedtuple("InvalidRecord", ["error"])
+
+
+def _parse_field(key: str) -> TaxField:
+    # records are keyed by TaxField values (e.g. "salary_1_1AJ"), names (e.g. "SALARY_1_1AJ") are accepted too
+    try:
+        return TaxField(key)
+    except ValueError:
+        try:
+            return TaxField[key]
+        except KeyError:
+            raise Exception(f"Unknown tax field: {key}") from None
+
+
+def _parse_csv_value(key: str, value: str) -> Any:
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        raise Exception(f"Invalid value for {key}: '{value}'") from None
+
+
+def parse_record(record: dict[str, Any], csv_values: bool = False) -> dict[TaxField, Any]:
+    # Empty CSV cells and JSON nulls are absent fields
+    household = {}
+    for key, value in record.items():
+        if value is None or value == "":
+            continue
+        household[_parse_field(key)] = _parse_csv_value(key, value) if csv_values else value
+    return household
+
+
+# Reads households from a CSV file (header with the fields) or a JSONL file (one JSON object per line), according to
+# the extension of the file. A record that can't be read (invalid value, unknown field...) is an InvalidRecord, the
+# next ones are still read.
+def read_households(path: str) -> Iterator[Union[dict[TaxField, Any], InvalidRecord]]:
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(f)
+            for record in reader:
+                try:
+                    yield parse_record(record, csv_values=True)
+                except Exception as e:
+                    yield InvalidRecord(f"Line {reader.line_num}: {e}")
+        else:
+            for line_num, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield parse_record(json.loads(line))
+                    except Exception as e:
+                        yield InvalidRecord(f"Line {line_num}: {e}")
+
+
+def _warm_up():
+    # runs once per worker process: compiles the income tax scales of the declared years, with their tables for the
+    # usual household shares
+    for year in year_tax_parameters:
+        for household_shares in WARM_HOUSEHOLD_SHARES:
+            income_tax_scales[year].table(household_shares)
+
+
+# Simulates one household, the statement year being its YEAR field (or default_year). The result has the state
+# (keyed by field values) and the flags (keyed by flag names, see FLAGS_MODES), or the error if the simulation raised
+# (or if the household is an InvalidRecord). With a store, results already stored are not computed again.
+def simulate_household(household: Union[dict[TaxField, Any], InvalidRecord], default_year: Optional[int] = None,
+                       flags: str = "text", store: Optional[ResultStore] = None) -> dict[str, Any]:
+    if isinstance(household, InvalidRecord):
+        return {"error": household.error}
+    household = dict(household)
+    year = household.pop(TaxField.YEAR, default_year)
+    if year is None:
+        return {"error": "No statement year (missing 'year' field)"}
+    try:
+        if store is None:
+            tax_sim = TaxSimulator(year, household, flags=flags != "none")
+        else:
+            tax_sim = store.simulate(year, household)
+    except Exception as e:
+        return {"error": str(e)}
+    result = {"state": {field.value: value for field, value in tax_sim.state.items()}}
+    if flags == "text":
+        result["flags"] = {flag.name: text for flag, text in tax_sim.flags.items()}
+    elif flags == "values":
+        result["flags"] = {flag.name: flag_value._asdict() for flag, flag_value in tax_sim.flags.records.items()}
+    return result
+
+
+def _simulate_chunk(households: list[dict[TaxField, Any]], default_year: Optional[int], flags: str = "text",
+                    store: Optional[ResultStore] = None) -> list[dict[str, Any]]:
+    return [simulate_household(household, default_year, flags, store) for household in households]
+
+
+def _chunks(households: Iterable[dict[TaxField, Any]], chunk_size: int) -> Iterator[list[dict[TaxField, Any]]]:
+    chunk = []
+    for household in households:
+        chunk.append(household)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Maps simulate_chunk (a picklable function of a list of households) over the households, by chunks, across a pool of
+# worker processes (one per CPU by default). Unlike Executor.map, the input is consumed as results are consumed: at most
+# 2 chunks per worker are in flight, so memory stays bounded whatever the number of households. Results come in input
+# order.
+def map_chunks(simulate_chunk: Callable[[list], list], households: Iterable[Any], workers: Optional[int] = None,
+               chunk_size: int = 256) -> Iterator[Any]:
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_up) as executor:
+        in_flight = deque()
+        for chunk in _chunks(households, chunk_size):
+            if len(in_flight) >= 2 * workers:
+                yield from in_flight.popleft().result()
+            in_flight.append(executor.submit(simulate_chunk, chunk))
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+# Simulates households across a pool of worker processes, sending them by chunks to limit the inter-process overhead.
+# Results come in input order. With workers=1, everything runs in the current process. With a store (see ResultStore),
+# shared by all the workers, only the households not simulated before are computed.
+def run_batch(households: Iterable[dict[TaxField, Any]], workers: Optional[int] = None, chunk_size: int = 256,
+              default_year: Optional[int] = None, flags: str = "text",
+              store: Optional[ResultStore] = None) -> Iterator[dict[str, Any]]:
+    if flags not in FLAGS_MODES:
+        raise Exception(f"Unknown flags mode '{flags}' (expected one of {', '.join(FLAGS_MODES)})")
+    if workers == 1:
+        for household in households:
+            yield simulate_household(household, default_year, flags, store)
+        return
+    yield from map_chunks(partial(_simulate_chunk, default_year=default_year, flags=flags, store=store), households,
+                          workers, chunk_size)
+
+
+def write_results(results: Iterable[dict[str, Any]], out: TextIO):
+    for result in results:
+        out.write(json.dumps(result))
+        out.write("\n")
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Simulates the taxes of households read from a CSV or JSONL file, "
+                                                 "writes their state and flags as JSONL, in input order.")
+    parser.add_argument("input", help="CSV (header with the tax fields) or JSONL file of households")
+    parser.add_argument("-o", "--output", help="output JSONL file (default: standard output)")
+    parser.add_argument("-y", "--year", type=int, help="statement year of the households without a 'year' field")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=256, help="households sent at once to a worker")
+    parser.add_argument("--flags", choices=FLAGS_MODES, default="text",
+                        help="write the flags as texts, as numbers, or not at all")
+    parser.add_argument("--store", help="SQLite file of the results of previous runs, not simulated again")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store) if args.store else None
+    results = run_batch(read_households(args.input), workers=args.workers, chunk_size=args.chunk_size,
+                        default_year=args.year, flags=args.flags, store=store)
+    if args.output:
+        with open(args.output, "w") as out:
+            write_results(results, out)
+    else:
+        write_results(results, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+from collections import defaultdict, namedtuple
+from typing import Any, Callable, Union
+
+import numpy as np
+
+from .tax_simulator import FlagValue, IncomeTaxScale, TaxField, TaxInfoFlag, TaxParameters, flag_formats, \
+    format_thousands, income_tax_scales, tax_rules
+
+# A flag of the batch simulator: the rows where it is set, and a function rendering its text for a given row (with the
+# flag_formats of the scalar simulator). Texts are only formatted when a row is extracted, batch callers never pay for
+# the f-strings of the scalar simulator.
+BatchFlag = namedtuple("BatchFlag", ["mask", "render"])
+
+# These inputs are checked for presence (not only for their value) by the scalar simulator. In a batch, a row "does not
+# have" such a field when the value is NaN (float columns) or masked (numpy masked arrays).
+OPTIONAL_FIELDS = [
+    TaxField.NB_CHILDREN_LT_6YO,
+    TaxField.CHILD_1_BIRTHYEAR,
+    TaxField.CHILD_2_BIRTHYEAR,
+    TaxField.CHILD_3_BIRTHYEAR,
+    TaxField.CHILD_4_BIRTHYEAR,
+    TaxField.CHILD_5_BIRTHYEAR,
+    TaxField.CHILD_6_BIRTHYEAR,
+    TaxField.CHILDREN_DAYCARE_FEES_7GA,
+    TaxField.CHILDREN_DAYCARE_FEES_7GB,
+    TaxField.CHILDREN_DAYCARE_FEES_7GC,
+    TaxField.CHILDREN_DAYCARE_FEES_7GD,
+    TaxField.CHILDREN_DAYCARE_FEES_7GE,
+    TaxField.CHILDREN_DAYCARE_FEES_7GF,
+    TaxField.CHILDREN_DAYCARE_FEES_7GG,
+]
+
+
+def _two_product(a: np.ndarray, b: float):
+    # Exact product of two floats as an unevaluated sum p + err (Dekker's algorithm with Veltkamp splitting)
+    p = a * b
+    split = 134217729.0  # 2**27 + 1
+    t = split * a
+    a_hi = t - (t - a)
+    a_lo = a - a_hi
+    t = split * b
+    b_hi = t - (t - b)
+    b_lo = b - b_hi
+    err = ((a_hi * b_hi - p) + a_hi * b_lo + a_lo * b_hi) + a_lo * b_lo
+    return p, err
+
+
+def tax_round_array(v: Any, places: int = 0) -> np.ndarray:
+    # vectorized tax_round: half up (away from zero) on the exact binary value of each float, like Decimal.quantize
+    v = np.asarray(v, dtype=float)
+    magnitude = np.abs(v)
+    if places:
+        scaled, err = _two_product(magnitude, float(10 ** places))
+    else:
+        scaled, err = magnitude, 0.0
+    floor = np.floor(scaled)
+    # (scaled - floor) is exact, so is the comparison of the fractional part with one half once the error is accounted
+    rounded = floor + ((scaled - floor - 0.5) >= -err)
+    if places:
+        rounded = rounded / 10 ** places
+    return np.copysign(rounded, v)
+
+
+def _as_column(values: Any, size: int) -> tuple[np.ndarray, np.ndarray]:
+    # returns the values of a column, and the mask of rows where the field is actually provided
+    if np.ma.isMaskedArray(values):
+        present = ~np.ma.getmaskarray(values)
+        values = values.filled(0)
+    else:
+        values = np.asarray(values)
+        present = np.ones(values.shape, dtype=bool)
+        if values.dtype.kind == "f":
+            present = ~np.isnan(values)
+            if not present.all():
+                values = np.where(present, values, 0)
+    if values.ndim == 0:
+        values = np.full(size, values.item())
+        present = np.full(size, bool(present))
+    return values, present
+
+
+class BatchTaxSimulator:
+    parameters: TaxParameters
+    income_tax_scale: IncomeTaxScale
+    size: int
+    state: dict[TaxField, np.ndarray]
+    flags: dict[TaxInfoFlag, BatchFlag]
+    marginal_tax_rate: np.ndarray  # numeric counterpart of the MARGINAL_TAX_RATE flag
+
+    # Runs the same stages as TaxSimulator, over whole columns of households at once. Inputs are either a dictionary
+    # {TaxField: array} (scalars are broadcast to all rows), or a numpy structured array whose field names are the
+    # TaxField values. Integer columns should be given an integer dtype: like in the scalar simulator, the int/float
+    # nature of inputs shows in the flags texts.
+    def __init__(self, statement_year: int, tax_input: Union[dict[TaxField, Any], np.ndarray]):
+        self.income_tax_scale = income_tax_scales[statement_year]
+        self.parameters = self.income_tax_scale.parameters
+        if isinstance(tax_input, np.ndarray) and tax_input.dtype.names:
+            tax_input = {TaxField(name): tax_input[name] for name in tax_input.dtype.names}
+        sizes = {np.size(v) for v in tax_input.values() if np.ndim(v) > 0}
+        if len(sizes) > 1:
+            raise Exception(f"All input columns must have the same length (got {sorted(sizes)})")
+        self.size = sizes.pop() if sizes else 1
+        self.state = {}
+        self._present = {}
+        for field, values in tax_input.items():
+            self.state[field], present = _as_column(values, self.size)
+            if not present.all():
+                if field not in OPTIONAL_FIELDS:
+                    raise Exception(f"Missing values are only supported for optional fields, not {field.name}")
+                self._present[field] = present
+        self.flags = {}
+        self.state[TaxField.YEAR] = np.full(self.size, statement_year)
+        self.process_family_information()
+        self.compute_rental_income()
+        self.compute_furnished_rentals()
+        self.compute_net_income()
+        self.compute_taxable_income()
+        self.compute_flat_rate_taxes()
+        self.compute_reference_fiscal_income()
+        self.compute_tax_before_reductions()
+        self.compute_tax_reductions()
+        self.compute_tax_credits()
+        self.compute_capital_taxes()
+        self.compute_net_taxes()
+        self.compute_social_taxes()
+
+    def __len__(self):
+        return self.size
+
+    # ----- column helpers -----
+
+    def _get(self, field: TaxField) -> np.ndarray:
+        # equivalent to reading a defaultdict(int): absent columns are zeros
+        if field not in self.state:
+            return np.zeros(self.size, dtype=int)
+        return self.state[field]
+
+    def _has(self, field: TaxField) -> np.ndarray:
+        # equivalent to "field in state" for each row
+        if field not in self.state:
+            return np.zeros(self.size, dtype=bool)
+        return self._present.get(field, np.ones(self.size, dtype=bool))
+
+    def _flag(self, flag: TaxInfoFlag, mask: Any, flag_value: Callable[[int], FlagValue]):
+        # flag_value gives the FlagValue of a row, with the same int/float values as in the scalar simulator
+        render = flag_formats[flag]
+        self.flags[flag] = BatchFlag(mask=np.broadcast_to(mask, (self.size,)), render=lambda i: render(flag_value(i)))
+
+    def _raise_for(self, mask: np.ndarray, message: str):
+        if mask.any():
+            raise Exception(f"Row {int(np.argmax(mask))}: {message}")
+
+    # ----- rows extraction -----
+
+    def row_state(self, i: int) -> dict[TaxField, Any]:
+        state = defaultdict(int)
+        for field, values in self.state.items():
+            if self._has(field)[i]:
+                state[field] = values[i].item()
+        return state
+
+    def row_flags(self, i: int) -> dict[TaxInfoFlag, str]:
+        return {flag: batch_flag.render(i) for flag, batch_flag in self.flags.items() if batch_flag.mask[i]}
+
+    # ----- stages (see TaxSimulator for the explanations of the tax rules) -----
+
+    def process_family_information(self):
+        married = self._get(TaxField.MARRIED).astype(bool)
+        base_shares = np.where(married, 2, 1)
+        nb_children = self._get(TaxField.NB_CHILDREN)
+        nb_children_1 = np.minimum(nb_children, 2)
+        nb_children_2 = np.maximum(0, nb_children - nb_children_1)
+        self.state[TaxField.HOUSEHOLD_SHARES] = base_shares + nb_children_1 * 0.5 + nb_children_2
+        nb_children_lt_6yo = np.zeros(self.size, dtype=int)
+        for child_birthyear_key in [TaxField.CHILD_1_BIRTHYEAR,
+                                    TaxField.CHILD_2_BIRTHYEAR,
+                                    TaxField.CHILD_3_BIRTHYEAR,
+                                    TaxField.CHILD_4_BIRTHYEAR,
+                                    TaxField.CHILD_5_BIRTHYEAR,
+                                    TaxField.CHILD_6_BIRTHYEAR]:
+            lt_6yo = self._get(TaxField.YEAR) - 1 - self._get(child_birthyear_key) <= tax_rules.young_child_max_age
+            nb_children_lt_6yo += self._has(child_birthyear_key) & lt_6yo
+        provided = self._has(TaxField.NB_CHILDREN_LT_6YO)
+        self.state[TaxField.NB_CHILDREN_LT_6YO] = np.where(provided, self._get(TaxField.NB_CHILDREN_LT_6YO),
+                                                           nb_children_lt_6yo)
+        self._present.pop(TaxField.NB_CHILDREN_LT_6YO, None)
+
+    def compute_rental_income(self):
+        simplified_income_reporting = self._get(TaxField.SIMPLIFIED_RENTAL_INCOME_4BE)
+        net_profit = self._get(TaxField.REAL_RENTAL_PROFIT_4BA)
+        deficit = self._get(TaxField.REAL_RENTAL_INCOME_DEFICIT_4BB)
+        global_deficit = self._get(TaxField.RENTAL_INCOME_GLOBAL_DEFICIT_4BC)
+        previous_deficit = self._get(TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD)
+
+        simplified = simplified_income_reporting != 0
+        profit = ~simplified & (net_profit != 0)
+        default = ~simplified & ~profit
+        self._raise_for(simplified & ((net_profit != 0) | (deficit != 0) | (global_deficit != 0)
+                                      | (previous_deficit != 0)),
+                        "The simplified rental income reporting (4BE) cannot be combined with the default rental "
+                        "income reporting (4BA 4BB 4BC)")
+        self._raise_for(simplified & (simplified_income_reporting > tax_rules.simplified_rental_income_ceiling),
+                        f"Simplified rental income reporting (4BE) cannot exceed "
+                        f"{format_thousands(tax_rules.simplified_rental_income_ceiling)}€")
+        self._raise_for(profit & ((deficit != 0) | (global_deficit != 0)),
+                        "Rental profit reporting (4BA) cannot be combined with rental deficit reporting(4BB 4BC)")
+        self._raise_for(default & (global_deficit > tax_rules.rental_global_deficit_ceiling),
+                        f"Rental deficit for global deduction (4BC) cannot exceed "
+                        f"{format_thousands(tax_rules.rental_global_deficit_ceiling)}€")
+
+        final_net_profit = np.where(simplified,
+                                    simplified_income_reporting * tax_rules.simplified_rental_income_taxed_share,
+                                    np.where(profit, np.maximum(net_profit - previous_deficit, 0), -global_deficit))
+        final_deficit_carryover = np.where(simplified, 0,
+                                           np.where(profit, np.maximum(0, previous_deficit - net_profit),
+                                                    deficit + previous_deficit))
+        self.state[TaxField.RENTAL_INCOME_RESULT] = final_net_profit
+        has_carryover = final_deficit_carryover != 0
+        self.state[TaxField.RENTAL_DEFICIT_CARRYOVER] = final_deficit_carryover
+        self._present[TaxField.RENTAL_DEFICIT_CARRYOVER] = has_carryover
+        self._flag(TaxInfoFlag.RENTAL_DEFICIT_CARRYOVER, has_carryover,
+                   lambda i: FlagValue(final_deficit_carryover[i].item()))
+
+    def compute_furnished_rentals(self):
+        incomes = self._get(TaxField.LMNP_MICRO_INCOME_1_5ND) \
+                  + self._get(TaxField.LMNP_MICRO_INCOME_2_5OD) \
+                  + self._get(TaxField.LMNP_MICRO_INCOME_3_5PD)
+        incomes_rebate = np.maximum(incomes * tax_rules.lmnp_rebate_rate, tax_rules.lmnp_rebate_floor)
+        self.state[TaxField.TAXABLE_LMNP_INCOME] = np.maximum(incomes - incomes_rebate, 0)
+
+    def compute_net_income(self):
+        married = self._get(TaxField.MARRIED).astype(bool)
+        incomes_1 = self._get(TaxField.SALARY_1_1AJ) + self._get(TaxField.EXERCISE_GAIN_1_1TT)
+        incomes_2 = self._get(TaxField.SALARY_2_1BJ) + self._get(TaxField.EXERCISE_GAIN_2_1UT)
+        fees_10p_floor = self.parameters.fees_10p_deduction_floor
+        fees_10p_ceiling = self.parameters.fees_10p_deduction_ceiling
+        incomes_1_10p = tax_round_array(incomes_1 * tax_rules.fees_deduction_rate)
+        fee_deduction_1 = np.maximum(np.minimum(incomes_1_10p, fees_10p_ceiling), fees_10p_floor)
+        self.state[TaxField.DEDUCTION_10P_1] = fee_deduction_1
+        self._flag(TaxInfoFlag.FEE_REBATE_INCOME_1, incomes_1_10p > fees_10p_ceiling,
+                   lambda i: FlagValue(fees_10p_ceiling, incomes_1_10p[i].item(), fees_10p_ceiling,
+                                       incomes_1_10p[i].item() - fees_10p_ceiling))
+        net_income = incomes_1 - fee_deduction_1
+        incomes_2_10p = tax_round_array(incomes_2 * tax_rules.fees_deduction_rate)
+        fee_deduction_2 = np.maximum(np.minimum(incomes_2_10p, fees_10p_ceiling), fees_10p_floor)
+        self.state[TaxField.DEDUCTION_10P_2] = np.where(married, fee_deduction_2, 0)
+        self._present[TaxField.DEDUCTION_10P_2] = married
+        self._flag(TaxInfoFlag.FEE_REBATE_INCOME_2, married & (incomes_2_10p > fees_10p_ceiling),
+                   lambda i: FlagValue(fees_10p_ceiling, incomes_2_10p[i].item(), fees_10p_ceiling,
+                                       incomes_2_10p[i].item() - fees_10p_ceiling))
+        net_income = np.where(married, net_income + (incomes_2 - fee_deduction_2), net_income)
+        self.state[TaxField.TOTAL_NET_INCOME] = net_income + self._get(TaxField.RENTAL_INCOME_RESULT) \
+            + self._get(TaxField.TAXABLE_LMNP_INCOME) + self._get(TaxField.AGRICULTURAL_INCOME)
+
+    def compute_taxable_income(self):
+        total_per = self._get(TaxField.PER_TRANSFERS_1_6NS) + self._get(TaxField.PER_TRANSFERS_2_6NT)
+        taxable_income = self._get(TaxField.TOTAL_NET_INCOME) - total_per
+        self.state[TaxField.TAXABLE_INCOME] = taxable_income + self._get(TaxField.TAXABLE_ACQUISITION_GAIN_1TZ)
+
+    def compute_flat_rate_taxes(self):
+        self.state[TaxField.TAXABLE_INVESTMENT_INCOME] = self._get(TaxField.FIXED_INCOME_INTERESTS_2TR)
+        self.state[TaxField.INVESTMENT_INCOME_TAX] = tax_round_array(
+            self._get(TaxField.TAXABLE_INVESTMENT_INCOME) * tax_rules.investment_income_tax_rate)
+
+    def compute_reference_fiscal_income(self):
+        self.state[TaxField.REFERENCE_FISCAL_INCOME] = np.maximum(self._get(TaxField.TOTAL_NET_INCOME)
+                                                                  + self._get(TaxField.TAXABLE_INVESTMENT_INCOME)
+                                                                  + self._get(TaxField.CAPITAL_GAIN_3VG),
+                                                                  0)
+
+    def _compute_income_tax(self, household_shares: np.ndarray):
+        # same lookup as IncomeTaxScale.income_tax, with one table per distinct number of household shares
+        slices_rates = np.array(self.parameters.slices_rates)
+        taxable_income = self._get(TaxField.TAXABLE_INCOME)
+        tax = np.zeros(self.size)
+        marginal_tax_rate = np.zeros(self.size)
+        for shares in np.unique(household_shares):
+            rows = household_shares == shares
+            thresholds, cumulative_taxes = map(np.array, self.income_tax_scale.table(shares.item()))
+            income = taxable_income[rows]
+            bucket_n = np.searchsorted(thresholds, income, side="left") - 1
+            taxed = bucket_n >= 0
+            bucket_n = np.maximum(bucket_n, 0)
+            tax[rows] = np.where(taxed, cumulative_taxes[bucket_n] + slices_rates[bucket_n]
+                                 * (income - thresholds[bucket_n]), 0)
+            marginal_tax_rate[rows] = np.where(taxed, slices_rates[bucket_n], 0)
+        return tax, marginal_tax_rate
+
+    def compute_tax_before_reductions(self):
+        capping_parameter = self.parameters.family_quotient_benefices_capping
+        household_shares = self._get(TaxField.HOUSEHOLD_SHARES)
+        tax_with_family_quotient, marginal_tax_rate = self._compute_income_tax(household_shares)
+        self.marginal_tax_rate = marginal_tax_rate
+        self._flag(TaxInfoFlag.MARGINAL_TAX_RATE, True, lambda i: FlagValue(marginal_tax_rate[i].item()))
+        household_shares_without_family_quotient = np.where(self._get(TaxField.MARRIED).astype(bool), 2, 1)
+        tax_without_family_quotient, _ = self._compute_income_tax(household_shares_without_family_quotient)
+        family_quotient_benefices = tax_without_family_quotient - tax_with_family_quotient
+        family_quotient_benefices_capping = capping_parameter * (
+                (household_shares - household_shares_without_family_quotient) * 2)
+        capped = family_quotient_benefices > family_quotient_benefices_capping
+        additional_taxes = family_quotient_benefices - family_quotient_benefices_capping
+        self._flag(TaxInfoFlag.FAMILY_QUOTIENT_CAPPING, capped, lambda i: FlagValue(additional_taxes[i].item()))
+        final_income_tax = np.where(capped, tax_without_family_quotient - family_quotient_benefices_capping,
+                                    tax_with_family_quotient)
+        self.state[TaxField.SIMPLE_TAX_RIGHT] = tax_round_array(final_income_tax)
+        self.state[TaxField.TAX_BEFORE_REDUCTIONS] = self._get(TaxField.SIMPLE_TAX_RIGHT) \
+            + self._get(TaxField.INVESTMENT_INCOME_TAX)
+
+    def compute_tax_reductions(self):
+        charity_75p_ceiling = tax_rules.charity_75p_ceiling
+        charity_donation_7ud = self._get(TaxField.CHARITY_DONATION_7UD)
+        capped_75p = charity_donation_7ud > charity_75p_ceiling
+        charity_donation_75p = np.minimum(charity_donation_7ud, charity_75p_ceiling)
+        # min() of the scalar simulator returns the ceiling itself (an int) when capping
+        self._flag(TaxInfoFlag.CHARITY_75P, True,
+                   lambda i: FlagValue(charity_75p_ceiling if capped_75p[i] else charity_donation_75p[i].item(),
+                                       charity_donation_7ud[i].item(), charity_75p_ceiling,
+                                       (charity_donation_7ud[i] - charity_donation_75p[i]).item()))
+        charity_donation_reduction_75p = charity_donation_75p * tax_rules.charity_75p_rate
+        charity_donation_7uf = self._get(TaxField.CHARITY_DONATION_7UF)
+        donation_leftover = charity_donation_7uf + np.maximum(charity_donation_7ud - charity_75p_ceiling, 0)
+        taxable_income = np.maximum(self._get(TaxField.TAXABLE_INCOME), 0)
+        charity_donation_cap = taxable_income * tax_rules.charity_66p_income_share
+        charity_donation_66p = tax_round_array(np.minimum(donation_leftover, charity_donation_cap))
+        charity_donation_reduction_66p = charity_donation_66p * tax_rules.charity_66p_rate
+        self._flag(TaxInfoFlag.CHARITY_66P, True,
+                   lambda i: FlagValue(charity_donation_66p[i].item(), donation_leftover[i].item(),
+                                       charity_donation_cap[i].item(),
+                                       max(donation_leftover[i].item() - charity_donation_cap[i].item(), 0)))
+        self.state[TaxField.CHARITY_REDUCTION] = charity_donation_reduction_75p + charity_donation_reduction_66p
+
+        subscription_capping = np.where(self._get(TaxField.MARRIED).astype(bool),
+                                        tax_rules.sme_subscription_ceiling_married,
+                                        tax_rules.sme_subscription_ceiling_single)
+        pme_capital_subscription_before = np.minimum(self._get(TaxField.SME_CAPITAL_SUBSCRIPTION_7CF),
+                                                     subscription_capping)
+        pme_capital_subscription_after = np.minimum(self._get(TaxField.SME_CAPITAL_SUBSCRIPTION_7CH),
+                                                    subscription_capping - pme_capital_subscription_before)
+        self.state[TaxField.SME_SUBSCRIPTION_REDUCTION] = \
+            pme_capital_subscription_before * tax_rules.sme_subscription_rate_7cf \
+            + pme_capital_subscription_after * tax_rules.sme_subscription_rate_7ch
+
+    def compute_tax_credits(self):
+        nb_children_lt_6yo = self._get(TaxField.NB_CHILDREN_LT_6YO)
+        fees_keys = [
+            TaxField.CHILDREN_DAYCARE_FEES_7GA,
+            TaxField.CHILDREN_DAYCARE_FEES_7GB,
+            TaxField.CHILDREN_DAYCARE_FEES_7GC,
+            TaxField.CHILDREN_DAYCARE_FEES_7GD,
+            TaxField.CHILDREN_DAYCARE_FEES_7GE,
+            TaxField.CHILDREN_DAYCARE_FEES_7GF,
+            TaxField.CHILDREN_DAYCARE_FEES_7GG
+        ]
+        nb_children_with_daycare_fees = np.zeros(self.size, dtype=int)
+        total_fees = np.zeros(self.size, dtype=int)
+        for fees_key in fees_keys:
+            declared = self._has(fees_key)
+            nb_children_with_daycare_fees += declared
+            too_many = declared & (nb_children_with_daycare_fees > nb_children_lt_6yo)
+            if too_many.any():
+                i = int(np.argmax(too_many))
+                raise Exception(f"Row {i}: You are declaring more children daycare fees "
+                                f"({nb_children_with_daycare_fees[i]}) than you have children below 6y old "
+                                f"({nb_children_lt_6yo[i]})")
+            capped_fees = np.minimum(self._get(fees_key), tax_rules.daycare_fees_ceiling)
+            total_fees = total_fees + np.where(declared, capped_fees, 0)
+
+        def daycare_capping(i: int) -> FlagValue:
+            # replays the scalar sum, so that the text shows the same int/float values
+            row_total_fees = 0
+            row_fees_capped_out = 0
+            for key in fees_keys:
+                if self._has(key)[i]:
+                    row_total_fees += min(self.state[key][i].item(), tax_rules.daycare_fees_ceiling)
+                    row_fees_capped_out += max(self.state[key][i].item() - tax_rules.daycare_fees_ceiling, 0)
+            return FlagValue(row_total_fees, row_total_fees + row_fees_capped_out, None, row_fees_capped_out)
+
+        self._flag(TaxInfoFlag.CHILD_DAYCARE_CREDIT_CAPPING, True, daycare_capping)
+        self.state[TaxField.CHILDREN_DAYCARE_TAXCREDIT] = total_fees * tax_rules.daycare_credit_rate
+
+        nb_children = self._get(TaxField.NB_CHILDREN)
+        home_services_capping = np.minimum(tax_rules.home_services_ceiling
+                                           + tax_rules.home_services_ceiling_per_child * nb_children,
+                                           tax_rules.home_services_max_ceiling)
+        home_services = self._get(TaxField.HOME_SERVICES_7DB)
+        self._flag(TaxInfoFlag.HOME_SERVICES_CREDIT_CAPPING, home_services > home_services_capping,
+                   lambda i: FlagValue(home_services_capping[i].item(), home_services[i].item(),
+                                       home_services_capping[i].item(),
+                                       (home_services[i] - home_services_capping[i]).item()))
+        capped_home_services = np.minimum(home_services, home_services_capping)
+        self.state[TaxField.HOME_SERVICES_TAXCREDIT] = capped_home_services * tax_rules.home_services_credit_rate
+
+    def compute_capital_taxes(self):
+        self.state[TaxField.CAPITAL_GAIN_TAX] = self._get(TaxField.CAPITAL_GAIN_3VG) * tax_rules.capital_gain_tax_rate
+
+    def compute_net_taxes(self):
+        all_taxes_before_capping = self._get(TaxField.TAX_BEFORE_REDUCTIONS) \
+                                   - self._get(TaxField.CHARITY_REDUCTION)
+        taxes_with_reduction_before_capping = all_taxes_before_capping - self._get(TaxField.SME_SUBSCRIPTION_REDUCTION)
+        partial_taxes_2 = np.maximum(taxes_with_reduction_before_capping, 0) \
+            - self._get(TaxField.CHILDREN_DAYCARE_TAXCREDIT) - self._get(TaxField.HOME_SERVICES_TAXCREDIT)
+
+        fiscal_advantages = all_taxes_before_capping - partial_taxes_2
+        ceiling = tax_rules.global_fiscal_advantages_ceiling
+        capped = fiscal_advantages > ceiling
+        self._flag(TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES, True,
+                   lambda i: FlagValue(ceiling, fiscal_advantages[i].item(), ceiling,
+                                       fiscal_advantages[i].item() - ceiling) if capped[i] else
+                   FlagValue(fiscal_advantages[i].item(), fiscal_advantages[i].item(), ceiling, 0))
+        net_taxes_after_global_capping = np.where(capped, all_taxes_before_capping - ceiling, partial_taxes_2)
+
+        net_taxes = net_taxes_after_global_capping + self._get(TaxField.CAPITAL_GAIN_TAX) - self._get(
+            TaxField.INTEREST_TAX_ALREADY_PAID_2CK)
+        self.state[TaxField.NET_TAXES] = tax_round_array(net_taxes, 2)
+
+    def compute_social_taxes(self):
+        csg_crds_base = self._get(TaxField.CAPITAL_GAIN_3VG) \
+                        + self._get(TaxField.TAXABLE_ACQUISITION_GAIN_1TZ) \
+                        + self._get(TaxField.ACQUISITION_GAIN_REBATES_1UZ) \
+                        + self._get(TaxField.ACQUISITION_GAIN_50P_REBATES_1WZ) \
+                        + (self._get(TaxField.TAXABLE_INVESTMENT_INCOME)
+                           - self._get(TaxField.FIXED_INCOME_INTERESTS_ALREADY_TAXED_2BH)) \
+                        + np.maximum(self._get(TaxField.RENTAL_INCOME_RESULT), 0) \
+                        + self._get(TaxField.TAXABLE_LMNP_INCOME)
+        activity_income_crds_base = self._get(TaxField.EXERCISE_GAIN_1_1TT) + self._get(TaxField.EXERCISE_GAIN_2_1UT)
+        salary_contrib_10p_base = self._get(TaxField.EXERCISE_GAIN_1_1TT) + self._get(TaxField.EXERCISE_GAIN_2_1UT)
+
+        csg_crds_taxes = tax_round_array((csg_crds_base + activity_income_crds_base) * tax_rules.csg_crds_rate)
+        solidarity_75_taxes = tax_round_array(csg_crds_base * tax_rules.solidarity_rate)
+        salary_contrib_10p = salary_contrib_10p_base * tax_rules.salary_contribution_rate
+        self.state[TaxField.NET_SOCIAL_TAXES] = csg_crds_taxes + solidarity_75_taxes + salary_contrib_10p
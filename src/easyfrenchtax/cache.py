@@ -0,0 +1,64 @@
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from types import MappingProxyType
+from typing import Any
+
+from .tax_simulator import TaxField, TaxSimulator, field_ordinals
+
+# A cached simulation, as read-only views: the state, the texts of the flags and the numbers behind them (FlagValue)
+CachedSimulation = namedtuple("CachedSimulation", ["state", "flags", "flag_values"])
+CacheStats = namedtuple("CacheStats", ["hits", "misses", "size", "maxsize"])
+
+
+# The key of an input, whatever the order of its fields: the ordinal of each field (cheaper to hash than the Enum) with
+# the type of its value (1000 and 1000.0 are equal, but int and float inputs don't give the same flags texts)
+def canonical_input(tax_input: dict[TaxField, Any]) -> frozenset:
+    return frozenset([(field_ordinals[field._name_], type(value), value) for field, value in tax_input.items()])
+
+
+class SimulationCache:
+    # Bounded LRU cache of simulations, keyed by (statement year, canonical input): identical households are only
+    # simulated once, then cost a dictionary lookup. Results are shared between callers, hence read-only. Simulations
+    # raising an exception are not cached. Thread-safe.
+    maxsize: int
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize: int = 4096, simulator: type = TaxSimulator):
+        if maxsize < 1:
+            raise Exception(f"The size of a simulation cache must be at least 1 (got {maxsize})")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._simulator = simulator
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def simulate(self, statement_year: int, tax_input: dict[TaxField, Any]) -> CachedSimulation:
+        key = (statement_year, canonical_input(tax_input))
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+        tax_sim = self._simulator(statement_year, tax_input)
+        # copies: a view of the defaultdict state would insert the missing fields it is asked for
+        result = CachedSimulation(state=MappingProxyType(dict(tax_sim.state)),
+                                  flags=MappingProxyType(dict(tax_sim.flags)),
+                                  flag_values=MappingProxyType(dict(tax_sim.flags.records)))
+        with self._lock:
+            self._entries[key] = result
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def stats(self) -> CacheStats:
+        return CacheStats(hits=self.hits, misses=self.misses, size=len(self._entries), maxsize=self.maxsize)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
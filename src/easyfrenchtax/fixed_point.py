@@ -0,0 +1,397 @@
+from bisect import bisect_left
+from functools import partial
+from typing import Any, Callable, Optional
+
+from .tax_parameters import registry
+from .tax_simulator import Capping, FamilyQuotientCapping, FlagValue, IncomeTaxBracket, TaxField, TaxInfoFlag, \
+    TaxParameters, TaxSimulator, div_half_up, format_thousands, tax_rules
+
+# Fields that are not amounts of money, hence not converted to cents
+NON_MONETARY_FIELDS = {
+    TaxField.YEAR,
+    TaxField.MARRIED,
+    TaxField.NB_CHILDREN,
+    TaxField.NB_CHILDREN_LT_6YO,
+    TaxField.CHILD_1_BIRTHYEAR,
+    TaxField.CHILD_2_BIRTHYEAR,
+    TaxField.CHILD_3_BIRTHYEAR,
+    TaxField.CHILD_4_BIRTHYEAR,
+    TaxField.CHILD_5_BIRTHYEAR,
+    TaxField.CHILD_6_BIRTHYEAR,
+    TaxField.HOUSEHOLD_SHARES,
+}
+
+# Rates are applied as integer numbers of 1/10000th
+RATE_SCALE = 10000
+
+
+def to_cents(euros: Any) -> int:
+    # exact conversion (half up) of an amount in euros (int or float) to integer cents
+    numerator, denominator = euros.as_integer_ratio()
+    return div_half_up(numerator * 100, denominator)
+
+
+def apply_rate(amount: int, rate: float, unit: int = 1) -> int:
+    # amount * rate, rounded half up to a multiple of unit
+    return div_half_up(amount * round(rate * RATE_SCALE), RATE_SCALE * unit) * unit
+
+
+def format_euros(cents: int, as_float: bool = False) -> str:
+    # formats cents as the float simulator formats euros: floats always show decimals, ints (here, whole amounts of
+    # euros of int inputs) don't
+    if as_float or cents % 100:
+        return f"{cents / 100}"
+    return f"{cents // 100}"
+
+
+class CentsIncomeTaxScale:
+    # Same as IncomeTaxScale, with thresholds in cents and taxes in 1/RATE_SCALE cents (exact integers)
+    parameters: TaxParameters
+    rates: list[int]
+    tables: dict[float, tuple[list[int], list[int]]]
+
+    def __init__(self, parameters: TaxParameters):
+        self.parameters = parameters
+        self.rates = [round(rate * RATE_SCALE) for rate in parameters.slices_rates]
+        self.tables = {}
+
+    def table(self, household_shares: float) -> tuple[list[int], list[int]]:
+        table = self.tables.get(household_shares)
+        if table is None:
+            half_shares = int(household_shares * 2)
+            thresholds = [t * 100 * half_shares // 2 for t in self.parameters.slices_thresholds]
+            cumulative_taxes = [0]
+            for bucket_n in range(len(thresholds) - 1):
+                bucket_amount = thresholds[bucket_n + 1] - thresholds[bucket_n]
+                cumulative_taxes.append(cumulative_taxes[-1] + self.rates[bucket_n] * bucket_amount)
+            table = self.tables[household_shares] = (thresholds, cumulative_taxes)
+        return table
+
+    def income_tax(self, taxable_income: int, household_shares: float) -> tuple[int, float]:
+        thresholds, cumulative_taxes = self.table(household_shares)
+        bucket_n = bisect_left(thresholds, taxable_income) - 1
+        if bucket_n < 0:
+            return 0, 0
+        return cumulative_taxes[bucket_n] + self.rates[bucket_n] * (taxable_income - thresholds[bucket_n]), \
+            self.parameters.slices_rates[bucket_n]
+
+    def trace_brackets(self, trace: Callable[..., None], taxable_income: int, household_shares: float):
+        # emits the tax of each bracket of the table, in cents
+        thresholds, _ = self.table(household_shares)
+        for bucket_n, lower in enumerate(thresholds):
+            if taxable_income <= lower:
+                break
+            upper = thresholds[bucket_n + 1] if bucket_n + 1 < len(thresholds) else None
+            taxed_income = (taxable_income if upper is None else min(taxable_income, upper)) - lower
+            trace(IncomeTaxBracket, household_shares, lower, upper, self.parameters.slices_rates[bucket_n],
+                  taxed_income, div_half_up(self.rates[bucket_n] * taxed_income, RATE_SCALE))
+
+    def capped_income_tax(self, taxable_income: int, household_shares: float,
+                          household_shares_without_family_quotient: float,
+                          trace: Optional[Callable[..., None]] = None) -> tuple[int, float, Optional[int]]:
+        tax_with_family_quotient, marginal_tax_rate = self.income_tax(taxable_income, household_shares)
+        if trace is not None:
+            self.trace_brackets(trace, taxable_income, household_shares)
+        if household_shares == household_shares_without_family_quotient:
+            return tax_with_family_quotient, marginal_tax_rate, None
+        tax_without_family_quotient, _ = self.income_tax(taxable_income, household_shares_without_family_quotient)
+        family_quotient_benefices = tax_without_family_quotient - tax_with_family_quotient
+        family_quotient_benefices_capping = self.parameters.family_quotient_benefices_capping * 100 * RATE_SCALE \
+            * int((household_shares - household_shares_without_family_quotient) * 2)
+        if trace is not None:
+            self.trace_brackets(trace, taxable_income, household_shares_without_family_quotient)
+            trace(FamilyQuotientCapping, *(div_half_up(amount, RATE_SCALE) for amount in [
+                tax_with_family_quotient, tax_without_family_quotient, family_quotient_benefices,
+                family_quotient_benefices_capping,
+                max(family_quotient_benefices - family_quotient_benefices_capping, 0)]))
+        if family_quotient_benefices > family_quotient_benefices_capping:
+            return tax_without_family_quotient - family_quotient_benefices_capping, marginal_tax_rate, \
+                family_quotient_benefices - family_quotient_benefices_capping
+        return tax_with_family_quotient, marginal_tax_rate, None
+
+
+cents_income_tax_scales: dict[int, CentsIncomeTaxScale] = registry.tables(CentsIncomeTaxScale)
+
+
+def _capped(flag_value: FlagValue) -> str:
+    return " (capped)" if flag_value.excess > 0 else ""
+
+
+def _global_fiscal_advantages(flag_value: FlagValue) -> str:
+    if flag_value.excess:
+        return f"capped to {format_thousands(tax_rules.global_fiscal_advantages_ceiling)}€ " \
+               f"(originally {format_euros(flag_value.original, as_float=True)}€)"
+    return f"{format_euros(flag_value.original, as_float=True)}€ " \
+           f"(uncapped, {format_euros(flag_value.cap - flag_value.original, as_float=True)}€ from ceiling)"
+
+
+# formats of the flags, whose values are in cents (same texts as the ones of TaxSimulator)
+cents_flag_formats: dict[TaxInfoFlag, Callable[[FlagValue], str]] = {
+    TaxInfoFlag.FEE_REBATE_INCOME_1: lambda v: f"taxable income += {v.excess // 100}€",
+    TaxInfoFlag.FEE_REBATE_INCOME_2: lambda v: f"taxable income += {v.excess // 100}€",
+    TaxInfoFlag.MARGINAL_TAX_RATE: lambda v: f"{round(v.value * 100)}%",
+    TaxInfoFlag.FAMILY_QUOTIENT_CAPPING: lambda v: f"tax += {format_euros(v.value, as_float=True)}€",
+    TaxInfoFlag.CHILD_DAYCARE_CREDIT_CAPPING:
+        lambda v: f"capped to {format_euros(v.value)}€ (originally {format_euros(v.original)}€)",
+    TaxInfoFlag.HOME_SERVICES_CREDIT_CAPPING:
+        lambda v: f"capped to {format_euros(v.cap)}€ (originally {format_euros(v.original)}€)",
+    TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES: _global_fiscal_advantages,
+    TaxInfoFlag.CHARITY_75P: lambda v: f"{format_euros(v.value)}€{_capped(v)}",
+    TaxInfoFlag.CHARITY_66P: lambda v: f"{v.value // 100}€{_capped(v)}",
+    TaxInfoFlag.RENTAL_DEFICIT_CARRYOVER: lambda v: f"{format_euros(v.value)}€",
+}
+
+
+class FixedPointTaxSimulator(TaxSimulator):
+    # TaxSimulator carrying all amounts of money as integer cents: inputs are converted on the way in, every state
+    # value is in cents (use euros() to read them back), products by rates are rounded half up to the cent with integer
+    # operations, so chained computations don't accumulate float errors. Flags are the same texts as in TaxSimulator,
+    # except where the float computation is off by a hair on a half cent: e.g. additional taxes of exactly 1447.025€ due
+    # to the family quotient capping, 1447.0249999999996 with floats, show as 1447.03€ here (1447.02€ in TaxSimulator).
+    # The amounts of the trace events (debug mode) are in cents too.
+    __slots__ = ()
+    income_tax_scales = cents_income_tax_scales
+    flag_formats = cents_flag_formats
+
+    def __init__(self, statement_year: int, tax_input: dict[TaxField, Any], debug: bool = False, lazy: bool = False,
+                 compact: bool = False, flags: bool = True):
+        super().__init__(statement_year, self._input_to_cents(tax_input), debug, lazy, compact, flags)
+
+    @staticmethod
+    def _input_to_cents(tax_input: dict[TaxField, Any]) -> dict[TaxField, Any]:
+        return {field: value if field in NON_MONETARY_FIELDS or value is None else to_cents(value)
+                for field, value in tax_input.items()}
+
+    def update(self, changes: Optional[dict[TaxField, Any]] = None, **fields) -> list[str]:
+        changes = dict(changes or {})
+        changes.update((TaxField[name], value) for name, value in fields.items())
+        return super().update(self._input_to_cents(changes))
+
+    def euros(self, field: TaxField) -> Any:
+        value = self[field]
+        return value if field in NON_MONETARY_FIELDS else value / 100
+
+    # ----- stages (see TaxSimulator for the explanations of the tax rules) -----
+
+    def compute_rental_income(self):
+        simplified_income_reporting = self.state[TaxField.SIMPLIFIED_RENTAL_INCOME_4BE]
+        net_profit = self.state[TaxField.REAL_RENTAL_PROFIT_4BA]
+        deficit = self.state[TaxField.REAL_RENTAL_INCOME_DEFICIT_4BB]
+        global_deficit = self.state[TaxField.RENTAL_INCOME_GLOBAL_DEFICIT_4BC]
+        previous_deficit = self.state[TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD]
+
+        if simplified_income_reporting:
+            if net_profit or deficit or global_deficit or previous_deficit:
+                raise Exception("The simplified rental income reporting (4BE) cannot be combined with the default "
+                                "rental income reporting (4BA 4BB 4BC)")
+            if simplified_income_reporting > tax_rules.simplified_rental_income_ceiling * 100:
+                raise Exception(f"Simplified rental income reporting (4BE) cannot exceed "
+                                f"{format_thousands(tax_rules.simplified_rental_income_ceiling)}€")
+            final_net_profit = apply_rate(simplified_income_reporting, tax_rules.simplified_rental_income_taxed_share)
+            final_deficit_carryover = 0
+        elif net_profit:
+            if deficit or global_deficit:
+                raise Exception(
+                    "Rental profit reporting (4BA) cannot be combined with rental deficit reporting(4BB 4BC)")
+            final_net_profit = max(net_profit - previous_deficit, 0)
+            final_deficit_carryover = max(0, previous_deficit - net_profit)
+        else:
+            if global_deficit > tax_rules.rental_global_deficit_ceiling * 100:
+                raise Exception(f"Rental deficit for global deduction (4BC) cannot exceed "
+                                f"{format_thousands(tax_rules.rental_global_deficit_ceiling)}€")
+            final_net_profit = -global_deficit
+            final_deficit_carryover = deficit + previous_deficit
+
+        self.state[TaxField.RENTAL_INCOME_RESULT] = final_net_profit
+        if final_deficit_carryover:
+            self.state[TaxField.RENTAL_DEFICIT_CARRYOVER] = final_deficit_carryover
+            self.flags[TaxInfoFlag.RENTAL_DEFICIT_CARRYOVER] = FlagValue(final_deficit_carryover)
+
+    def compute_furnished_rentals(self):
+        incomes = self.state[TaxField.LMNP_MICRO_INCOME_1_5ND] \
+                  + self.state[TaxField.LMNP_MICRO_INCOME_2_5OD] \
+                  + self.state[TaxField.LMNP_MICRO_INCOME_3_5PD]
+        incomes_rebate = max(apply_rate(incomes, tax_rules.lmnp_rebate_rate), tax_rules.lmnp_rebate_floor * 100)
+        self.state[TaxField.TAXABLE_LMNP_INCOME] = max(incomes - incomes_rebate, 0)
+
+    def compute_net_income(self):
+        incomes_1 = self.state[TaxField.SALARY_1_1AJ] + self.state[TaxField.EXERCISE_GAIN_1_1TT]
+        incomes_2 = self.state[TaxField.SALARY_2_1BJ] + self.state[TaxField.EXERCISE_GAIN_2_1UT]
+        fees_10p_floor = self.parameters.fees_10p_deduction_floor * 100
+        fees_10p_ceiling = self.parameters.fees_10p_deduction_ceiling * 100
+        incomes_1_10p = apply_rate(incomes_1, tax_rules.fees_deduction_rate, unit=100)
+        fee_deduction_1 = max(min(incomes_1_10p, fees_10p_ceiling), fees_10p_floor)
+        self.state[TaxField.DEDUCTION_10P_1] = fee_deduction_1
+        if self.trace is not None:
+            self._trace("compute_net_income", Capping, "DEDUCTION_10P_1", incomes_1_10p, fees_10p_floor,
+                        fees_10p_ceiling, fee_deduction_1)
+        if incomes_1_10p > fees_10p_ceiling:
+            self.flags[TaxInfoFlag.FEE_REBATE_INCOME_1] = FlagValue(fees_10p_ceiling, incomes_1_10p, fees_10p_ceiling,
+                                                                    incomes_1_10p - fees_10p_ceiling)
+        net_income = incomes_1 - fee_deduction_1
+        if self.state[TaxField.MARRIED]:
+            incomes_2_10p = apply_rate(incomes_2, tax_rules.fees_deduction_rate, unit=100)
+            fee_deduction_2 = max(min(incomes_2_10p, fees_10p_ceiling), fees_10p_floor)
+            self.state[TaxField.DEDUCTION_10P_2] = fee_deduction_2
+            if self.trace is not None:
+                self._trace("compute_net_income", Capping, "DEDUCTION_10P_2", incomes_2_10p, fees_10p_floor,
+                            fees_10p_ceiling, fee_deduction_2)
+            if incomes_2_10p > fees_10p_ceiling:
+                self.flags[TaxInfoFlag.FEE_REBATE_INCOME_2] = FlagValue(fees_10p_ceiling, incomes_2_10p,
+                                                                        fees_10p_ceiling,
+                                                                        incomes_2_10p - fees_10p_ceiling)
+            net_income += incomes_2 - fee_deduction_2
+        self.state[TaxField.TOTAL_NET_INCOME] = net_income + self.state[TaxField.RENTAL_INCOME_RESULT] \
+            + self.state[TaxField.TAXABLE_LMNP_INCOME] + self.state[TaxField.AGRICULTURAL_INCOME]
+
+    def compute_flat_rate_taxes(self):
+        self.state[TaxField.TAXABLE_INVESTMENT_INCOME] = self.state[TaxField.FIXED_INCOME_INTERESTS_2TR]
+        self.state[TaxField.INVESTMENT_INCOME_TAX] = apply_rate(self.state[TaxField.TAXABLE_INVESTMENT_INCOME],
+                                                                tax_rules.investment_income_tax_rate, unit=100)
+
+    def compute_tax_before_reductions(self):
+        household_shares = self.state[TaxField.HOUSEHOLD_SHARES]
+        household_shares_without_family_quotient = 2 if self.state[TaxField.MARRIED] else 1
+        final_income_tax, marginal_tax_rate, additional_taxes = self.income_tax_scale.capped_income_tax(
+            self.state[TaxField.TAXABLE_INCOME], household_shares, household_shares_without_family_quotient,
+            None if self.trace is None else partial(self._trace, "compute_tax_before_reductions"))
+        self.flags[TaxInfoFlag.MARGINAL_TAX_RATE] = FlagValue(marginal_tax_rate)
+        if additional_taxes is not None:
+            self.flags[TaxInfoFlag.FAMILY_QUOTIENT_CAPPING] = FlagValue(div_half_up(additional_taxes, RATE_SCALE))
+        self.state[TaxField.SIMPLE_TAX_RIGHT] = div_half_up(final_income_tax, 100 * RATE_SCALE) * 100
+        self.state[TaxField.TAX_BEFORE_REDUCTIONS] = self.state[TaxField.SIMPLE_TAX_RIGHT] + self.state[
+            TaxField.INVESTMENT_INCOME_TAX]
+
+    def compute_tax_reductions(self):
+        charity_75p_ceiling = tax_rules.charity_75p_ceiling * 100
+        charity_donation_7ud = self.state[TaxField.CHARITY_DONATION_7UD]
+        charity_donation_75p = min(charity_donation_7ud, charity_75p_ceiling)
+        self.flags[TaxInfoFlag.CHARITY_75P] = FlagValue(charity_donation_75p, charity_donation_7ud, charity_75p_ceiling,
+                                                        charity_donation_7ud - charity_donation_75p)
+        charity_donation_reduction_75p = apply_rate(charity_donation_75p, tax_rules.charity_75p_rate)
+        charity_donation_7uf = self.state[TaxField.CHARITY_DONATION_7UF]
+        donation_leftover = charity_donation_7uf + max(charity_donation_7ud - charity_75p_ceiling, 0)
+        taxable_income = max(self.state[TaxField.TAXABLE_INCOME], 0)
+        # the ceiling is a share of the taxable income: compare the donations and the taxable income times that share,
+        # both in 1/RATE_SCALE cents
+        income_share = round(tax_rules.charity_66p_income_share * RATE_SCALE)
+        capped = donation_leftover * RATE_SCALE > taxable_income * income_share
+        charity_donation_66p = div_half_up(taxable_income * income_share if capped else donation_leftover * RATE_SCALE,
+                                           100 * RATE_SCALE) * 100
+        charity_donation_reduction_66p = apply_rate(charity_donation_66p, tax_rules.charity_66p_rate)
+        # (donation_leftover > the ceiling rounded down to the cent is the same as capped)
+        charity_donation_cap = taxable_income * income_share // RATE_SCALE
+        self.flags[TaxInfoFlag.CHARITY_66P] = FlagValue(charity_donation_66p, donation_leftover, charity_donation_cap,
+                                                        max(donation_leftover - charity_donation_cap, 0))
+        if self.trace is not None:
+            self._trace("compute_tax_reductions", Capping, "CHARITY_75P", charity_donation_7ud, None,
+                        charity_75p_ceiling, charity_donation_75p)
+            self._trace("compute_tax_reductions", Capping, "CHARITY_66P", donation_leftover, None,
+                        charity_donation_cap, charity_donation_66p)
+        self.state[TaxField.CHARITY_REDUCTION] = charity_donation_reduction_75p + charity_donation_reduction_66p
+
+        subscription_capping = 100 * (tax_rules.sme_subscription_ceiling_married if self.state[TaxField.MARRIED]
+                                      else tax_rules.sme_subscription_ceiling_single)
+        pme_capital_subscription_before = min(self.state[TaxField.SME_CAPITAL_SUBSCRIPTION_7CF], subscription_capping)
+        pme_capital_subscription_after = min(self.state[TaxField.SME_CAPITAL_SUBSCRIPTION_7CH],
+                                             subscription_capping - pme_capital_subscription_before)
+        if self.trace is not None:
+            self._trace("compute_tax_reductions", Capping, "SME_SUBSCRIPTION",
+                        self.state[TaxField.SME_CAPITAL_SUBSCRIPTION_7CF]
+                        + self.state[TaxField.SME_CAPITAL_SUBSCRIPTION_7CH], None, subscription_capping,
+                        pme_capital_subscription_before + pme_capital_subscription_after)
+        self.state[TaxField.SME_SUBSCRIPTION_REDUCTION] = \
+            apply_rate(pme_capital_subscription_before, tax_rules.sme_subscription_rate_7cf) \
+            + apply_rate(pme_capital_subscription_after, tax_rules.sme_subscription_rate_7ch)
+
+    def compute_tax_credits(self):
+        nb_children_lt_6yo = self.state[TaxField.NB_CHILDREN_LT_6YO]
+
+        nb_children_with_daycare_fees = 0
+        total_fees = 0
+        fees_capped_out = 0
+        for fees_key in [
+            TaxField.CHILDREN_DAYCARE_FEES_7GA,
+            TaxField.CHILDREN_DAYCARE_FEES_7GB,
+            TaxField.CHILDREN_DAYCARE_FEES_7GC,
+            TaxField.CHILDREN_DAYCARE_FEES_7GD,
+            TaxField.CHILDREN_DAYCARE_FEES_7GE,
+            TaxField.CHILDREN_DAYCARE_FEES_7GF,
+            TaxField.CHILDREN_DAYCARE_FEES_7GG
+        ]:
+            if fees_key in self.inputs:
+                nb_children_with_daycare_fees += 1
+                if nb_children_with_daycare_fees > nb_children_lt_6yo:
+                    raise Exception(f"You are declaring more children daycare fees ({nb_children_with_daycare_fees}) "
+                                    f"than you have children below 6y old ({nb_children_lt_6yo})")
+                fees = self.state[fees_key]
+                capped_fees = min(fees, tax_rules.daycare_fees_ceiling * 100)
+                total_fees += capped_fees
+                fees_capped_out += max(fees - tax_rules.daycare_fees_ceiling * 100, 0)
+                if self.trace is not None:
+                    self._trace("compute_tax_credits", Capping, fees_key.name, fees, None,
+                                tax_rules.daycare_fees_ceiling * 100, capped_fees)
+        self.flags[TaxInfoFlag.CHILD_DAYCARE_CREDIT_CAPPING] = FlagValue(total_fees, total_fees + fees_capped_out,
+                                                                         None, fees_capped_out)
+        self.state[TaxField.CHILDREN_DAYCARE_TAXCREDIT] = apply_rate(total_fees, tax_rules.daycare_credit_rate)
+
+        nb_children = self.state[TaxField.NB_CHILDREN]
+        home_services_capping = 100 * min(tax_rules.home_services_ceiling
+                                          + tax_rules.home_services_ceiling_per_child * nb_children,
+                                          tax_rules.home_services_max_ceiling)
+        home_services = self.state[TaxField.HOME_SERVICES_7DB]
+        if home_services > home_services_capping:
+            self.flags[TaxInfoFlag.HOME_SERVICES_CREDIT_CAPPING] = FlagValue(home_services_capping, home_services,
+                                                                             home_services_capping,
+                                                                             home_services - home_services_capping)
+        capped_home_services = min(home_services, home_services_capping)
+        if self.trace is not None:
+            self._trace("compute_tax_credits", Capping, "HOME_SERVICES", home_services, None, home_services_capping,
+                        capped_home_services)
+        self.state[TaxField.HOME_SERVICES_TAXCREDIT] = apply_rate(capped_home_services,
+                                                                  tax_rules.home_services_credit_rate)
+
+    def compute_capital_taxes(self):
+        self.state[TaxField.CAPITAL_GAIN_TAX] = apply_rate(self.state[TaxField.CAPITAL_GAIN_3VG],
+                                                           tax_rules.capital_gain_tax_rate)
+
+    def compute_net_taxes(self):
+        all_taxes_before_capping = self.state[TaxField.TAX_BEFORE_REDUCTIONS] \
+                                   - self.state[TaxField.CHARITY_REDUCTION]
+        taxes_with_reduction_before_capping = all_taxes_before_capping - self.state[TaxField.SME_SUBSCRIPTION_REDUCTION]
+        partial_taxes_2 = max(taxes_with_reduction_before_capping, 0) - self.state[TaxField.CHILDREN_DAYCARE_TAXCREDIT]\
+            - self.state[TaxField.HOME_SERVICES_TAXCREDIT]
+
+        fiscal_advantages = all_taxes_before_capping - partial_taxes_2
+        ceiling = tax_rules.global_fiscal_advantages_ceiling * 100
+        if fiscal_advantages > ceiling:
+            self.flags[TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES] = FlagValue(ceiling, fiscal_advantages, ceiling,
+                                                                         fiscal_advantages - ceiling)
+            net_taxes_after_global_capping = all_taxes_before_capping - ceiling
+        else:
+            self.flags[TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES] = FlagValue(fiscal_advantages, fiscal_advantages, ceiling,
+                                                                         0)
+            net_taxes_after_global_capping = partial_taxes_2
+        if self.trace is not None:
+            self._trace("compute_net_taxes", Capping, "GLOBAL_FISCAL_ADVANTAGES", fiscal_advantages, None, ceiling,
+                        min(fiscal_advantages, ceiling))
+
+        self.state[TaxField.NET_TAXES] = net_taxes_after_global_capping + self.state[TaxField.CAPITAL_GAIN_TAX] \
+            - self.state[TaxField.INTEREST_TAX_ALREADY_PAID_2CK]
+
+    def compute_social_taxes(self):
+        csg_crds_base = self.state[TaxField.CAPITAL_GAIN_3VG] \
+                        + self.state[TaxField.TAXABLE_ACQUISITION_GAIN_1TZ] \
+                        + self.state[TaxField.ACQUISITION_GAIN_REBATES_1UZ] \
+                        + self.state[TaxField.ACQUISITION_GAIN_50P_REBATES_1WZ] \
+                        + (self.state[TaxField.TAXABLE_INVESTMENT_INCOME]
+                           - self.state[TaxField.FIXED_INCOME_INTERESTS_ALREADY_TAXED_2BH]) \
+                        + max(self.state[TaxField.RENTAL_INCOME_RESULT], 0) \
+                        + self.state[TaxField.TAXABLE_LMNP_INCOME]
+        activity_income_crds_base = self.state[TaxField.EXERCISE_GAIN_1_1TT] + self.state[TaxField.EXERCISE_GAIN_2_1UT]
+        salary_contrib_10p_base = self.state[TaxField.EXERCISE_GAIN_1_1TT] + self.state[TaxField.EXERCISE_GAIN_2_1UT]
+
+        csg_crds_taxes = apply_rate(csg_crds_base + activity_income_crds_base, tax_rules.csg_crds_rate, unit=100)
+        solidarity_75_taxes = apply_rate(csg_crds_base, tax_rules.solidarity_rate, unit=100)
+        salary_contrib_10p = apply_rate(salary_contrib_10p_base, tax_rules.salary_contribution_rate)
+        self.state[TaxField.NET_SOCIAL_TAXES] = csg_crds_taxes + solidarity_75_taxes + salary_contrib_10p
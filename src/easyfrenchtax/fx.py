@@ -0,0 +1,206 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from datetime import date
+from math import isnan
+from typing import Any, Iterable, Optional, Sequence
+
+NO_RATE = float("nan")  # a day without rate (only when the missing rates were not interpolated)
+
+# Snapshot files of a rate table (see FxRateTable.save): a header, a directory of the currencies, then the rates of each
+# currency as little-endian doubles, one per day from its first day, aligned on 8 bytes
+SNAPSHOT_MAGIC = b"EFTXRATE"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sHH3sxI")  # magic, version, fallback_on_wrong_date, reference currency, nb currencies
+SNAPSHOT_ENTRY = struct.Struct("<3sxiIQ")  # currency, first day (ordinal), nb days, offset of the rates in the file
+
+
+class FxRateTable:
+    # Exchange rates of each currency (units of the currency for 1 unit of the reference currency), one per day from the
+    # first to the last date known for the currency: a lookup is an index in an array, instead of the date searches of
+    # CurrencyConverter. Its fallbacks are resolved when the table is built: missing rates are the ones it interpolated,
+    # and dates out of the bounds of a currency use the closest rate (fallback_on_wrong_date), or are errors.
+    # The table has the interface of CurrencyConverter.convert(), and gives the same results.
+    ref_currency: str
+    fallback_on_wrong_date: bool
+    first_days: dict[str, int]  # ordinal of the first day of each currency
+    rates: dict[str, Sequence[float]]
+
+    def __init__(self, first_days: dict[str, int], rates: dict[str, Sequence[float]], ref_currency: str = "EUR",
+                 fallback_on_wrong_date: bool = True):
+        if set(first_days) != set(rates):
+            raise Exception("The rate table must have a first day for each currency")
+        self.ref_currency = ref_currency
+        self.fallback_on_wrong_date = fallback_on_wrong_date
+        self.first_days = first_days
+        self.rates = rates
+
+    @classmethod
+    def from_converter(cls, converter: Any) -> "FxRateTable":
+        # from a loaded CurrencyConverter: its rates (interpolated or not, depending on its fallback_on_missing_rate)
+        # fill a dense array per currency
+        first_days = {}
+        rates = {}
+        for currency, currency_rates in converter._rates.items():
+            first_date, last_date = converter.bounds[currency]
+            first_day = first_date.toordinal()
+            table = array("d", [NO_RATE]) * (last_date.toordinal() - first_day + 1)
+            for day, rate in currency_rates.items():
+                if rate is not None:
+                    table[day.toordinal() - first_day] = rate
+            first_days[currency] = first_day
+            rates[currency] = table
+        return cls(first_days, rates, converter.ref_currency, converter.fallback_on_wrong_date)
+
+    # Writes the table as a snapshot file. The file is written next to its destination, then atomically renamed: the
+    # processes reading (or mapping) the previous file keep it, the ones loading it afterwards get the new one.
+    def save(self, path: str):
+        currencies = sorted(self.rates)
+        if any(len(currency.encode()) != 3 for currency in currencies + [self.ref_currency]):
+            raise Exception("Snapshots only support 3-letter currency codes")
+        offset = SNAPSHOT_HEADER.size + SNAPSHOT_ENTRY.size * len(currencies)
+        directory = []
+        for currency in currencies:
+            offset += -offset % 8
+            directory.append(SNAPSHOT_ENTRY.pack(currency.encode(), self.first_days[currency],
+                                                 len(self.rates[currency]), offset))
+            offset += 8 * len(self.rates[currency])
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(os.path.abspath(path)), delete=False) as f:
+            try:
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.fallback_on_wrong_date,
+                                             self.ref_currency.encode(), len(currencies)))
+                f.write(b"".join(directory))
+                for currency in currencies:
+                    f.write(b"\0" * (-f.tell() % 8))
+                    rates = array("d", self.rates[currency])
+                    if sys.byteorder == "big":
+                        rates.byteswap()
+                    f.write(rates.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+                os.chmod(f.name, 0o644)  # readable by the workers, like a file created with open()
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+
+    # A table on a snapshot file, memory-mapped: the rates are not copied, all the processes of a host share the pages of
+    # the file (in the OS cache)
+    @classmethod
+    def load(cls, path: str) -> "FxRateTable":
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(data) < SNAPSHOT_HEADER.size:
+            raise Exception(f"{path} is not a rate snapshot")
+        magic, version, fallback_on_wrong_date, ref_currency, nb_currencies = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC:
+            raise Exception(f"{path} is not a rate snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise Exception(f"{path} is a rate snapshot of version {version}, expected {SNAPSHOT_VERSION}")
+        view = memoryview(data)
+        first_days = {}
+        rates = {}
+        for i in range(nb_currencies):
+            currency, first_day, nb_days, offset = SNAPSHOT_ENTRY.unpack_from(
+                data, SNAPSHOT_HEADER.size + i * SNAPSHOT_ENTRY.size)
+            if offset % 8 or offset + 8 * nb_days > len(data):
+                raise Exception(f"{path} is a corrupted rate snapshot")
+            currency = currency.decode()
+            first_days[currency] = first_day
+            if sys.byteorder == "little":
+                rates[currency] = view[offset:offset + 8 * nb_days].cast("d")
+            else:  # the file can't be used as is: copy
+                rates[currency] = array("d", view[offset:offset + 8 * nb_days].tobytes())
+                rates[currency].byteswap()
+        return cls(first_days, rates, ref_currency.decode(), bool(fallback_on_wrong_date))
+
+    @property
+    def currencies(self) -> set[str]:
+        return set(self.rates) | {self.ref_currency}
+
+    def _rates_of(self, currency: str) -> tuple[int, Sequence[float]]:
+        try:
+            return self.first_days[currency], self.rates[currency]
+        except KeyError:
+            raise Exception(f"{currency} is not a supported currency") from None
+
+    def _lookup(self, currency: str, first_day: int, rates: Sequence[float], day: int) -> float:
+        index = day - first_day
+        if not 0 <= index < len(rates):
+            if not self.fallback_on_wrong_date:
+                raise Exception(f"{date.fromordinal(day)} not in {currency} bounds {date.fromordinal(first_day)}/"
+                                f"{date.fromordinal(first_day + len(rates) - 1)}")
+            index = 0 if index < 0 else len(rates) - 1
+        rate = rates[index]
+        if isnan(rate):
+            raise Exception(f"{currency} has no rate for {date.fromordinal(first_day + index)}")
+        return rate
+
+    def _last_day(self, currency: str) -> int:
+        if currency == self.ref_currency:  # the last day of all the currencies
+            return max(first_day + len(self.rates[c]) - 1 for c, first_day in self.first_days.items())
+        first_day, rates = self._rates_of(currency)
+        return first_day + len(rates) - 1
+
+    # The rate of a currency on a day (an ordinal, see date.toordinal)
+    def rate(self, currency: str, day: int) -> float:
+        if currency == self.ref_currency:
+            return 1.0
+        return self._lookup(currency, *self._rates_of(currency), day)
+
+    # Same as CurrencyConverter.convert(): without date, the last rate of the currency is used
+    def convert(self, amount: float, currency: str, new_currency: str = "EUR", date: Optional[date] = None) -> float:
+        if date is None:
+            day = self._last_day(currency)
+        else:
+            day = date.toordinal()
+        return float(amount) / self.rate(currency, day) * self.rate(new_currency, day)
+
+    # Conversion of many amounts from the same currency, each one at its date (e.g. the acquisitions of a lot of stocks)
+    def convert_many(self, amounts: Iterable[float], currency: str, dates: Iterable[date],
+                     new_currency: str = "EUR") -> list[float]:
+        days = [d.toordinal() for d in dates]
+        rates = self._rates_for(currency, days)
+        if new_currency == self.ref_currency:
+            return [float(amount) / rate for amount, rate in zip(amounts, rates)]
+        new_rates = self._rates_for(new_currency, days)
+        return [float(amount) / rate * new_rate for amount, rate, new_rate in zip(amounts, rates, new_rates)]
+
+    def _rates_for(self, currency: str, days: list[int]) -> list[float]:
+        if currency == self.ref_currency:
+            return [1.0] * len(days)
+        first_day, rates = self._rates_of(currency)
+        size = len(rates)
+        result = []
+        for day in days:
+            index = day - first_day
+            rate = rates[index] if 0 <= index < size else NO_RATE
+            if isnan(rate):  # out of bounds, or no rate: the checks and errors of a single lookup
+                rate = self._lookup(currency, first_day, rates, day)
+            result.append(rate)
+        return result
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Compiles the history of the ECB exchange rates into a snapshot file, "
+                                                 "memory-mapped by the stock helpers (see FxRateTable.load).")
+    parser.add_argument("output", help="snapshot file, atomically replaced if it exists")
+    parser.add_argument("--source", help="ECB rates file (CSV or zip, path or URL), by default the one shipped with "
+                                         "currency_converter")
+    parser.add_argument("--no-interpolation", action="store_true",
+                        help="keep the missing rates missing (conversions at these dates fail)")
+    args = parser.parse_args(argv)
+
+    from currency_converter import CurrencyConverter
+    source = {"currency_file": args.source} if args.source else {}
+    converter = CurrencyConverter(**source, fallback_on_wrong_date=True,
+                                  fallback_on_missing_rate=not args.no_interpolation)
+    FxRateTable.from_converter(converter).save(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Callable, Iterator, Optional
+
+from . import tax_simulator
+from .tax_simulator import TaxSimulator, stages
+
+
+class Registry:
+    # Call counts and cumulated wall time (in seconds) of the instrumented functions: the stages of TaxSimulator (their
+    # time includes the tax_round calls they make) and tax_round. Aggregated across all simulations until reset.
+    calls: defaultdict[str, int]
+    seconds: defaultdict[str, float]
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    def reset(self):
+        self.calls.clear()
+        self.seconds.clear()
+
+    def dump(self) -> dict[str, dict[str, Any]]:
+        return {name: {"calls": self.calls[name], "seconds": self.seconds[name]} for name in sorted(self.calls)}
+
+    # Prometheus text exposition format, for scraping
+    def prometheus(self, prefix: str = "easyfrenchtax") -> str:
+        lines = [f"# HELP {prefix}_calls_total Number of calls of the function",
+                 f"# TYPE {prefix}_calls_total counter"]
+        lines += [f'{prefix}_calls_total{{name="{name}"}} {self.calls[name]}' for name in sorted(self.calls)]
+        lines += [f"# HELP {prefix}_seconds_total Wall time spent in the function",
+                  f"# TYPE {prefix}_seconds_total counter"]
+        lines += [f'{prefix}_seconds_total{{name="{name}"}} {self.seconds[name]!r}' for name in sorted(self.calls)]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# the original functions replaced while instrumentation is enabled: (owner, attribute, function)
+_patched: list[tuple[Any, str, Callable]] = []
+
+
+def _timed(name: str, function: Callable, target: Registry) -> Callable:
+    calls = target.calls
+    seconds = target.seconds
+
+    def timed(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds[name] += perf_counter() - start
+            calls[name] += 1
+
+    timed.__wrapped__ = function
+    return timed
+
+
+def _simulator_classes(cls: type) -> list[type]:
+    return [cls] + [c for subclass in cls.__subclasses__() for c in _simulator_classes(subclass)]
+
+
+def _patch(owner: Any, attribute: str, target: Registry):
+    function = owner.__dict__[attribute]
+    _patched.append((owner, attribute, function))
+    setattr(owner, attribute, _timed(attribute, function, target))
+
+
+def enabled() -> bool:
+    return bool(_patched)
+
+
+# Instruments the stages of TaxSimulator (and of its subclasses overriding them) and tax_round, recording into the given
+# registry (the module one by default). Instrumentation swaps the functions themselves: when it's disabled, the
+# original ones are back and cost nothing more than before.
+def enable(target: Optional[Registry] = None) -> Registry:
+    target = target or registry
+    if enabled():
+        raise Exception("Instrumentation is already enabled")
+    for cls in _simulator_classes(TaxSimulator):
+        for stage in stages:
+            if stage.method in cls.__dict__:
+                _patch(cls, stage.method, target)
+    _patch(tax_simulator, "tax_round", target)
+    return target
+
+
+def disable():
+    while _patched:
+        owner, attribute, function = _patched.pop()
+        setattr(owner, attribute, function)
+
+
+# Enables the instrumentation for a block:
+#     with instrumented() as stats:
+#         ...
+#     print(stats.dump())
+@contextmanager
+def instrumented(target: Optional[Registry] = None) -> Iterator[Registry]:
+    target = enable(target)
+    try:
+        yield target
+    finally:
+        disable()
@@ -0,0 +1,181 @@
+from collections import namedtuple
+from itertools import product
+from math import ceil, floor
+from typing import Any, Iterable
+
+import numpy as np
+
+from .batch_simulator import BatchTaxSimulator
+from .tax_curve import tax_curve
+from .tax_parameters import registry
+from .tax_simulator import TaxField, tax_round, tax_rules
+
+# The best use of a budget: the amounts to add to each field (only the non-zero ones), the resulting net taxes, the
+# amount actually spent (spending more would not lower the taxes further), and the number of allocations simulated.
+Allocation = namedtuple("Allocation", ["changes", "net_taxes", "spent", "candidates"])
+# What the reductions depend on, for a PER transfer
+PerState = namedtuple("PerState", ["taxable_income", "tax_before_reductions", "credits"])
+
+# Instruments dominated by another one of the same cap, never worth using when the other one is available:
+# - CHARITY_DONATION_7UF: 66%, like the part of 7UD above the 75% tier, within the same 20% of the taxable income
+# - SME_CAPITAL_SUBSCRIPTION_7CF: 18% instead of 25% for 7CH, within the same subscription cap
+# - PER_TRANSFERS_2_6NT: deducted from the same household taxable income as 6NS
+DONATION = TaxField.CHARITY_DONATION_7UD
+SME_SUBSCRIPTION = TaxField.SME_CAPITAL_SUBSCRIPTION_7CH
+PER_TRANSFER = TaxField.PER_TRANSFERS_1_6NS
+INSTRUMENTS = [PER_TRANSFER, DONATION, SME_SUBSCRIPTION]
+
+REFINEMENT_WIDTH = 4  # integers simulated around each estimated root, the rounding of the taxes moves it by a few euros
+
+
+def _per_states(statement_year: int, tax_input: dict[TaxField, Any], pers: Iterable[int]) -> dict[int, PerState]:
+    pers = sorted(set(pers))
+    columns = dict(tax_input)
+    columns[PER_TRANSFER] = np.array(pers) + tax_input.get(PER_TRANSFER, 0)
+    batch = BatchTaxSimulator(statement_year, columns)
+    credits = batch.state[TaxField.CHILDREN_DAYCARE_TAXCREDIT] + batch.state[TaxField.HOME_SERVICES_TAXCREDIT]
+    return {per: PerState(batch.state[TaxField.TAXABLE_INCOME][i].item(),
+                          batch.state[TaxField.TAX_BEFORE_REDUCTIONS][i].item(), credits[i].item())
+            for i, per in enumerate(pers)}
+
+
+def _charity_reduction(existing: dict[TaxField, Any], donation: float, taxable_income: float) -> float:
+    # same rules as compute_tax_reductions, with the donation added to the existing ones
+    donations = existing.get(DONATION, 0) + donation
+    leftover = existing.get(TaxField.CHARITY_DONATION_7UF, 0) + max(donations - tax_rules.charity_75p_ceiling, 0)
+    cap = max(taxable_income, 0) * tax_rules.charity_66p_income_share
+    return min(donations, tax_rules.charity_75p_ceiling) * tax_rules.charity_75p_rate \
+        + tax_round(min(leftover, cap)) * tax_rules.charity_66p_rate
+
+
+def _subscription_headroom(existing: dict[TaxField, Any], married: bool) -> tuple[float, float]:
+    # subscriptions left within the cap, and the reduction of the existing ones
+    ceiling = tax_rules.sme_subscription_ceiling_married if married else tax_rules.sme_subscription_ceiling_single
+    before = min(existing.get(TaxField.SME_CAPITAL_SUBSCRIPTION_7CF, 0), ceiling)
+    after = min(existing.get(SME_SUBSCRIPTION, 0), ceiling - before)
+    reduction = before * tax_rules.sme_subscription_rate_7cf + after * tax_rules.sme_subscription_rate_7ch
+    return max(ceiling - before - after, 0), reduction
+
+
+def _donation_points(existing: dict[TaxField, Any], state: PerState) -> list[float]:
+    # none, end of the 75% tier, end of the 20% of taxable income cap, donations cancelling the taxes within the tier
+    # and beyond it. Linear in the PER transfer between its breakpoints (out of bounds values included).
+    donations = existing.get(DONATION, 0)
+    leftover = existing.get(TaxField.CHARITY_DONATION_7UF, 0) + max(donations - tax_rules.charity_75p_ceiling, 0)
+    tier_75p = max(tax_rules.charity_75p_ceiling - donations, 0)
+    cap_66p = state.taxable_income * tax_rules.charity_66p_income_share - leftover
+    remaining_taxes = state.tax_before_reductions - _charity_reduction(existing, 0, state.taxable_income)
+    return [0, tier_75p, tier_75p + cap_66p, remaining_taxes / tax_rules.charity_75p_rate,
+            tier_75p + (remaining_taxes - tier_75p * tax_rules.charity_75p_rate) / tax_rules.charity_66p_rate]
+
+
+def _subscription_points(headroom: float, existing_reduction: float, credits: float,
+                         remaining_taxes: float) -> list[float]:
+    # none, end of the subscription cap, subscriptions reaching the global cap of fiscal advantages, subscriptions
+    # cancelling the remaining taxes
+    rate = tax_rules.sme_subscription_rate_7ch
+    return [0, headroom, (tax_rules.global_fiscal_advantages_ceiling - credits - existing_reduction) / rate,
+            (remaining_taxes - existing_reduction) / rate]
+
+
+def _budget_gap(existing: dict[TaxField, Any], married: bool, budget: int, per: int, state: PerState,
+                donation_point: int, subscription_point: int) -> float:
+    # amount of the allocation made of a PER transfer, a donation point and a subscription point, beyond the budget
+    donation = _donation_points(existing, state)[donation_point]
+    remaining_taxes = state.tax_before_reductions - _charity_reduction(existing, donation, state.taxable_income)
+    subscription = _subscription_points(*_subscription_headroom(existing, married), state.credits,
+                                        remaining_taxes)[subscription_point]
+    return per + donation + subscription - budget
+
+
+def _integers_around(value: float, low: int, high: int) -> set[int]:
+    return {v for v in (floor(value), ceil(value)) if low <= v <= high}
+
+
+def _per_points(statement_year: int, tax_input: dict[TaxField, Any], budget: int) -> list[int]:
+    # the PER transfers between which the reductions are linear in the transfer: where the marginal rate or the capping
+    # of the family quotient change, where the scale without family quotient changes bracket (it applies once capped),
+    # and where the taxable income reaches 0 or the donations already made reach the 20% cap (besides none, and all the
+    # budget)
+    base = tax_input.get(PER_TRANSFER, 0)
+    curve = tax_curve(statement_year, tax_input, PER_TRANSFER, [base, base + budget])
+    taxable_income = _per_states(statement_year, tax_input, [0])[0].taxable_income
+    base_shares = 2 if tax_input.get(TaxField.MARRIED) else 1
+    parameters = registry.parameters(statement_year)
+    donations = tax_input.get(DONATION, 0)
+    leftover = tax_input.get(TaxField.CHARITY_DONATION_7UF, 0) + max(donations - tax_rules.charity_75p_ceiling, 0)
+    kinks = [b.value - base for b in curve.breakpoints]
+    kinks += [taxable_income - threshold * base_shares for threshold in parameters.slices_thresholds]
+    kinks += [taxable_income, taxable_income - leftover / tax_rules.charity_66p_income_share]
+    points = {0, budget}
+    for kink in kinks:
+        points |= _integers_around(kink, 0, budget)
+    return sorted(points)
+
+
+# Splits a budget between charity donations (7UD), SME capital subscriptions (7CH) and PER transfers (6NS), on top of
+# what the household already declares, to minimize its net taxes. The net taxes are piecewise linear in the three
+# amounts, so the optimum is at a vertex: amounts at the kinks of the reductions (the end of the 75% tier, the 20% of
+# taxable income cap of donations, the subscription cap, the 10'000€ global cap of fiscal advantages, the amounts
+# cancelling the taxes), or taking the rest of the budget. The kinks of donations and subscriptions move with the PER
+# transfer (through the taxable income and the taxes), so besides the breakpoints of the tax curve, the PER transfers
+# tried are the roots of "PER + donation kink + subscription kink = budget" on each linear piece, refined on the
+# simulated taxes. All the candidates are simulated in one batch; the cheapest of the best ones is returned.
+def optimize_deductions(statement_year: int, tax_input: dict[TaxField, Any], budget: int) -> Allocation:
+    budget = int(budget)
+    married = bool(tax_input.get(TaxField.MARRIED))
+    headroom, existing_reduction = _subscription_headroom(tax_input, married)
+    points = _per_points(statement_year, tax_input, budget)
+    states = _per_states(statement_year, tax_input, points)
+
+    def gap(per: int, state: PerState, donation_point: int, subscription_point: int) -> float:
+        return _budget_gap(tax_input, married, budget, per, state, donation_point, subscription_point)
+
+    combinations = [c for c in product(range(5), range(4)) if c != (0, 0)]
+    roots = []  # (combination, estimated root, low, high)
+    for low, high in zip(points, points[1:]):
+        for combination in combinations:
+            gap_low, gap_high = gap(low, states[low], *combination), gap(high, states[high], *combination)
+            if (gap_low < 0 < gap_high) or (gap_high < 0 < gap_low):
+                roots.append((combination, low + (high - low) * gap_low / (gap_low - gap_high), low, high))
+    windows = [range(max(floor(root) - REFINEMENT_WIDTH, low), min(ceil(root) + REFINEMENT_WIDTH, high) + 1)
+               for _, root, low, high in roots]
+    if windows:
+        states.update(_per_states(statement_year, tax_input, set().union(*windows)))
+    pers = set(points)
+    for (combination, root, low, high), window in zip(roots, windows):
+        gaps = [gap(per, states[per], *combination) for per in window]
+        crossings = [per for per, gap_low, gap_high in zip(window, gaps, gaps[1:]) if (gap_low <= 0) != (gap_high <= 0)]
+        for per in crossings:
+            pers |= {per, per + 1}
+        if not crossings:
+            pers |= _integers_around(root, low, high)
+
+    candidates = set()
+    for per in pers:
+        state = states[per]
+        available = budget - per
+        donations = {0, available}
+        for point in _donation_points(tax_input, state):
+            donations |= _integers_around(point, 0, available)
+        for donation in donations:
+            reduction = _charity_reduction(tax_input, donation, state.taxable_income)
+            remaining_taxes = state.tax_before_reductions - reduction
+            rest = min(available - donation, headroom)
+            subscriptions = {0, rest}
+            for point in _subscription_points(headroom, existing_reduction, state.credits, remaining_taxes):
+                subscriptions |= _integers_around(point, 0, rest)
+            candidates.update((per, donation, subscription) for subscription in subscriptions)
+            # the rest of the budget to donations, once the subscription is chosen
+            candidates.update((per, available - subscription, subscription) for subscription in subscriptions)
+    candidates = sorted(candidates, key=lambda c: (sum(c), c))
+
+    columns = dict(tax_input)
+    for n, field in enumerate(INSTRUMENTS):
+        columns[field] = np.array([c[n] for c in candidates]) + tax_input.get(field, 0)
+    batch = BatchTaxSimulator(statement_year, columns)
+    net_taxes = batch.state[TaxField.NET_TAXES]
+    best = int(np.argmin(net_taxes))  # first of the minima: the cheapest
+    changes = {field: amount for field, amount in zip(INSTRUMENTS, candidates[best]) if amount}
+    return Allocation(changes=changes, net_taxes=net_taxes[best].item(), spent=sum(candidates[best]),
+                      candidates=len(candidates))
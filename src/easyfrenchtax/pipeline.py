@@ -0,0 +1,54 @@
+from collections import namedtuple
+from functools import partial
+from typing import Any, Iterable, Iterator, Optional
+
+from .batch_runner import InvalidRecord, map_chunks
+from .tax_simulator import TaxField, TaxInfoFlag, TaxSimulator
+
+
+# The type of the results of a pipeline: a namedtuple with one attribute per kept field (named after the field value,
+# e.g. result.net_taxes), one per kept flag (named after the flag, e.g. result.MARGINAL_TAX_RATE, None if the flag is
+# not set), and "error" (None, or the message of the exception raised by the simulation, the other attributes then
+# being None).
+def result_type(fields: Iterable[TaxField], flags: Iterable[TaxInfoFlag] = ()) -> type:
+    return namedtuple("SimulationResult", [field.value for field in fields] + [flag.name for flag in flags] + ["error"])
+
+
+def _simulate(household: dict[TaxField, Any], fields: tuple[TaxField, ...], flags: tuple[TaxInfoFlag, ...],
+              default_year: Optional[int]) -> tuple:
+    try:
+        if isinstance(household, InvalidRecord):
+            raise Exception(household.error)
+        household = dict(household)
+        year = household.pop(TaxField.YEAR, default_year)
+        if year is None:
+            raise Exception("No statement year (missing 'year' field)")
+        # lazy: only the stages the kept fields and flags depend on are run (and no flag is kept if none is asked)
+        tax_sim = TaxSimulator(year, household, lazy=True, flags=bool(flags))
+        return tuple(tax_sim[field] for field in fields) + tuple(tax_sim.flag(flag) for flag in flags) + (None,)
+    except Exception as e:
+        return (None,) * (len(fields) + len(flags)) + (str(e),)
+
+
+def _simulate_chunk(households: list[dict[TaxField, Any]], fields: tuple[TaxField, ...],
+                    flags: tuple[TaxInfoFlag, ...], default_year: Optional[int]) -> list[tuple]:
+    return [_simulate(household, fields, flags, default_year) for household in households]
+
+
+# Simulates a stream of households (any iterable, e.g. batch_runner.read_households(path) or a generator), yielding one
+# result per household, in input order, with only the requested fields and flags (see result_type). Neither the
+# simulations nor the inputs are retained, so memory stays flat whatever the size of the population. With workers > 1
+# the households are simulated by chunks across worker processes, with a bounded number of chunks in flight.
+def simulate_stream(households: Iterable[dict[TaxField, Any]], fields: Iterable[TaxField],
+                    flags: Iterable[TaxInfoFlag] = (), default_year: Optional[int] = None, workers: int = 1,
+                    chunk_size: int = 256) -> Iterator[tuple]:
+    fields = tuple(fields)
+    flags = tuple(flags)
+    result = result_type(fields, flags)._make
+    if workers == 1:
+        for household in households:
+            yield result(_simulate(household, fields, flags, default_year))
+    else:
+        simulate_chunk = partial(_simulate_chunk, fields=fields, flags=flags, default_year=default_year)
+        for values in map_chunks(simulate_chunk, households, workers, chunk_size):
+            yield result(values)
@@ -0,0 +1,126 @@
+from collections import namedtuple
+from typing import Any, Optional
+
+from .tax_simulator import TaxField, TaxInfoFlag, TaxSimulator
+
+# A rental deficit still to be deducted from future rental income: the statement year it was declared in, and what is
+# left of it
+RentalDeficit = namedtuple("RentalDeficit", ["year", "amount"])
+
+# Rental deficits can be carried over to the rental income of the 10 following years, see
+# https://www.impots.gouv.fr/particulier/questions/comment-imputer-un-deficit-foncier
+DEFICIT_CARRYOVER_YEARS = 10
+
+
+def _consume(deficits: list[RentalDeficit], amount: float) -> list[RentalDeficit]:
+    # deducts an amount from the deficits, oldest first
+    remaining = []
+    for deficit in deficits:
+        used = min(deficit.amount, amount)
+        amount -= used
+        if deficit.amount > used:
+            remaining.append(RentalDeficit(deficit.year, deficit.amount - used))
+    return remaining
+
+
+# Simulates a household over consecutive statement years, chaining the rental deficit carried over from each year
+# (RENTAL_DEFICIT_CARRYOVER) into the previous deficits of the next one (PREVIOUS_RENTAL_INCOME_DEFICIT_4BD): 4BD inputs
+# after the first year are replaced by the carried deficits. Deficits are tracked by year of origin, consumed oldest
+# first, and expire after DEFICIT_CARRYOVER_YEARS years. The deficits already carried at the start can be given with
+# their years of origin; otherwise, the 4BD input of the first year is taken as a deficit of the year before.
+class TaxProjection:
+    years: list[int]
+    inputs: dict[int, dict[TaxField, Any]]
+    simulations: dict[int, TaxSimulator]
+    deficits: dict[int, list[RentalDeficit]]  # deficits available for each year
+    expired: dict[int, list[RentalDeficit]]  # deficits expiring at the start of each year
+    remaining: dict[int, list[RentalDeficit]]  # deficits left after each year (incl. the new deficit of the year)
+
+    def __init__(self, yearly_inputs: dict[int, dict[TaxField, Any]],
+                 previous_deficits: Optional[list[RentalDeficit]] = None):
+        self.years = sorted(yearly_inputs)
+        if self.years != list(range(self.years[0], self.years[-1] + 1)):
+            raise Exception(f"The years of a projection must be consecutive (got {self.years})")
+        self.inputs = {year: dict(yearly_inputs[year]) for year in self.years}
+        first_year = self.years[0]
+        if previous_deficits is None:
+            initial_deficit = self.inputs[first_year].get(TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD, 0)
+            previous_deficits = [RentalDeficit(first_year - 1, initial_deficit)] if initial_deficit else []
+        self._previous_deficits = sorted(previous_deficits)
+        self.simulations = {}
+        self.deficits = {}
+        self.expired = {}
+        self.remaining = {}
+        for year in self.years:
+            self._carry_into(year)
+            self.simulations[year] = TaxSimulator(year, self._year_input(year))
+            self._carry_out_of(year)
+
+    def _carry_into(self, year: int):
+        carried = self._previous_deficits if year == self.years[0] else self.remaining[year - 1]
+        self.deficits[year] = [d for d in carried if d.year >= year - DEFICIT_CARRYOVER_YEARS]
+        self.expired[year] = [d for d in carried if d.year < year - DEFICIT_CARRYOVER_YEARS]
+
+    def _previous_deficit(self, year: int) -> Optional[float]:
+        return sum(d.amount for d in self.deficits[year]) or None
+
+    def _year_input(self, year: int) -> dict[TaxField, Any]:
+        year_input = dict(self.inputs[year])
+        year_input.pop(TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD, None)
+        previous_deficit = self._previous_deficit(year)
+        if previous_deficit:
+            year_input[TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD] = previous_deficit
+        return year_input
+
+    def _carry_out_of(self, year: int):
+        state = self.simulations[year].state
+        previous_deficit = state.get(TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD, 0)
+        new_deficit = state.get(TaxField.REAL_RENTAL_INCOME_DEFICIT_4BB, 0)
+        carryover = state.get(TaxField.RENTAL_DEFICIT_CARRYOVER, 0)
+        remaining = _consume(self.deficits[year], previous_deficit + new_deficit - carryover)
+        if new_deficit:
+            remaining.append(RentalDeficit(year, new_deficit))
+        self.remaining[year] = remaining
+
+    # Changes some inputs of a year (like TaxSimulator.update), then carries the change forward: following years are
+    # updated as long as the deficits they receive change, and only in their stages depending on 4BD. Returns the years
+    # whose simulation was updated.
+    def update(self, year: int, changes: Optional[dict[TaxField, Any]] = None, **fields) -> list[int]:
+        changes = dict(changes or {})
+        changes.update((TaxField[name], value) for name, value in fields.items())
+        if TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD in changes and year != self.years[0]:
+            raise Exception("Previous rental deficits (4BD) are carried from the previous year of the projection")
+        for field, value in changes.items():
+            if value is None:
+                self.inputs[year].pop(field, None)
+            else:
+                self.inputs[year][field] = value
+        if TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD in changes:
+            value = changes[TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD]
+            self._previous_deficits = [RentalDeficit(year - 1, value)] if value else []
+            self._carry_into(year)
+            changes[TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD] = self._previous_deficit(year)
+        self.simulations[year].update(changes)
+        updated = [year]
+        for next_year in self.years[self.years.index(year) + 1:]:
+            remaining = self.remaining[next_year - 1]
+            self._carry_out_of(next_year - 1)
+            if self.remaining[next_year - 1] == remaining:
+                break
+            previous_deficit = self._previous_deficit(next_year)
+            self._carry_into(next_year)
+            if self._previous_deficit(next_year) != previous_deficit:
+                self.simulations[next_year].update(
+                    {TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD: self._previous_deficit(next_year)})
+                updated.append(next_year)
+        else:
+            self._carry_out_of(self.years[-1])
+        return updated
+
+    # the values of a field over the years of the projection
+    def field(self, field: TaxField) -> dict[int, Any]:
+        return {year: self.simulations[year].state.get(field, 0) for year in self.years}
+
+    # the texts of a flag over the years of the projection (None for the years where it isn't set)
+    def flags(self, flag: TaxInfoFlag) -> dict[int, Optional[str]]:
+        return {year: self.simulations[year].flags.get(flag) for year in self.years}
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import sqlite3
+from collections import namedtuple
+from threading import Lock
+from typing import Any, Optional
+
+from .tax_parameters import registry
+from .tax_simulator import RULES_VERSION, FlagValue, Flags, TaxField, TaxInfoFlag, TaxSimulator
+
+# A stored simulation: its state, and its flags (texts formatted on access, numbers in flags.records)
+StoredSimulation = namedtuple("StoredSimulation", ["state", "flags"])
+
+
+# The key of a simulation: a hash of everything its result depends on, i.e. the simulator (and its version of the
+# rules), the parameters of the year and the input (with the type of each value, int and float inputs don't give the
+# same flags texts). Changing any of them gives another key: the results stored before are simply not found anymore.
+def result_key(simulator: type, statement_year: int, tax_input: dict[TaxField, Any]) -> str:
+    parameters = registry.parameters(statement_year)
+    content = json.dumps([
+        simulator.__module__, simulator.__qualname__, RULES_VERSION,
+        statement_year, parameters._asdict(),
+        sorted([field.value, type(value).__name__, value] for field, value in tax_input.items()),
+    ], default=repr)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class ResultStore:
+    # Results of simulations kept in a SQLite file, so that re-running unchanged households skips their computation
+    # (e.g. nightly runs over a whole population). Results are invalidated by any change of their key (see result_key);
+    # stale ones can be removed with clear(). The database is in WAL mode: worker processes can read it concurrently
+    # while one writes. A store can be sent to other processes, each one opening its own connection. Simulations raising
+    # an exception are not stored.
+    path: str
+    simulator: type
+    hits: int
+    misses: int
+
+    def __init__(self, path: str, simulator: type = TaxSimulator):
+        self.path = path
+        self.simulator = simulator
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._connection = None
+        self._pid = None
+        with self._lock:
+            self._connect().execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, state TEXT NOT NULL, "
+                                    "flags TEXT NOT NULL)")
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"path": self.path, "simulator": self.simulator}
+
+    def __setstate__(self, state: dict[str, Any]):
+        self.__init__(state["path"], state["simulator"])
+
+    def _connect(self) -> sqlite3.Connection:
+        # one connection per process (a forked process must not use the connection of its parent)
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, statement_year: int, tax_input: dict[TaxField, Any]) -> Optional[StoredSimulation]:
+        return self._get(result_key(self.simulator, statement_year, tax_input))
+
+    def _get(self, key: str) -> Optional[StoredSimulation]:
+        with self._lock:
+            row = self._connect().execute("SELECT state, flags FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        state = {TaxField(field): value for field, value in json.loads(row[0]).items()}
+        flags = Flags(self.simulator.flag_formats)
+        for flag, record in json.loads(row[1]).items():
+            flags[TaxInfoFlag[flag]] = FlagValue(*record)
+        return StoredSimulation(state, flags)
+
+    # The result of the simulation of an input, from the store if it's there, otherwise simulated and stored
+    def simulate(self, statement_year: int, tax_input: dict[TaxField, Any]) -> StoredSimulation:
+        key = result_key(self.simulator, statement_year, tax_input)
+        stored = self._get(key)
+        if stored is not None:
+            self.hits += 1
+            return stored
+        self.misses += 1
+        tax_sim = self.simulator(statement_year, tax_input)
+        state = json.dumps({field.value: value for field, value in tax_sim.state.items()})
+        flags = json.dumps({flag.name: list(record) for flag, record in tax_sim.flags.records.items()})
+        with self._lock:
+            self._connect().execute("INSERT OR REPLACE INTO results (key, state, flags) VALUES (?, ?, ?)",
+                                    (key, state, flags))
+        return StoredSimulation(dict(tax_sim.state), tax_sim.flags)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM results")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._pid = None
@@ -0,0 +1,153 @@
+from collections import namedtuple
+from math import ceil, floor, log2
+from typing import Any
+
+from .tax_simulator import TaxField, TaxSimulator
+
+# The solution of an inverse problem: the value of the input field, the output for that value, and the number of
+# simulations it took to find it
+Solution = namedtuple("Solution", ["value", "output", "evaluations"])
+
+SAFEGUARD_SLACK = 8  # evaluations the secant steps may take ahead of the pace of bisection, see solve
+
+
+class _Evaluator:
+    # A lazy simulation of the household that is updated for each value of the input field: only the stages between
+    # the field and the output are run again.
+    def __init__(self, statement_year: int, tax_input: dict[TaxField, Any], field: TaxField, output: TaxField):
+        self.tax_sim = TaxSimulator(statement_year, tax_input, lazy=True, flags=False)
+        self.field = field
+        self.output = output
+        self.evaluations = 0
+
+    def __call__(self, value: float) -> float:
+        self.evaluations += 1
+        self.tax_sim.update({self.field: value})
+        return self.tax_sim[self.output]
+
+
+# Finds the boundary value of an input field (e.g. a salary, a PER transfer) where an output (NET_TAXES by default)
+# crosses a target: the value within [low, high] where the output is at most the target, but exceeds it one tolerance
+# further. If the output increases with the field, it's the highest value keeping the output under the target (e.g.
+# the highest salary keeping net taxes under X); if it decreases, the lowest value bringing it under the target (e.g.
+# the lowest PER transfer bringing the taxable income under X). The output must be monotonic over [low, high].
+#
+# The computation is piecewise linear (income tax brackets, 10% deduction floor and ceiling, cappings), so a secant step
+# between two values lands on the boundary as soon as both are on the same piece, in a handful of evaluations instead of
+# a scan. Where it doesn't (flat or stepped outputs, e.g. no taxes or the décote), bisection takes over (Dekker/Brent
+# safeguard): once the steps fall behind halving the bracket at every other evaluation, they are replaced by bisections,
+# which caps the cost at about 2 * log2((high - low) / tolerance) evaluations. With tolerance >= 1 and integer bounds,
+# values are integers.
+def solve(statement_year: int, tax_input: dict[TaxField, Any], field: TaxField, target: float,
+          output: TaxField = TaxField.NET_TAXES, low: float = 0, high: float = 1000000,
+          tolerance: float = 1) -> Solution:
+    evaluate = _Evaluator(statement_year, tax_input, field, output)
+    integers = isinstance(low, int) and isinstance(high, int) and tolerance >= 1
+    if integers:
+        tolerance = int(tolerance)
+    output_low, output_high = evaluate(low), evaluate(high)
+    # a: value with output <= target, b: value with output > target
+    if output_low <= target < output_high:
+        a, output_a, b, output_b = low, output_low, high, output_high
+    elif output_high <= target < output_low:
+        a, output_a, b, output_b = high, output_high, low, output_low
+    else:
+        raise Exception(f"The target {target} is not crossed by {output.value} between {field.value}={low} "
+                        f"({output_low}) and {field.value}={high} ({output_high})")
+
+    def round_towards_a(x):
+        if not integers:
+            return x
+        return floor(x) if a < b else ceil(x)
+
+    # residuals of the secant (Illinois method: the residual of an end kept twice in a row is halved, so that the
+    # secant doesn't stagnate next to it, e.g. at the far end of a convex output)
+    residual_a, residual_b = output_a - target, output_b - target
+    last_side = None
+    gallop = tolerance
+    width = abs(b - a)
+    flat_from = a  # first end a with the output of a
+    previous_b = None  # (value, output) of the end b replaced last
+
+    # secant through the two last ends b, None if they have the same output
+    def extrapolate_b():
+        if previous_b is None or previous_b[1] == output_b:
+            return None
+        return round_towards_a(b - residual_b * (b - previous_b[0]) / (output_b - previous_b[1]))
+
+    def flat_at_a():
+        # the same output at the ends a since flat_from, over more than the distance where the slope of the bracket
+        # changes it by 2 (rounded outputs, e.g. to the euro, are only flat over less)
+        return abs(a - flat_from) * abs((output_b - output_a) / (b - a)) > 2
+
+    # fewer halvings of the bracket than half the evaluations so far, beyond the slack
+    def behind() -> bool:
+        return evaluate.evaluations - 2 >= 2 * log2(width / abs(b - a)) + SAFEGUARD_SLACK
+
+    while abs(b - a) > tolerance:
+        x = round_towards_a(a - residual_a * (b - a) / (residual_b - residual_a))
+        if behind():
+            x = round_towards_a((a + b) / 2)
+        elif flat_at_a():
+            # the output is flat at a (e.g. no taxes): the secant through a tells nothing, extrapolate from the side
+            # of b, or bisect
+            x = extrapolate_b()
+            if x is None or not min(a, b) < x < max(a, b):
+                x = round_towards_a((a + b) / 2)
+        elif min(a, b) < x < max(a, b):
+            gallop = tolerance
+        else:
+            # the output is exactly the target at a (e.g. rounded taxes): the boundary is right after a, gallop to it
+            x = a + gallop if a < b else a - gallop
+            gallop *= 2
+            if not min(a, b) < x < max(a, b):
+                x = round_towards_a((a + b) / 2)
+        output_x = evaluate(x)
+        if output_x <= target:
+            flat_from = flat_from if output_x == output_a else x
+            a, output_a, residual_a = x, output_x, output_x - target
+            if last_side == "a":
+                residual_b /= 2
+            last_side = "a"
+        else:
+            previous_b = (b, output_b)
+            b, output_b, residual_b = x, output_x, output_x - target
+            if last_side == "b":
+                residual_a /= 2
+            last_side = "b"
+        # The output is rounded (to the euro, for taxes), so close to the boundary the secant can't tell how far it is:
+        # probe past it from the new value, at twice the distance predicted by the slope of the bracket (at least one
+        # tolerance), to close the bracket around the boundary instead of creeping towards it
+        slope = abs((output_b - output_a) / (b - a))
+        distance = max(tolerance, 2 * abs(output_x - target) / slope)
+        if integers:
+            distance = ceil(distance)
+        probe = x + distance if (x == a) == (a < b) else x - distance
+        if behind():
+            probe = round_towards_a((a + b) / 2)
+        if min(a, b) < probe < max(a, b):
+            output_probe = evaluate(probe)
+            if output_probe <= target:
+                flat_from = flat_from if output_probe == output_a else probe
+                a, output_a, residual_a = probe, output_probe, output_probe - target
+            else:
+                previous_b = (b, output_b)
+                b, output_b, residual_b = probe, output_probe, output_probe - target
+    return Solution(value=a, output=output_a, evaluations=evaluate.evaluations)
+
+
+# Finds the boundary value of an input field where the marginal tax rate comes down to (at most) the given rate: the
+# taxable income must not exceed the upper threshold of the rate's bracket, scaled by the household shares. E.g. the
+# lowest PER transfer bringing the marginal rate down to 30%, or the highest salary keeping it at 30%.
+def solve_marginal_tax_rate(statement_year: int, tax_input: dict[TaxField, Any], field: TaxField, rate: float,
+                            low: float = 0, high: float = 1000000, tolerance: float = 1) -> Solution:
+    tax_sim = TaxSimulator(statement_year, tax_input, lazy=True)
+    rates = [0] + tax_sim.parameters.slices_rates
+    if rate not in rates:
+        raise Exception(f"Unknown marginal tax rate {rate} (rates in {statement_year}: {rates})")
+    bracket_n = rates.index(rate)
+    if bracket_n == len(rates) - 1:
+        raise Exception(f"The marginal tax rate is always at most the highest rate ({rate})")
+    ceiling = tax_sim.parameters.slices_thresholds[bracket_n] * tax_sim[TaxField.HOUSEHOLD_SHARES]
+    return solve(statement_year, tax_input, field, ceiling, output=TaxField.TAXABLE_INCOME, low=low, high=high,
+                 tolerance=tolerance)
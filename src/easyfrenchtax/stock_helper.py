@@ -1,13 +1,17 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import date, datetime
 from enum import Enum
-from typing import Optional, Tuple
+from typing import Any, Iterable, Optional, Tuple
 
 from dateutil.relativedelta import relativedelta
-from currency_converter import CurrencyConverter
 from collections import defaultdict
 import csv
 import glob
+import os
+
+from .fx import FxRateTable
 
 class RsuTaxScheme(str, Enum):
     NONQUALIFIED_RSU = "Non-qualified RSU"
@@ -31,6 +35,76 @@ class StockGroup:
     plan_name: str
 
 
+class SortedLots(Sequence):
+    # Lots of stocks of a symbol, ordered by acquisition date, in order of insertion for a same date (like a stable sort
+    # after each addition): the order in which they are sold (FIFO). Positions are found by bisection on the days, and
+    # the lots before the cursor are all sold (their availability must only be changed through take()): a sale only
+    # goes through the lots it takes stocks from.
+    __slots__ = ("lots", "days", "cursor")
+    lots: list[StockGroup]
+    days: list[int]  # ordinal of the acquisition date of each lot
+    cursor: int
+
+    def __init__(self, lots: Iterable[StockGroup] = ()):
+        self.lots = []
+        self.days = []
+        self.cursor = 0
+        self.extend(lots)
+
+    def __getitem__(self, index):
+        return self.lots[index]
+
+    def __len__(self) -> int:
+        return len(self.lots)
+
+    def __repr__(self) -> str:
+        return f"SortedLots({self.lots!r})"
+
+    def add(self, lot: StockGroup):
+        day = lot.acq_date.toordinal()
+        index = bisect_right(self.days, day)
+        self.lots.insert(index, lot)
+        self.days.insert(index, day)
+        if index < self.cursor and lot.available:
+            self.cursor = index
+
+    # Adds many lots with a single sort (none if they all come after the current ones, e.g. the vestings of a new year)
+    def extend(self, lots: Iterable[StockGroup]):
+        lots = sorted(lots, key=lambda lot: lot.acq_date)
+        if not lots:
+            return
+        if self.days and lots[0].acq_date.toordinal() < self.days[-1]:
+            lots = sorted(self.lots + lots, key=lambda lot: lot.acq_date)
+            self.lots.clear()
+            self.days.clear()
+            self.cursor = next((i for i, lot in enumerate(lots) if lot.available), len(lots))
+        self.lots.extend(lots)
+        self.days.extend(lot.acq_date.toordinal() for lot in lots)
+
+    # Number of lots acquired strictly before a date
+    def count_before(self, before: date) -> int:
+        return bisect_left(self.days, before.toordinal())
+
+    # Takes up to nb_stocks available stocks from the lots acquired strictly before a date, first acquired first, and
+    # returns the lots taken from with the number of stocks taken from each one
+    def take(self, nb_stocks: int, before: date) -> list[Tuple[StockGroup, int]]:
+        end = self.count_before(before)
+        lots = self.lots
+        taken = []
+        i = self.cursor
+        while nb_stocks > 0 and i < end:
+            lot = lots[i]
+            if lot.available:
+                count = min(nb_stocks, lot.available)
+                lot.available -= count
+                nb_stocks -= count
+                taken.append((lot, count))
+            i += 1
+        while self.cursor < len(lots) and not lots[self.cursor].available:
+            self.cursor += 1
+        return taken
+
+
 @dataclass
 class RsuPlan:
     name: str
@@ -53,23 +127,92 @@ class SaleEvent:
     rsu_tax_scheme: Optional[RsuTaxScheme] = None
     acq_date: Optional[date] = None
 
-# currency converter (USD/EUR in particular)
-cc = CurrencyConverter(fallback_on_wrong_date=True, fallback_on_missing_rate=True)
+@dataclass
+class SaleOrder:
+    symbol: str
+    stock_type: str  # as in the files: RSU, ESPP or StockOption
+    owner: Optional[int]
+    sell_date: date
+    count: int
+    sell_price: float  # in currency
+    currency: str
+    fees: float
+    sell_price_eur: Optional[float] = None
+
+
+# currency converter (USD/EUR in particular), shared by all StockHelpers. Loading it parses the whole history of the
+# ECB rates: it is only built on first use, so that importing the package (e.g. for the tax simulator) doesn't pay for it
+_currency_converter = None
+
+
+def get_currency_converter() -> Any:
+    global _currency_converter
+    if _currency_converter is None:
+        from currency_converter import CurrencyConverter
+        _currency_converter = CurrencyConverter(fallback_on_wrong_date=True, fallback_on_missing_rate=True)
+    return _currency_converter
+
+
+# the rates used by default for the conversions of the StockHelpers, as a table indexed by day: the rates of the shared
+# converter, or if RATES_FILE_ENV names a snapshot file (see fx.main), the memory-mapped rates of that file, shared by
+# all the processes of the host. The snapshot is mapped again when the file is replaced, for the StockHelpers created
+# afterwards.
+RATES_FILE_ENV = "EASYFRENCHTAX_FX_RATES"
+_rate_table = None
+_rate_file_id = None
+
+
+def get_rate_table() -> FxRateTable:
+    global _rate_table, _rate_file_id
+    path = os.environ.get(RATES_FILE_ENV)
+    if path:
+        stat = os.stat(path)
+        file_id = (path, stat.st_dev, stat.st_ino)
+        if file_id != _rate_file_id:
+            _rate_table = FxRateTable.load(path)
+            _rate_file_id = file_id
+    elif _rate_table is None or _rate_file_id is not None:
+        _rate_table = FxRateTable.from_converter(get_currency_converter())
+        _rate_file_id = None
+    return _rate_table
+
+
+def __getattr__(name: str) -> Any:
+    # the module-level converter used to be built at import as stock_helper.cc
+    if name == "cc":
+        return get_currency_converter()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class StockHelper:
     rsu_plans: dict[str, RsuPlan]
-    rsus: dict[str, list[StockGroup]]  # TODO integrate list of RSUs to RsuPlan
-    espp_stocks: dict[str, list[StockGroup]]
+    rsus: dict[str, SortedLots]  # TODO integrate list of RSUs to RsuPlan
+    espp_stocks: dict[str, SortedLots]
+    stock_options: dict[str, SortedLots]
     stock_sales: dict[int, list[SaleEvent]]
+    converter: Any  # anything with the convert() method of CurrencyConverter, the shared rate table by default
 
-    def __init__(self):
+    def __init__(self, converter: Any = None):
+        self.converter = converter
         self.rsu_plans = {}
-        self.rsus = defaultdict(list)
-        self.espp_stocks = defaultdict(list)
-        self.stock_options = defaultdict(list)
+        self.rsus = defaultdict(SortedLots)
+        self.espp_stocks = defaultdict(SortedLots)
+        self.stock_options = defaultdict(SortedLots)
         self.stock_sales = defaultdict(list)
 
+    def _to_eur(self, amount: float, currency: str, conversion_date: date) -> float:
+        if self.converter is None:
+            self.converter = get_rate_table()
+        return self.converter.convert(amount, currency, "EUR", date=conversion_date)
+
+    def _to_eur_many(self, amounts: list[float], currency: str, conversion_dates: list[date]) -> list[float]:
+        if self.converter is None:
+            self.converter = get_rate_table()
+        if hasattr(self.converter, "convert_many"):
+            return self.converter.convert_many(amounts, currency, conversion_dates, "EUR")
+        return [self.converter.convert(amount, currency, "EUR", date=conversion_date)
+                for amount, conversion_date in zip(amounts, conversion_dates)]
+
 
     # ----- RSU related load functions ------
     @staticmethod
@@ -102,30 +245,57 @@ class StockHelper:
                     currency: str = None) -> None:
         if not currency:
             currency = self.rsu_plans[plan_name].currency
-        self.rsus[symbol].append(StockGroup(
+        self.rsus[symbol].add(StockGroup(
             count=count,
             available=count,  # new acquisition, so everything available
             acq_price=acq_price,
-            acq_price_eur=cc.convert(acq_price, currency, "EUR", date=acq_date),
+            acq_price_eur=self._to_eur(acq_price, currency, acq_date),
             acq_date=acq_date,
             plan_name=plan_name
         ))
-        self.rsus[symbol].sort(key=lambda a: a.acq_date)
+
+    # Same as rsu_vesting() for many vestings of a plan, given as (count, acq_date, acq_price), converted at once
+    def rsu_vestings_bulk(self, symbol: str, plan_name: str, vestings: Iterable[Tuple[int, date, float]],
+                          currency: str = None) -> None:
+        if not currency:
+            currency = self.rsu_plans[plan_name].currency
+        vestings = list(vestings)
+        prices_eur = self._to_eur_many([v[2] for v in vestings], currency, [v[1] for v in vestings])
+        self.rsus[symbol].extend(StockGroup(
+            count=count,
+            available=count,
+            acq_price=acq_price,
+            acq_price_eur=acq_price_eur,
+            acq_date=acq_date,
+            plan_name=plan_name
+        ) for (count, acq_date, acq_price), acq_price_eur in zip(vestings, prices_eur))
 
     def add_espp(self, symbol: str, count: int, acq_date: date, acq_price: float, currency: str) -> None:
-        self.espp_stocks[symbol].append(StockGroup(
+        self.espp_stocks[symbol].add(StockGroup(
             count=count,
             available=count,  # new acquisition, so everything available
             acq_price=acq_price,
-            acq_price_eur=cc.convert(acq_price, currency, "EUR", date=acq_date),
+            acq_price_eur=self._to_eur(acq_price, currency, acq_date),
             acq_date=acq_date,
             plan_name="espp"
         ))
-        self.espp_stocks[symbol].sort(key=lambda a: a.acq_date)
+
+    # Same as add_espp() for many purchases, given as (count, acq_date, acq_price), converted at once
+    def add_espp_bulk(self, symbol: str, purchases: Iterable[Tuple[int, date, float]], currency: str) -> None:
+        purchases = list(purchases)
+        prices_eur = self._to_eur_many([p[2] for p in purchases], currency, [p[1] for p in purchases])
+        self.espp_stocks[symbol].extend(StockGroup(
+            count=count,
+            available=count,
+            acq_price=acq_price,
+            acq_price_eur=acq_price_eur,
+            acq_date=acq_date,
+            plan_name="espp"
+        ) for (count, acq_date, acq_price), acq_price_eur in zip(purchases, prices_eur))
 
     def add_stockoptions(self, symbol: str, plan_name: str, count: int, vesting_date: date,
                          strike_price: float, currency: str) -> None:
-        self.stock_options[symbol].append(StockGroup(
+        self.stock_options[symbol].add(StockGroup(
             count=count,
             available=count,  # new acquisition, so everything available
             acq_price=strike_price if currency != "EUR" else None,  # only set one of the two acquisition prices...
@@ -134,16 +304,16 @@ class StockHelper:
             acq_date=vesting_date,
             plan_name=plan_name
         ))
-        self.stock_options[symbol].sort(key=lambda a: a.acq_date)
+
+    @staticmethod
+    def _parse_date(some_date: str) -> date:
+        try:
+            return datetime.strptime(some_date, "%d %b %Y").date()
+        except ValueError:
+            return datetime.strptime(some_date, "%Y-%m-%d").date()
 
     # turn into static constructor?
     def parse_tsv_info(self, tsv_files: str = 'personal_data/*.tsv') -> None:
-        def parse_date(some_date):
-            try:
-                return datetime.strptime(some_date, "%d %b %Y").date()
-            except ValueError:
-                return datetime.strptime(some_date, "%Y-%m-%d").date()
-
         # read all files found in tsv_files (glob format)
         rsu_data = []
         for tsv_name in glob.glob(tsv_files):
@@ -157,10 +327,10 @@ class StockHelper:
                     symbol = row["Symbol"]
                     acq_count = int(float(row["Count"].replace('\u202f', '')))
                     acq_price = float(row["Acquisition price"])
-                    acq_date = parse_date(row["Acquisition date"])
+                    acq_date = StockHelper._parse_date(row["Acquisition date"])
                     if stock_type == "RSU":
                         if plan_name not in self.rsu_plans:
-                            plan_date = parse_date(row["Plan date"])
+                            plan_date = StockHelper._parse_date(row["Plan date"])
                             self.rsu_plan(plan_name, plan_date, symbol, currency)
                         self.rsu_vesting(symbol, plan_name, acq_count, acq_date, acq_price, currency)
                     elif stock_type == "ESPP":
@@ -170,19 +340,65 @@ class StockHelper:
 
     ####### stock selling related load functions #######
 
+    # Sales exported by the broker, in TSV files (or CSV, by their extension), with the columns: Symbol, Stock type (RSU,
+    # ESPP or StockOption), Owner (1 or 2, for stock options), Sell date, Count, Sell price, Currency and Fees. They are
+    # replayed in chronological order (file order for a same day) like with the sell_*_legacy functions, once all the
+    # acquisitions are loaded, with the sell prices of each currency converted at once.
+    def parse_tsv_sales(self, tsv_files: str = 'personal_data/sales/*.tsv') -> None:
+        sales = []
+        for tsv_name in sorted(glob.glob(tsv_files)):
+            print("Opening ", tsv_name)
+            with open(tsv_name) as tsv_file:
+                tsv_data = csv.DictReader(tsv_file, delimiter="," if tsv_name.endswith(".csv") else "\t")
+                for line, row in enumerate(tsv_data, start=2):  # line 1 is the header
+                    stock_type = row["Stock type"]
+                    if stock_type not in ("RSU", "ESPP", "StockOption"):
+                        raise Exception(f"Unsupported stock type in {tsv_name}: {stock_type}")
+                    if stock_type == "StockOption" and not row.get("Owner"):
+                        raise Exception(f"Missing owner of the stock options sold in {tsv_name}, line {line}")
+                    sales.append(SaleOrder(
+                        symbol=row["Symbol"],
+                        stock_type=stock_type,
+                        owner=int(row["Owner"]) if row.get("Owner") else None,
+                        sell_date=StockHelper._parse_date(row["Sell date"]),
+                        count=int(float(row["Count"].replace('\u202f', ''))),
+                        sell_price=float(row["Sell price"]),
+                        currency=row["Currency"],
+                        fees=float(row["Fees"]) if row.get("Fees") else 0,
+                    ))
+        sales.sort(key=lambda sale: sale.sell_date)
+
+        sales_by_currency = defaultdict(list)
+        for sale in sales:
+            sales_by_currency[sale.currency].append(sale)
+        for currency, currency_sales in sales_by_currency.items():
+            prices_eur = self._to_eur_many([sale.sell_price for sale in currency_sales], currency,
+                                           [sale.sell_date for sale in currency_sales])
+            for sale, price_eur in zip(currency_sales, prices_eur):
+                sale.sell_price_eur = round(price_eur, 2)
+
+        for sale in sales:
+            if sale.stock_type == "RSU":
+                self.sell_rsus_legacy(sale.symbol, sale.count, sale.sell_date, sale.sell_price, sale.fees,
+                                      sale.currency, sell_price_eur=sale.sell_price_eur)
+            elif sale.stock_type == "ESPP":
+                self.sell_espp_legacy(sale.symbol, sale.count, sale.sell_date, sale.sell_price, sale.fees,
+                                      sale.currency, sell_price_eur=sale.sell_price_eur)
+            else:
+                self.sell_stockoptions_legacy(sale.owner, sale.symbol, sale.count, sale.sell_date, sale.sell_price,
+                                              sale.fees, sale.currency, sell_price_eur=sale.sell_price_eur)
+
     def sell_stockoptions_legacy(self, owner: int, symbol: str, nb_stocks: int, sell_date: date, sell_price: float, fees: float,
-                                 currency: str = "EUR") -> int:
+                                 currency: str = "EUR", sell_price_eur: Optional[float] = None) -> int:
         if nb_stocks == 0:
             return 0
-        sell_price_eur = round(cc.convert(sell_price, currency, "EUR", date=sell_date), 2)
+        if sell_price_eur is None:  # unless already converted (see parse_tsv_sales)
+            sell_price_eur = round(self._to_eur(sell_price, currency, sell_date), 2)
         to_sell = nb_stocks
-        stocks_before_sell_date = [r for r in self.stock_options[symbol] if r.acq_date < sell_date]
-        for i, acq in enumerate(stocks_before_sell_date):
-            if acq.available == 0:
-                continue
-            sell_from_acq = min(to_sell, acq.available)
-            strike_price_eur = acq.acq_price_eur if acq.acq_price_eur else cc.convert(acq.acq_price, currency, "EUR",
-                                                                                      date=sell_date)
+        # the stock options data is updated with the new availability
+        for acq, sell_from_acq in self.stock_options[symbol].take(nb_stocks, sell_date):
+            strike_price_eur = acq.acq_price_eur if acq.acq_price_eur else self._to_eur(acq.acq_price, currency,
+                                                                                        sell_date)
             self.sell_stockoptions(
                 symbol=symbol,
                 nb_stocks_sold=sell_from_acq,
@@ -191,11 +407,7 @@ class StockHelper:
                 sell_price_eur=sell_price_eur,
                 owner=owner
             )
-            # update the stock options data with new availability
-            self.stock_options[symbol][i].available = acq.available - sell_from_acq
             to_sell -= sell_from_acq
-            if to_sell == 0:
-                break
         if to_sell > 0:
             print(f"WARNING: You are trying to sell more stocks ({nb_stocks}) than you have ({to_sell})")
         return nb_stocks - to_sell
@@ -213,17 +425,13 @@ class StockHelper:
             owner=owner,
         ))
     def sell_espp_legacy(self, symbol: str, nb_stocks: int, sell_date: date, sell_price: float, fees: float,
-                         currency: str = "EUR") -> int:
+                         currency: str = "EUR", sell_price_eur: Optional[float] = None) -> int:
         if nb_stocks == 0:
             return 0
-        sell_price_eur = round(cc.convert(sell_price, currency, "EUR", date=sell_date), 2)
+        if sell_price_eur is None:  # unless already converted (see parse_tsv_sales)
+            sell_price_eur = round(self._to_eur(sell_price, currency, sell_date), 2)
         to_sell = nb_stocks
-        stocks_before_sell_date = [r for r in self.espp_stocks[symbol] if r.acq_date < sell_date]
-        for i, acq in enumerate(stocks_before_sell_date):
-            if acq.available == 0:
-                continue
-            sell_from_acq = min(to_sell, acq.available)
-            self.espp_stocks[symbol][i].available = acq.available - sell_from_acq
+        for acq, sell_from_acq in self.espp_stocks[symbol].take(nb_stocks, sell_date):
             to_sell -= sell_from_acq
             self.sell_espp(
                 symbol=symbol,
@@ -232,8 +440,6 @@ class StockHelper:
                 sell_date=sell_date,
                 sell_price_eur=sell_price_eur
             )
-            if to_sell == 0:
-                break
         if to_sell > 0:
             print(f"WARNING: You are trying to sell more stocks ({nb_stocks}) than you have")
         return nb_stocks - to_sell
@@ -252,23 +458,22 @@ class StockHelper:
 
 
     def sell_rsus_legacy(self, symbol: str, nb_stocks: int, sell_date: date, sell_price: float, fees: float,
-                         currency: str = "EUR") -> int:
+                         currency: str = "EUR", sell_price_eur: Optional[float] = None) -> int:
         if nb_stocks == 0:
             return 0
-        sell_price_eur = round(cc.convert(sell_price, currency, "EUR", date=sell_date), 2)
+        if sell_price_eur is None:  # unless already converted (see parse_tsv_sales)
+            sell_price_eur = round(self._to_eur(sell_price, currency, sell_date), 2)
         to_sell = nb_stocks
 
         # Acquisitions are sorted by date, this is the rule set by the tax office (FIFO, or PEPS="premier entré premier
         # sorti"); we only keep stocks acquired *before* the sell date, in case we input a sell event in the middle of
         # acquisitions.
-        rsu_before_sell_date = [r for r in self.rsus[symbol] if r.acq_date < sell_date]
-        if not rsu_before_sell_date:
+        rsus = self.rsus[symbol]
+        if not rsus.count_before(sell_date):
             # no rsu for that date
             return 0
-        for i, acq in enumerate(rsu_before_sell_date):
-            if acq.available == 0:
-                continue
-            sell_from_acq = min(to_sell, acq.available)
+        # the rsu data is updated with the new availability
+        for acq, sell_from_acq in rsus.take(nb_stocks, sell_date):
             tax_scheme = self.rsu_plans[acq.plan_name].taxation_scheme
             self.sell_rsus(
                 symbol=symbol,
@@ -279,11 +484,7 @@ class StockHelper:
                 sell_price_eur=sell_price_eur,
                 tax_scheme=tax_scheme
             )
-            # update the rsu data with new availability (tuples are immutable, so replace with new one)
-            self.rsus[symbol][i].available = acq.available - sell_from_acq
             to_sell -= sell_from_acq
-            if to_sell == 0:
-                break
         if to_sell > 0:
             print(f"WARNING: You are trying to sell more stocks ({nb_stocks}) than you have ({to_sell})")
         return (nb_stocks - to_sell)
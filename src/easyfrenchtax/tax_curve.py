@@ -0,0 +1,209 @@
+from collections import namedtuple
+from fractions import Fraction
+from math import floor
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from .batch_simulator import BatchTaxSimulator
+from .tax_parameters import TaxParameters
+from .tax_simulator import TaxField, TaxInfoFlag, tax_rules
+
+TaxCurve = namedtuple("TaxCurve", ["field", "values", "net_taxes", "net_social_taxes", "marginal_tax_rates",
+                                   "breakpoints"])
+# A change of regime of the tax computation: "kind" is the flag whose value changes (marginal tax rate, capping of the
+# family quotient, ceiling of the 10% fees deduction for each income), "value" is the threshold of the varying field:
+# the regime is "before" below it and "after" above it (at the threshold itself, it depends on the rule, e.g. the
+# marginal tax rate changes once the taxable income exceeds the bracket threshold). For the fields whose effect on the
+# taxable income is not modelled (see _exact_breakpoints), the thresholds are approximated by bisection instead: "value"
+# is then the first value with the new regime, to the requested tolerance.
+Breakpoint = namedtuple("Breakpoint", ["value", "kind", "before", "after"])
+
+BREAKPOINT_KINDS = [
+    TaxInfoFlag.MARGINAL_TAX_RATE,
+    TaxInfoFlag.FAMILY_QUOTIENT_CAPPING,
+    TaxInfoFlag.FEE_REBATE_INCOME_1,
+    TaxInfoFlag.FEE_REBATE_INCOME_2,
+]
+
+# The fields with an exact breakpoints computation: the incomes of each person (1 or 2, with the other field of the
+# same incomes), taxed after the 10% fees deduction, and the fields added to (1) or subtracted from (-1) the taxable
+# income
+PERSON_INCOMES = {
+    TaxField.SALARY_1_1AJ: (1, TaxField.EXERCISE_GAIN_1_1TT),
+    TaxField.EXERCISE_GAIN_1_1TT: (1, TaxField.SALARY_1_1AJ),
+    TaxField.SALARY_2_1BJ: (2, TaxField.EXERCISE_GAIN_2_1UT),
+    TaxField.EXERCISE_GAIN_2_1UT: (2, TaxField.SALARY_2_1BJ),
+}
+TAXABLE_INCOME_SLOPES = {
+    TaxField.TAXABLE_ACQUISITION_GAIN_1TZ: 1,
+    TaxField.PER_TRANSFERS_1_6NS: -1,
+    TaxField.PER_TRANSFERS_2_6NT: -1,
+}
+
+
+def _simulate(statement_year: int, tax_input: dict[TaxField, Any], field: TaxField,
+              values: np.ndarray) -> BatchTaxSimulator:
+    columns = dict(tax_input)
+    columns[field] = values
+    return BatchTaxSimulator(statement_year, columns)
+
+
+def _regimes(batch: BatchTaxSimulator) -> dict[TaxInfoFlag, np.ndarray]:
+    regimes = {TaxInfoFlag.MARGINAL_TAX_RATE: batch.marginal_tax_rate}
+    for kind in BREAKPOINT_KINDS[1:]:
+        regimes[kind] = batch.flags[kind].mask
+    return regimes
+
+
+def _exact_income_tax(parameters: TaxParameters, taxable_income: Fraction, household_shares: Fraction) -> Fraction:
+    tax = Fraction(0)
+    thresholds = [Fraction(t) * household_shares for t in parameters.slices_thresholds] + [None]
+    for rate, lower, upper in zip(parameters.slices_rates, thresholds, thresholds[1:]):
+        if taxable_income <= lower:
+            break
+        taxed = taxable_income if upper is None else min(taxable_income, upper)
+        tax += Fraction(str(rate)) * (taxed - lower)
+    return tax
+
+
+def _taxable_income_thresholds(parameters: TaxParameters, household_shares: Fraction,
+                               base_shares: Fraction) -> list[tuple[Fraction, TaxInfoFlag, Any, Any]]:
+    # (threshold, kind, before, after): the regime is "after" once the taxable income exceeds the threshold
+    thresholds = []
+    before = 0.0
+    for threshold, rate in zip(parameters.slices_thresholds, parameters.slices_rates):
+        thresholds.append((Fraction(threshold) * household_shares, TaxInfoFlag.MARGINAL_TAX_RATE, before, rate))
+        before = rate
+    if household_shares == base_shares:
+        return thresholds
+    # the benefices of the family quotient are piecewise linear and non-decreasing in the taxable income (kinks at the
+    # thresholds of both scales, constant once both are in the top bracket): solve on the piece where they reach the
+    # capping
+    capping = Fraction(parameters.family_quotient_benefices_capping) * (household_shares - base_shares) * 2
+    kinks = sorted({Fraction(t) * shares for t in parameters.slices_thresholds
+                    for shares in (household_shares, base_shares)})
+    low = Fraction(0)
+    low_benefices = Fraction(0)
+    for high in kinks:
+        high_benefices = _exact_income_tax(parameters, high, base_shares) \
+            - _exact_income_tax(parameters, high, household_shares)
+        if high_benefices > capping:
+            threshold = low + (capping - low_benefices) * (high - low) / (high_benefices - low_benefices)
+            thresholds.append((threshold, TaxInfoFlag.FAMILY_QUOTIENT_CAPPING, False, True))
+            break
+        low, low_benefices = high, high_benefices
+    return thresholds
+
+
+def _last_income_below(parameters: TaxParameters, net_income: Fraction) -> Fraction:
+    # The largest incomes of a person whose net income (after the 10% fees deduction) is at most net_income. Between
+    # its floor and ceiling, the deduction is rounded to the euro: the net income drops by 1 each time the rounded
+    # deduction increases, so it can cross a level again within one euro, the last crossing is returned.
+    rate = Fraction(str(tax_rules.fees_deduction_rate))
+    fees_floor = parameters.fees_10p_deduction_floor
+    fees_ceiling = parameters.fees_10p_deduction_ceiling
+    # incomes in [(m - 1/2) / rate, (m + 1/2) / rate) have a rounded deduction m, and net incomes from
+    # (m - 1/2) / rate - m
+    if net_income < (fees_floor - Fraction(1, 2)) / rate - fees_floor:
+        return net_income + fees_floor
+    if net_income >= (fees_ceiling + Fraction(1, 2)) / rate - fees_ceiling:
+        return net_income + fees_ceiling
+    deduction = min(floor((net_income + 1 / (2 * rate)) / (1 / rate - 1)), fees_ceiling)
+    return min(net_income + deduction, (deduction + Fraction(1, 2)) / rate)
+
+
+def _exact_breakpoints(batch: BatchTaxSimulator, tax_input: dict[TaxField, Any], field: TaxField,
+                       values: np.ndarray) -> Optional[list[Breakpoint]]:
+    # The thresholds of the regimes, derived from the parameters of the year: the brackets and the capping of the family
+    # quotient are thresholds of the taxable income, mapped back to the field through its (piecewise) linear effect on
+    # the taxable income, measured on the first simulated value. None if the field has no such known effect.
+    if field not in PERSON_INCOMES and field not in TAXABLE_INCOME_SLOPES:
+        return None
+    parameters = batch.parameters
+    married = bool(batch.state[TaxField.MARRIED][0])
+    household_shares = Fraction(batch.state[TaxField.HOUSEHOLD_SHARES][0].item())
+    thresholds = _taxable_income_thresholds(parameters, household_shares, Fraction(2 if married else 1))
+    first_value = Fraction(values[0].item())
+    first_taxable_income = Fraction(batch.state[TaxField.TAXABLE_INCOME][0].item())
+    breakpoints = []
+    if field in TAXABLE_INCOME_SLOPES:
+        slope = TAXABLE_INCOME_SLOPES[field]
+        for threshold, kind, before, after in thresholds:
+            value = first_value + (threshold - first_taxable_income) * slope
+            breakpoints.append(Breakpoint(value, kind, before, after) if slope > 0
+                               else Breakpoint(value, kind, after, before))
+    else:
+        person, other_field = PERSON_INCOMES[field]
+        if person == 2 and not married:  # the incomes of the second person are not taxed
+            return []
+        other_incomes = Fraction(tax_input.get(other_field, 0))
+        deduction_field = TaxField.DEDUCTION_10P_1 if person == 1 else TaxField.DEDUCTION_10P_2
+        deduction = Fraction(batch.state[deduction_field][0].item())
+        other_taxable_income = first_taxable_income - (first_value + other_incomes - deduction)
+        for threshold, kind, before, after in thresholds:
+            incomes = _last_income_below(parameters, threshold - other_taxable_income)
+            breakpoints.append(Breakpoint(incomes - other_incomes, kind, before, after))
+        # the deduction is capped once the rounded 10% of the incomes exceeds the ceiling
+        rate = Fraction(str(tax_rules.fees_deduction_rate))
+        incomes = (parameters.fees_10p_deduction_ceiling + Fraction(1, 2)) / rate
+        kind = TaxInfoFlag.FEE_REBATE_INCOME_1 if person == 1 else TaxInfoFlag.FEE_REBATE_INCOME_2
+        breakpoints.append(Breakpoint(incomes - other_incomes, kind, False, True))
+    low, high = Fraction(values[0].item()), Fraction(values[-1].item())
+    return sorted((b._replace(value=float(b.value)) for b in breakpoints if low <= b.value <= high),
+                  key=lambda b: b.value)
+
+
+def _bisect_breakpoints(statement_year: int, tax_input: dict[TaxField, Any], field: TaxField, values: np.ndarray,
+                      regimes: dict[TaxInfoFlag, np.ndarray], tolerance: float) -> list[Breakpoint]:
+    # Approximation for the other fields. Each regime is monotonic in income-like fields (rental income, LMNP...), so
+    # the regime can only change between two values where it differs at both ends: these intervals are split in halves
+    # until they are narrower than the tolerance, all intervals being refined together in one batch simulation per step.
+    # This depends on the samples: a regime that changes and changes back between two of them is missed.
+    integers = values.dtype.kind in "iu" and tolerance >= 1
+    intervals = []  # (kind, low value, high value, regime at low value, regime at high value)
+    for kind, regime in regimes.items():
+        for i in np.flatnonzero(regime[:-1] != regime[1:]):
+            intervals.append((kind, values[i], values[i + 1], regime[i].item(), regime[i + 1].item()))
+    breakpoints = []
+    while intervals:
+        done = [iv for iv in intervals if iv[2] - iv[1] <= tolerance]
+        breakpoints += [Breakpoint(value=iv[2].item(), kind=iv[0], before=iv[3], after=iv[4]) for iv in done]
+        intervals = [iv for iv in intervals if iv[2] - iv[1] > tolerance]
+        if not intervals:
+            break
+        lows = np.array([iv[1] for iv in intervals])
+        highs = np.array([iv[2] for iv in intervals])
+        middles = (lows + highs) // 2 if integers else (lows + highs) / 2
+        middle_regimes = _regimes(_simulate(statement_year, tax_input, field, middles))
+        refined = []
+        for i, (kind, low, high, low_regime, high_regime) in enumerate(intervals):
+            middle_regime = middle_regimes[kind][i].item()
+            if middle_regime != low_regime:
+                refined.append((kind, low, middles[i], low_regime, middle_regime))
+            if middle_regime != high_regime:
+                refined.append((kind, middles[i], high, middle_regime, high_regime))
+        intervals = refined
+    return sorted(breakpoints, key=lambda b: b.value)
+
+
+# Net taxes, social taxes and marginal tax rate of a household, for many values of one of its inputs (e.g. a salary, a
+# bonus as exercise gain, a PER transfer), computed in one vectorized simulation. Also returns the breakpoints where
+# the regime of the computation changes within the range of values: exact thresholds for the incomes of each person,
+# the PER transfers and the taxable acquisition gains, whatever the samples; for the other fields, bisected between the
+# samples to the tolerance (see Breakpoint).
+def tax_curve(statement_year: int, tax_input: dict[TaxField, Any], field: TaxField, values: Iterable,
+              tolerance: float = 0.01) -> TaxCurve:
+    values = np.sort(np.asarray(list(values) if isinstance(values, range) else values))
+    batch = _simulate(statement_year, tax_input, field, values)
+    breakpoints = _exact_breakpoints(batch, tax_input, field, values)
+    if breakpoints is None:
+        breakpoints = _bisect_breakpoints(statement_year, tax_input, field, values, _regimes(batch), tolerance)
+    return TaxCurve(
+        field=field,
+        values=values,
+        net_taxes=batch.state[TaxField.NET_TAXES],
+        net_social_taxes=batch.state[TaxField.NET_SOCIAL_TAXES],
+        marginal_tax_rates=batch.marginal_tax_rate,
+        breakpoints=breakpoints
+    )
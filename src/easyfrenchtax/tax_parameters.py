@@ -0,0 +1,133 @@
+import json
+from collections import namedtuple
+from math import floor
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+# Lots of parameters evolve year after year (inflation, political decisions, etc.)
+# They are loaded from a data file (see data/tax_parameters.json for the sources).
+TaxParameters = namedtuple("TaxParameters", [
+    "family_quotient_benefices_capping",
+    "slices_thresholds", "slices_rates",
+    "fees_10p_deduction_ceiling", "fees_10p_deduction_floor"
+])
+# The amounts of money among the parameters, the ones indexed for future years (rates are kept)
+INDEXED_PARAMETERS = ["family_quotient_benefices_capping", "slices_thresholds", "fees_10p_deduction_ceiling",
+                      "fees_10p_deduction_floor"]
+
+# For the years after the last declared one, from from_year on: the parameters of the previous year, with their amounts
+# of money indexed by the given rate (and rounded to the euro, like the indexation of the income tax scale)
+Indexation = namedtuple("Indexation", ["from_year", "rate", "note"])
+
+DEFAULT_PARAMETERS_FILE = Path(__file__).parent / "data" / "tax_parameters.json"
+
+
+def _check(condition: bool, message: str):
+    if not condition:
+        raise Exception(f"Invalid tax parameters: {message}")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_parameters(year: int, values: dict[str, Any]) -> TaxParameters:
+    _check(set(values) == set(TaxParameters._fields),
+           f"{year} has fields {sorted(values)}, expected {sorted(TaxParameters._fields)}")
+    parameters = TaxParameters(**values)
+    thresholds, rates = parameters.slices_thresholds, parameters.slices_rates
+    _check(isinstance(thresholds, list) and isinstance(rates, list) and len(thresholds) == len(rates) > 0,
+           f"{year} must have as many income tax slices thresholds as rates")
+    _check(all(_is_number(t) and t >= 0 for t in thresholds) and thresholds == sorted(set(thresholds)),
+           f"the income tax slices thresholds of {year} must be positive and increasing")
+    _check(all(_is_number(r) and 0 <= r < 1 for r in rates), f"the income tax rates of {year} must be in [0, 1)")
+    for name in ["family_quotient_benefices_capping", "fees_10p_deduction_ceiling", "fees_10p_deduction_floor"]:
+        _check(_is_number(values[name]) and values[name] >= 0, f"{name} of {year} must be a positive number")
+    _check(parameters.fees_10p_deduction_floor <= parameters.fees_10p_deduction_ceiling,
+           f"the 10% deduction floor of {year} is above its ceiling")
+    return parameters
+
+
+def _index(amount: Any, rate: float) -> int:
+    return floor(amount * (1 + rate) + 0.5)
+
+
+def index_parameters(parameters: TaxParameters, rate: float) -> TaxParameters:
+    return parameters._replace(**{
+        name: [_index(v, rate) for v in value] if isinstance(value, list) else _index(value, rate)
+        for name, value in parameters._asdict().items() if name in INDEXED_PARAMETERS
+    })
+
+
+class YearTables(dict):
+    # Tables derived from the parameters of each year (e.g. compiled income tax scales), built once per year on first
+    # use, then shared by all simulators
+    def __init__(self, registry: "ParameterRegistry", build: Callable[[TaxParameters], Any]):
+        super().__init__()
+        self.registry = registry
+        self.build = build
+
+    def __missing__(self, year: int) -> Any:
+        table = self[year] = self.build(self.registry.parameters(year))
+        return table
+
+
+class ParameterRegistry:
+    # The parameters of each statement year, as declared in a data file (validated on load), and beyond the last
+    # declared year, as indexed by the explicit indexation rules of the file (computed once per year). Other years are
+    # errors: there is no silent fallback on the parameters of another year.
+    version: int
+    declared: dict[int, TaxParameters]
+    indexations: list[Indexation]
+
+    def __init__(self, declared: dict[int, TaxParameters], indexations: Optional[list[Indexation]] = None,
+                 version: int = 1):
+        _check(bool(declared), "no year declared")
+        self.version = version
+        self.declared = dict(sorted(declared.items()))
+        self.indexations = sorted(indexations or [])
+        last_year = max(self.declared)
+        for indexation in self.indexations:
+            _check(indexation.from_year > last_year,
+                   f"indexation from {indexation.from_year}, which is not after the last declared year ({last_year})")
+            _check(_is_number(indexation.rate) and indexation.rate > -1,
+                   f"invalid indexation rate {indexation.rate}")
+        self._indexed = {}
+        self._tables = {}
+
+    @classmethod
+    def load(cls, path: Path = DEFAULT_PARAMETERS_FILE) -> "ParameterRegistry":
+        with open(path) as f:
+            data = json.load(f)
+        _check(isinstance(data.get("version"), int), f"{path} has no version")
+        _check(isinstance(data.get("years"), dict), f"{path} has no years")
+        declared = {int(year): parse_parameters(int(year), values) for year, values in data["years"].items()}
+        indexations = [Indexation(i["from_year"], i["rate"], i.get("note")) for i in data.get("indexation", [])]
+        return cls(declared, indexations, data["version"])
+
+    def parameters(self, year: int) -> TaxParameters:
+        parameters = self.declared.get(year) or self._indexed.get(year)
+        if parameters is not None:
+            return parameters
+        last_year = max(self.declared)
+        if year < last_year:
+            raise Exception(f"No tax parameters for {year} (declared years: {', '.join(map(str, self.declared))})")
+        rates = [next((i.rate for i in reversed(self.indexations) if i.from_year <= y), None)
+                 for y in range(last_year + 1, year + 1)]
+        if None in rates:
+            raise Exception(f"No tax parameters for {year}, and no indexation rule from {last_year} to {year}")
+        parameters = self.declared[last_year]
+        for y, rate in zip(range(last_year + 1, year + 1), rates):
+            parameters = self._indexed.get(y) or index_parameters(parameters, rate)
+            self._indexed[y] = parameters
+        return parameters
+
+    # The tables built by the given function from the parameters of each year (one shared instance per function)
+    def tables(self, build: Callable[[TaxParameters], Any]) -> YearTables:
+        tables = self._tables.get(build)
+        if tables is None:
+            tables = self._tables[build] = YearTables(self, build)
+        return tables
+
+
+registry = ParameterRegistry.load()
@@ -1,7 +1,13 @@
+from array import array
+from bisect import bisect_left
 from collections import defaultdict, namedtuple
+from collections.abc import MutableMapping
 from enum import Enum
-from decimal import Decimal, ROUND_HALF_UP
-from typing import Any
+from functools import partial
+from math import copysign
+from typing import Any, Callable, Iterator, Optional, Union
+
+from .tax_parameters import TaxParameters, registry
 
 
 class TaxInfoFlag(Enum):
@@ -92,91 +98,545 @@ class TaxField(Enum):
     NET_SOCIAL_TAXES = "net_social_taxes"
 
 
-# Lots of parameters evolve year after year (inflation, political decisions, etc.)
-# This dictionary gathers all variable parameters.
-TaxParameters = namedtuple("TaxParameters", [
-    # Source: https://www.service-public.fr/particuliers/vosdroits/F2705
-    "family_quotient_benefices_capping",
-    # https://www.service-public.fr/particuliers/vosdroits/F1419
-    "slices_thresholds", "slices_rates",
-    # https://www.impots.gouv.fr/particulier/questions/comment-puis-je-beneficier-de-la-deduction-forfaitaire-de-10
-    "fees_10p_deduction_ceiling", "fees_10p_deduction_floor"
+# The parameters of each year come from the registry (see tax_parameters), year_tax_parameters are the declared ones
+year_tax_parameters: dict[int, TaxParameters] = registry.declared
+
+# The constants of the tax rules that don't change with the year (the others are in TaxParameters), in euros. They are
+# shared by all the simulators (TaxSimulator, FixedPointTaxSimulator, BatchTaxSimulator) and the tools built on them.
+TaxRules = namedtuple("TaxRules", [
+    "young_child_max_age",  # children counted as less than 6 years old (for daycare fees)
+    "simplified_rental_income_ceiling", "simplified_rental_income_taxed_share", "rental_global_deficit_ceiling",
+    "lmnp_rebate_rate", "lmnp_rebate_floor",
+    "fees_deduction_rate",  # the 10% deduction of fees on salaries (its floor and ceiling are in TaxParameters)
+    "investment_income_tax_rate",
+    "charity_75p_ceiling", "charity_75p_rate", "charity_66p_income_share", "charity_66p_rate",
+    "sme_subscription_ceiling_single", "sme_subscription_ceiling_married", "sme_subscription_rate_7cf",
+    "sme_subscription_rate_7ch",
+    "daycare_fees_ceiling", "daycare_credit_rate",
+    "home_services_ceiling", "home_services_ceiling_per_child", "home_services_max_ceiling",
+    "home_services_credit_rate",
+    "global_fiscal_advantages_ceiling",
+    "capital_gain_tax_rate",
+    "csg_crds_rate", "solidarity_rate", "salary_contribution_rate",
 ])
-year_tax_parameters: dict[int, TaxParameters] = {
-    2021: TaxParameters(
-        family_quotient_benefices_capping=1570,
-        slices_thresholds=[10084, 25710, 73516, 158122],
-        slices_rates=[0.11, 0.30, 0.41, 0.45],
-        fees_10p_deduction_ceiling=12652,
-        fees_10p_deduction_floor=442
-
-    ),
-    2022: TaxParameters(
-        family_quotient_benefices_capping=1592,
-        slices_thresholds=[10225, 26070, 74545, 160336],
-        slices_rates=[0.11, 0.30, 0.41, 0.45],
-        fees_10p_deduction_ceiling=12829,
-        fees_10p_deduction_floor=448
-    ),
-    2023: TaxParameters(
-        family_quotient_benefices_capping=1678,
-        slices_thresholds=[10777, 27478, 78570, 168994],
-        slices_rates=[0.11, 0.30, 0.41, 0.45],
-        fees_10p_deduction_ceiling=13522,
-        fees_10p_deduction_floor=472
-    ),
-    2024: TaxParameters(
-        family_quotient_benefices_capping=1759,
-        slices_thresholds=[11294, 28797, 82341, 177106],
-        slices_rates=[0.11, 0.30, 0.41, 0.45],
-        fees_10p_deduction_ceiling=14171,
-        fees_10p_deduction_floor=495
-    ),
-    2025: TaxParameters(
-        family_quotient_benefices_capping=1791,
-        slices_thresholds=[11497, 29315, 83823, 180294], # https://www.service-public.fr/particuliers/vosdroits/F1419
-        slices_rates=[0.11, 0.30, 0.41, 0.45],
-        fees_10p_deduction_ceiling=14426, # https://www.service-public.fr/particuliers/vosdroits/F1989
-        fees_10p_deduction_floor=504
-    ),
-}
+tax_rules = TaxRules(
+    young_child_max_age=6,
+    simplified_rental_income_ceiling=15000,
+    simplified_rental_income_taxed_share=0.7,  # 30% rebate
+    rental_global_deficit_ceiling=10700,
+    lmnp_rebate_rate=0.5,
+    lmnp_rebate_floor=305,
+    fees_deduction_rate=0.1,
+    investment_income_tax_rate=0.128,
+    charity_75p_ceiling=1000,
+    charity_75p_rate=0.75,
+    charity_66p_income_share=0.20,
+    charity_66p_rate=0.66,
+    sme_subscription_ceiling_single=50000,
+    sme_subscription_ceiling_married=100000,
+    sme_subscription_rate_7cf=0.18,
+    sme_subscription_rate_7ch=0.25,
+    daycare_fees_ceiling=2300,
+    daycare_credit_rate=0.5,
+    home_services_ceiling=12000,
+    home_services_ceiling_per_child=1500,
+    home_services_max_ceiling=15000,
+    home_services_credit_rate=0.5,
+    global_fiscal_advantages_ceiling=10000,
+    capital_gain_tax_rate=0.128,
+    csg_crds_rate=0.097,
+    solidarity_rate=0.075,
+    salary_contribution_rate=0.1,
+)
+
+
+def format_thousands(amount: int) -> str:
+    # e.g. 15'000
+    return f"{amount:,}".replace(",", "'")
+
+
+# Events of the computation trace of a simulator in debug mode (see TaxSimulator.trace and the trace module), emitted by
+# the stages where the values are computed. Amounts are in the unit of the state.
+#
+# The tax of one bracket of the progressive income tax, for the given number of household shares
+IncomeTaxBracket = namedtuple("IncomeTaxBracket", ["stage", "household_shares", "lower", "upper", "rate",
+                                                   "taxed_income", "tax"])
+# The capping of the benefices of the family quotient (see IncomeTaxScale.capped_income_tax)
+FamilyQuotientCapping = namedtuple("FamilyQuotientCapping", ["stage", "tax_with_family_quotient",
+                                                             "tax_without_family_quotient", "benefices", "capping",
+                                                             "additional_taxes"])
+# An amount limited by a floor and/or a ceiling (None if there is none): fees deductions, donations, credits, global
+# capping of fiscal advantages
+Capping = namedtuple("Capping", ["stage", "item", "amount", "floor", "ceiling", "retained"])
+
+
+class IncomeTaxScale:
+    # The progressive income tax of a year, compiled once into piecewise-linear tables: for each number of household
+    # shares, the scaled thresholds and the cumulative tax due at each of them. Tax and marginal rate then come from a
+    # single bisection plus one multiply-add (the additions are done in the same order as a bracket walk, so the results
+    # are bit-identical to it).
+    parameters: TaxParameters
+    tables: dict[float, tuple[list[float], list[float]]]
+
+    def __init__(self, parameters: TaxParameters):
+        self.parameters = parameters
+        self.tables = {}
+
+    def table(self, household_shares: float) -> tuple[list[float], list[float]]:
+        table = self.tables.get(household_shares)
+        if table is None:
+            # scale thresholds to the number of people in the household
+            thresholds = [t * household_shares for t in self.parameters.slices_thresholds]
+            cumulative_taxes = [0]
+            for bucket_n in range(len(thresholds) - 1):
+                bucket_amount = thresholds[bucket_n + 1] - thresholds[bucket_n]
+                cumulative_taxes.append(cumulative_taxes[-1] + self.parameters.slices_rates[bucket_n] * bucket_amount)
+            table = self.tables[household_shares] = (thresholds, cumulative_taxes)
+        return table
+
+    def income_tax(self, taxable_income: float, household_shares: float) -> tuple[float, float]:
+        # https://www.service-public.fr/particuliers/vosdroits/F1419
+        thresholds, cumulative_taxes = self.table(household_shares)
+        bucket_n = bisect_left(thresholds, taxable_income) - 1
+        if bucket_n < 0:
+            return 0, 0
+        marginal_tax_rate = self.parameters.slices_rates[bucket_n]
+        return cumulative_taxes[bucket_n] + marginal_tax_rate * (taxable_income - thresholds[bucket_n]), \
+            marginal_tax_rate
+
+    def trace_brackets(self, trace: Callable[..., None], taxable_income: float, household_shares: float):
+        # emits the tax of each bracket of the table
+        thresholds, _ = self.table(household_shares)
+        for bucket_n, lower in enumerate(thresholds):
+            if taxable_income <= lower:
+                break
+            upper = thresholds[bucket_n + 1] if bucket_n + 1 < len(thresholds) else None
+            taxed_income = (taxable_income if upper is None else min(taxable_income, upper)) - lower
+            rate = self.parameters.slices_rates[bucket_n]
+            trace(IncomeTaxBracket, household_shares, lower, upper, rate, taxed_income, taxed_income * rate)
+
+    def capped_income_tax(self, taxable_income: float, household_shares: float,
+                          household_shares_without_family_quotient: float,
+                          trace: Optional[Callable[..., None]] = None) -> tuple[float, float, Optional[float]]:
+        # Income tax with the capping of the family quotient benefices, see
+        # https://www.economie.gouv.fr/particuliers/quotient-familial
+        # Returns the final tax, the marginal rate and the additional taxes due to the capping (None if not capped).
+        # With trace (see TaxSimulator._trace), the brackets and the capping are emitted as events.
+        tax_with_family_quotient, marginal_tax_rate = self.income_tax(taxable_income, household_shares)
+        if trace is not None:
+            self.trace_brackets(trace, taxable_income, household_shares)
+        if household_shares == household_shares_without_family_quotient:
+            return tax_with_family_quotient, marginal_tax_rate, None
+        tax_without_family_quotient, _ = self.income_tax(taxable_income, household_shares_without_family_quotient)
+        family_quotient_benefices = tax_without_family_quotient - tax_with_family_quotient
+        family_quotient_benefices_capping = self.parameters.family_quotient_benefices_capping * (
+                (household_shares - household_shares_without_family_quotient) * 2)
+        if trace is not None:
+            self.trace_brackets(trace, taxable_income, household_shares_without_family_quotient)
+            trace(FamilyQuotientCapping, tax_with_family_quotient, tax_without_family_quotient,
+                  family_quotient_benefices, family_quotient_benefices_capping,
+                  max(family_quotient_benefices - family_quotient_benefices_capping, 0))
+        if family_quotient_benefices > family_quotient_benefices_capping:
+            return tax_without_family_quotient - family_quotient_benefices_capping, marginal_tax_rate, \
+                family_quotient_benefices - family_quotient_benefices_capping
+        return tax_with_family_quotient, marginal_tax_rate, None
+
+
+# compiled once per year (including indexed future years) and shared by all simulators
+income_tax_scales: dict[int, IncomeTaxScale] = registry.tables(IncomeTaxScale)
+
+
+# Version of the tax rules implemented by the stages: it must be increased with any change of the computation, so that
+# stored results are invalidated (see result_store, changes of year_tax_parameters are detected without it)
+RULES_VERSION = 1
+
+# A stage of the computation: the TaxSimulator method, the fields it reads (their value or their presence), the fields it
+# writes and the flags it sets. Stages are listed in their order of execution, each reading only inputs or fields
+# written by earlier stages.
+Stage = namedtuple("Stage", ["method", "reads", "writes", "flags"])
+stages: list[Stage] = [
+    Stage("process_family_information",
+          reads={TaxField.YEAR, TaxField.MARRIED, TaxField.NB_CHILDREN, TaxField.NB_CHILDREN_LT_6YO,
+                 TaxField.CHILD_1_BIRTHYEAR, TaxField.CHILD_2_BIRTHYEAR, TaxField.CHILD_3_BIRTHYEAR,
+                 TaxField.CHILD_4_BIRTHYEAR, TaxField.CHILD_5_BIRTHYEAR, TaxField.CHILD_6_BIRTHYEAR},
+          writes={TaxField.HOUSEHOLD_SHARES, TaxField.NB_CHILDREN_LT_6YO},
+          flags=set()),
+    Stage("compute_rental_income",
+          reads={TaxField.SIMPLIFIED_RENTAL_INCOME_4BE, TaxField.REAL_RENTAL_PROFIT_4BA,
+                 TaxField.REAL_RENTAL_INCOME_DEFICIT_4BB, TaxField.RENTAL_INCOME_GLOBAL_DEFICIT_4BC,
+                 TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD},
+          writes={TaxField.RENTAL_INCOME_RESULT, TaxField.RENTAL_DEFICIT_CARRYOVER},
+          flags={TaxInfoFlag.RENTAL_DEFICIT_CARRYOVER}),
+    Stage("compute_furnished_rentals",
+          reads={TaxField.LMNP_MICRO_INCOME_1_5ND, TaxField.LMNP_MICRO_INCOME_2_5OD, TaxField.LMNP_MICRO_INCOME_3_5PD},
+          writes={TaxField.TAXABLE_LMNP_INCOME},
+          flags=set()),
+    Stage("compute_net_income",
+          reads={TaxField.MARRIED, TaxField.SALARY_1_1AJ, TaxField.EXERCISE_GAIN_1_1TT, TaxField.SALARY_2_1BJ,
+                 TaxField.EXERCISE_GAIN_2_1UT, TaxField.RENTAL_INCOME_RESULT, TaxField.TAXABLE_LMNP_INCOME,
+                 TaxField.AGRICULTURAL_INCOME},
+          writes={TaxField.DEDUCTION_10P_1, TaxField.DEDUCTION_10P_2, TaxField.TOTAL_NET_INCOME},
+          flags={TaxInfoFlag.FEE_REBATE_INCOME_1, TaxInfoFlag.FEE_REBATE_INCOME_2}),
+    Stage("compute_taxable_income",
+          reads={TaxField.TOTAL_NET_INCOME, TaxField.PER_TRANSFERS_1_6NS, TaxField.PER_TRANSFERS_2_6NT,
+                 TaxField.TAXABLE_ACQUISITION_GAIN_1TZ},
+          writes={TaxField.TAXABLE_INCOME},
+          flags=set()),
+    Stage("compute_flat_rate_taxes",
+          reads={TaxField.FIXED_INCOME_INTERESTS_2TR},
+          writes={TaxField.TAXABLE_INVESTMENT_INCOME, TaxField.INVESTMENT_INCOME_TAX},
+          flags=set()),
+    Stage("compute_reference_fiscal_income",
+          reads={TaxField.TOTAL_NET_INCOME, TaxField.TAXABLE_INVESTMENT_INCOME, TaxField.CAPITAL_GAIN_3VG},
+          writes={TaxField.REFERENCE_FISCAL_INCOME},
+          flags=set()),
+    Stage("compute_tax_before_reductions",
+          reads={TaxField.MARRIED, TaxField.HOUSEHOLD_SHARES, TaxField.TAXABLE_INCOME, TaxField.INVESTMENT_INCOME_TAX},
+          writes={TaxField.SIMPLE_TAX_RIGHT, TaxField.TAX_BEFORE_REDUCTIONS},
+          flags={TaxInfoFlag.MARGINAL_TAX_RATE, TaxInfoFlag.FAMILY_QUOTIENT_CAPPING}),
+    Stage("compute_tax_reductions",
+          reads={TaxField.MARRIED, TaxField.CHARITY_DONATION_7UD, TaxField.CHARITY_DONATION_7UF, TaxField.TAXABLE_INCOME,
+                 TaxField.SME_CAPITAL_SUBSCRIPTION_7CF, TaxField.SME_CAPITAL_SUBSCRIPTION_7CH},
+          writes={TaxField.CHARITY_REDUCTION, TaxField.SME_SUBSCRIPTION_REDUCTION},
+          flags={TaxInfoFlag.CHARITY_75P, TaxInfoFlag.CHARITY_66P}),
+    Stage("compute_tax_credits",
+          reads={TaxField.NB_CHILDREN, TaxField.NB_CHILDREN_LT_6YO, TaxField.HOME_SERVICES_7DB,
+                 TaxField.CHILDREN_DAYCARE_FEES_7GA, TaxField.CHILDREN_DAYCARE_FEES_7GB,
+                 TaxField.CHILDREN_DAYCARE_FEES_7GC, TaxField.CHILDREN_DAYCARE_FEES_7GD,
+                 TaxField.CHILDREN_DAYCARE_FEES_7GE, TaxField.CHILDREN_DAYCARE_FEES_7GF,
+                 TaxField.CHILDREN_DAYCARE_FEES_7GG},
+          writes={TaxField.CHILDREN_DAYCARE_TAXCREDIT, TaxField.HOME_SERVICES_TAXCREDIT},
+          flags={TaxInfoFlag.CHILD_DAYCARE_CREDIT_CAPPING, TaxInfoFlag.HOME_SERVICES_CREDIT_CAPPING}),
+    Stage("compute_capital_taxes",
+          reads={TaxField.CAPITAL_GAIN_3VG},
+          writes={TaxField.CAPITAL_GAIN_TAX},
+          flags=set()),
+    Stage("compute_net_taxes",
+          reads={TaxField.TAX_BEFORE_REDUCTIONS, TaxField.CHARITY_REDUCTION, TaxField.SME_SUBSCRIPTION_REDUCTION,
+                 TaxField.CHILDREN_DAYCARE_TAXCREDIT, TaxField.HOME_SERVICES_TAXCREDIT, TaxField.CAPITAL_GAIN_TAX,
+                 TaxField.INTEREST_TAX_ALREADY_PAID_2CK},
+          writes={TaxField.NET_TAXES},
+          flags={TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES}),
+    Stage("compute_social_taxes",
+          reads={TaxField.CAPITAL_GAIN_3VG, TaxField.TAXABLE_ACQUISITION_GAIN_1TZ,
+                 TaxField.ACQUISITION_GAIN_REBATES_1UZ, TaxField.ACQUISITION_GAIN_50P_REBATES_1WZ,
+                 TaxField.TAXABLE_INVESTMENT_INCOME, TaxField.FIXED_INCOME_INTERESTS_ALREADY_TAXED_2BH,
+                 TaxField.RENTAL_INCOME_RESULT, TaxField.TAXABLE_LMNP_INCOME, TaxField.EXERCISE_GAIN_1_1TT,
+                 TaxField.EXERCISE_GAIN_2_1UT},
+          writes={TaxField.NET_SOCIAL_TAXES},
+          flags=set()),
+]
+
+
+def _stages_requirements() -> tuple[dict[TaxField, list[Stage]], dict[TaxInfoFlag, list[Stage]]]:
+    # for each computed field (resp. flag), all the stages to run (in order) to get it
+    requirements = {}
+    for i, stage in enumerate(stages):
+        needed = {i}
+        for field in stage.reads - stage.writes:
+            needed.update(stages.index(required) for required in requirements.get(field, []))
+        for field in stage.writes:
+            requirements.setdefault(field, [stages[n] for n in sorted(needed)])
+    flag_requirements = {flag: requirements[next(iter(stage.writes))] for stage in stages for flag in stage.flags}
+    return requirements, flag_requirements
+
+
+field_requirements, flag_requirements = _stages_requirements()
+all_stages = frozenset(stage.method for stage in stages)
+
+
+def div_half_up(numerator: int, denominator: int) -> int:
+    # integer division rounding half up (i.e. away from zero), denominator must be positive
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if 2 * remainder >= denominator:
+        quotient += 1
+    return -quotient if numerator < 0 else quotient
 
 
 def tax_round(v: float, places: int = 0) -> float:
-    # python rounds half to even (bankers rounding), we need to tax_round half up
-    q = Decimal(10) ** (-places)
-    return float(Decimal(v).quantize(q, rounding=ROUND_HALF_UP))
+    # python rounds half to even (bankers rounding), we need to tax_round half up. Floats are exact binary fractions, so
+    # this is done with integers on the exact value (same result as Decimal(v).quantize(..., ROUND_HALF_UP), faster)
+    numerator, denominator = v.as_integer_ratio()
+    scale = 10 ** places
+    return copysign(div_half_up(abs(numerator) * scale, denominator) / scale, v)
+
+
+# The fixed ordinal of each TaxField, its slot in a TaxState. Keyed by the name of the field: the hash of a string is
+# cached, while the Enum hashes in Python code.
+field_ordinals: dict[str, int] = {field.name: ordinal for ordinal, field in enumerate(TaxField)}
+_ABSENT, _BOOL, _INT, _FLOAT, _OBJECT = range(5)
+
+
+class TaxState(MutableMapping):
+    # Compact alternative to the defaultdict(int) state of TaxSimulator: values are stored in a preallocated array of
+    # doubles indexed by the ordinal of the TaxField, along with their type (so that ints stay ints, which shows in the
+    # flags). Like a defaultdict(int), reading a missing field sets it to 0.
+    __slots__ = ("values", "kinds", "objects")
+    values: array
+    kinds: bytearray
+    objects: dict[TaxField, Any]  # values that don't fit in a double (big ints, other objects)
+
+    def __init__(self, tax_input: Optional[dict[TaxField, Any]] = None):
+        self.values = array("d", bytes(8 * len(TaxField)))
+        self.kinds = bytearray(len(TaxField))
+        self.objects = {}
+        if tax_input:
+            for field, value in tax_input.items():
+                self[field] = value
+
+    def __getitem__(self, field: TaxField) -> Any:
+        ordinal = field_ordinals[field._name_]
+        kind = self.kinds[ordinal]
+        if kind == _FLOAT:
+            return self.values[ordinal]
+        if kind == _INT:
+            return int(self.values[ordinal])
+        if kind == _BOOL:
+            return bool(self.values[ordinal])
+        if kind == _OBJECT:
+            return self.objects[field]
+        self.kinds[ordinal] = _INT
+        return 0
+
+    def __setitem__(self, field: TaxField, value: Any):
+        ordinal = field_ordinals[field._name_]
+        if self.kinds[ordinal] == _OBJECT:
+            del self.objects[field]
+        value_type = type(value)
+        if value_type is float:
+            self.kinds[ordinal] = _FLOAT
+        elif value_type is int and -2 ** 53 <= value <= 2 ** 53:
+            self.kinds[ordinal] = _INT
+        elif value_type is bool:
+            self.kinds[ordinal] = _BOOL
+        else:
+            self.kinds[ordinal] = _OBJECT
+            self.objects[field] = value
+            return
+        self.values[ordinal] = value
+
+    def __delitem__(self, field: TaxField):
+        ordinal = field_ordinals[field._name_]
+        if not self.kinds[ordinal]:
+            raise KeyError(field)
+        if self.kinds[ordinal] == _OBJECT:
+            del self.objects[field]
+        self.kinds[ordinal] = _ABSENT
+        self.values[ordinal] = 0
+
+    def __contains__(self, field: Any) -> bool:
+        return isinstance(field, TaxField) and self.kinds[field_ordinals[field._name_]] != _ABSENT
+
+    def __iter__(self) -> Iterator[TaxField]:
+        fields = list(TaxField)
+        return (fields[ordinal] for ordinal, kind in enumerate(self.kinds) if kind != _ABSENT)
+
+    def __len__(self) -> int:
+        return len(self.kinds) - self.kinds.count(_ABSENT)
+
+    # get() and pop() must not go through __getitem__, which would set missing fields
+    def get(self, field: TaxField, default: Any = None) -> Any:
+        return self[field] if field in self else default
+
+    def pop(self, field: TaxField, *default: Any) -> Any:
+        if field not in self:
+            if default:
+                return default[0]
+            raise KeyError(field)
+        value = self[field]
+        del self[field]
+        return value
+
+    def __repr__(self):
+        return f"TaxState({dict(self)})"
+
+
+# The numbers behind a flag, its text being formatted from them: the retained amount (or rate), and for cappings the
+# original amount, the cap and the excess over it (None where they don't apply). Amounts are in the unit of the state.
+FlagValue = namedtuple("FlagValue", ["value", "original", "cap", "excess"], defaults=(None, None, None))
+
+
+def _capped(flag_value: FlagValue) -> str:
+    return " (capped)" if flag_value.excess > 0 else ""
+
+
+def _global_fiscal_advantages(flag_value: FlagValue) -> str:
+    if flag_value.excess:
+        return f"capped to {format_thousands(tax_rules.global_fiscal_advantages_ceiling)}€ " \
+               f"(originally {flag_value.original}€)"
+    return f"{flag_value.original}€ (uncapped, {flag_value.cap - flag_value.original}€ from ceiling)"
+
+
+# how the text of each flag is formatted
+flag_formats: dict[TaxInfoFlag, Callable[[FlagValue], str]] = {
+    TaxInfoFlag.FEE_REBATE_INCOME_1: lambda v: f"taxable income += {round(v.excess)}€",
+    TaxInfoFlag.FEE_REBATE_INCOME_2: lambda v: f"taxable income += {round(v.excess)}€",
+    TaxInfoFlag.MARGINAL_TAX_RATE: lambda v: f"{round(v.value * 100)}%",
+    TaxInfoFlag.FAMILY_QUOTIENT_CAPPING: lambda v: f"tax += {tax_round(v.value, 2)}€",
+    TaxInfoFlag.CHILD_DAYCARE_CREDIT_CAPPING: lambda v: f"capped to {v.value}€ (originally {v.original}€)",
+    TaxInfoFlag.HOME_SERVICES_CREDIT_CAPPING: lambda v: f"capped to {v.cap}€ (originally {v.original}€)",
+    TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES: _global_fiscal_advantages,
+    TaxInfoFlag.CHARITY_75P: lambda v: f"{v.value}€{_capped(v)}",
+    TaxInfoFlag.CHARITY_66P: lambda v: f"{int(v.value)}€{_capped(v)}",
+    TaxInfoFlag.RENTAL_DEFICIT_CARRYOVER: lambda v: f"{v.value}€",
+}
+
+
+class Flags(MutableMapping):
+    # The flags of a simulation, kept as FlagValue records: texts are only formatted when read (flags[flag], items()...),
+    # so simulations whose flags are never displayed don't pay for the f-strings. records gives the numbers directly.
+    __slots__ = ("records", "formats")
+    records: dict[TaxInfoFlag, FlagValue]
+    formats: dict[TaxInfoFlag, Callable[[FlagValue], str]]
+
+    def __init__(self, formats: dict[TaxInfoFlag, Callable[[FlagValue], str]]):
+        self.records = {}
+        self.formats = formats
+
+    def __getitem__(self, flag: TaxInfoFlag) -> str:
+        return self.formats[flag](self.records[flag])
+
+    def __setitem__(self, flag: TaxInfoFlag, flag_value: FlagValue):
+        self.records[flag] = flag_value
+
+    def __delitem__(self, flag: TaxInfoFlag):
+        del self.records[flag]
+
+    def __contains__(self, flag: Any) -> bool:
+        return flag in self.records
+
+    def __iter__(self) -> Iterator[TaxInfoFlag]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __repr__(self):
+        return f"Flags({dict(self)})"
+
+
+class DiscardedFlags(Flags):
+    # The flags of a simulation run with flags=False: none is kept
+    __slots__ = ()
+
+    def __setitem__(self, flag: TaxInfoFlag, flag_value: FlagValue):
+        pass
 
 
 class TaxSimulator:
+    __slots__ = ("parameters", "income_tax_scale", "flags", "debug", "lazy", "state", "inputs", "computed_stages",
+                 "trace")
     parameters: TaxParameters
-    flags: dict[TaxInfoFlag, str]
+    income_tax_scale: IncomeTaxScale
+    flags: Flags
     debug: bool
+    lazy: bool
     state: dict[TaxField, Any]
-
-    def __init__(self, statement_year: int, tax_input: dict[TaxField, Any], debug: bool = False):
-        if statement_year in year_tax_parameters:
-            self.parameters = year_tax_parameters[statement_year]
-        else:
-            # TODO FIXME
-            self.parameters = year_tax_parameters[2022]
-        self.flags = {}
+    inputs: set[TaxField]
+    computed_stages: Union[set[str], frozenset[str]]
+    trace: Optional[list]
+    # compiled scales by year, and formats of the flags (subclasses computing with other units provide their own)
+    income_tax_scales: dict[int, IncomeTaxScale] = income_tax_scales
+    flag_formats: dict[TaxInfoFlag, Callable[[FlagValue], str]] = flag_formats
+
+    # In lazy mode, no stage is run at construction: reading a field with tax_sim[field] (or a flag with
+    # tax_sim.flag(...)) runs only the stages it depends on, once. Until then, state and flags are incomplete.
+    # With compact=True, the state is a TaxState instead of a dictionary (for keeping many simulations in memory).
+    # With debug=True, the events of the computation (tax of each bracket, cappings...) are recorded in trace (see the
+    # trace module), and printed; otherwise the stages only check that trace is None.
+    # With flags=False, no flag is kept (for batch jobs only interested in the state).
+    def __init__(self, statement_year: int, tax_input: dict[TaxField, Any], debug: bool = False, lazy: bool = False,
+                 compact: bool = False, flags: bool = True):
+        self.income_tax_scale = self.income_tax_scales[statement_year]
+        self.parameters = self.income_tax_scale.parameters
+        self.flags = Flags(self.flag_formats) if flags else DiscardedFlags(self.flag_formats)
         self.debug = debug
-        self.state = defaultdict(int, tax_input)
+        self.lazy = lazy
+        self.state = TaxState(tax_input) if compact else defaultdict(int, tax_input)
         self.state[TaxField.YEAR] = statement_year
-        self.process_family_information()
-        self.compute_rental_income()
-        self.compute_furnished_rentals()
-        self.compute_net_income()
-        self.compute_taxable_income()
-        self.compute_flat_rate_taxes()
-        self.compute_reference_fiscal_income()
-        self.compute_tax_before_reductions()
-        self.compute_tax_reductions()
-        self.compute_tax_credits()
-        self.compute_capital_taxes()
-        self.compute_net_taxes()
-        self.compute_social_taxes()
+        self.inputs = set(tax_input)
+        self.trace = [] if debug else None
+        if lazy:
+            self.computed_stages = set()
+        elif debug:
+            for stage in stages:
+                self._run_stage(stage)
+            self.computed_stages = all_stages
+        else:
+            for stage in stages:
+                getattr(self, stage.method)()
+            self.computed_stages = all_stages  # shared, only lazy simulators change their set of computed stages
+
+    def _run_stage(self, stage: Stage):
+        if self.debug:  # the events of a stage run again replace the previous ones
+            self.trace = [event for event in self.trace if event.stage != stage.method]
+        getattr(self, stage.method)()
+
+    # Records (and prints) an event of a stage, in debug mode only: stages call it under "if self.trace is not None"
+    def _trace(self, stage: str, event_type: type, *values: Any):
+        event = event_type(stage, *values)
+        print(event)
+        self.trace.append(event)
+
+    # How a field was derived, down to the inputs, with the events of each stage in debug mode (see trace.explain)
+    def explain(self, field: TaxField):
+        from .trace import explain
+        return explain(self, field)
+
+    def _run_stages(self, required_stages: list[Stage]):
+        for stage in required_stages:
+            if stage.method not in self.computed_stages:
+                self._run_stage(stage)
+                self.computed_stages.add(stage.method)
+
+    # an absent field reads as 0, without being added to the state
+    def __getitem__(self, field: TaxField) -> Any:
+        self._run_stages(field_requirements.get(field, []))
+        return self.state.get(field, 0)
+
+    def flag(self, flag: TaxInfoFlag) -> Optional[str]:
+        self._run_stages(flag_requirements[flag])
+        return self.flags.get(flag)
+
+    # the numbers behind a flag, see FlagValue
+    def flag_value(self, flag: TaxInfoFlag) -> Optional[FlagValue]:
+        self._run_stages(flag_requirements[flag])
+        return self.flags.records.get(flag)
+
+    # Changes some inputs, given as a dictionary and/or by name (e.g. update(CHARITY_DONATION_7UF=500)); a None value
+    # removes the input. Only the stages reading a changed field are run again, the fields and flags written by other
+    # stages are left untouched. Returns the names of the stages that were run again (in lazy mode, stages are only
+    # invalidated, to be run again on demand).
+    def update(self, changes: Optional[dict[TaxField, Any]] = None, **fields) -> list[str]:
+        changes = dict(changes or {})
+        changes.update((TaxField[name], value) for name, value in fields.items())
+        if TaxField.YEAR in changes:
+            raise Exception("The statement year cannot be updated, create a new TaxSimulator instead")
+        for field, value in changes.items():
+            if value is None:
+                self.state.pop(field, None)
+                self.inputs.discard(field)
+            else:
+                self.state[field] = value
+                self.inputs.add(field)
+        changed = set(changes)
+        recomputed = []
+        for stage in stages:
+            if stage.method not in self.computed_stages or changed.isdisjoint(stage.reads):
+                continue
+            previous_values = {field: self.state.get(field) for field in stage.writes}
+            for field in stage.writes - self.inputs:
+                self.state.pop(field, None)
+            for flag in stage.flags:
+                self.flags.pop(flag, None)
+            recomputed.append(stage.method)
+            if self.lazy:
+                self.computed_stages.discard(stage.method)
+                changed.update(stage.writes)
+                continue
+            self._run_stage(stage)
+            changed.update(field for field in stage.writes if self.state.get(field) != previous_values[field])
+        return recomputed
 
     def process_family_information(self):
         # See https://www.service-public.fr/particuliers/vosdroits/F2705 and
@@ -186,8 +646,9 @@ class TaxSimulator:
         nb_children_1 = min(self.state[TaxField.NB_CHILDREN], 2)
         nb_children_2 = max(0, self.state[TaxField.NB_CHILDREN] - nb_children_1)
         self.state[TaxField.HOUSEHOLD_SHARES] = base_shares + nb_children_1 * 0.5 + nb_children_2
-        # counting children aged less than 6 years old, if not provided
-        if TaxField.NB_CHILDREN_LT_6YO not in self.state:
+        # counting children aged less than 6 years old, if not provided (declared inputs are checked on inputs: reading
+        # the state stores a 0 for an absent field)
+        if TaxField.NB_CHILDREN_LT_6YO not in self.inputs:
             nb_children_lt_6yo = 0
             for child_birthyear_key in [TaxField.CHILD_1_BIRTHYEAR,
                                         TaxField.CHILD_2_BIRTHYEAR,
@@ -195,9 +656,9 @@ class TaxSimulator:
                                         TaxField.CHILD_4_BIRTHYEAR,
                                         TaxField.CHILD_5_BIRTHYEAR,
                                         TaxField.CHILD_6_BIRTHYEAR]:
-                if child_birthyear_key in self.state:
+                if child_birthyear_key in self.inputs:
                     # counting from year-1, (i.e. if declaring in 2022, checking age on Jan 1st 2021)
-                    if self.state[TaxField.YEAR] - 1 - self.state[child_birthyear_key] <= 6:
+                    if self.state[TaxField.YEAR] - 1 - self.state[child_birthyear_key] <= tax_rules.young_child_max_age:
                         nb_children_lt_6yo += 1
             self.state[TaxField.NB_CHILDREN_LT_6YO] = nb_children_lt_6yo
 
@@ -226,9 +687,11 @@ class TaxSimulator:
             if net_profit or deficit or global_deficit or previous_deficit:
                 raise Exception("The simplified rental income reporting (4BE) cannot be combined with the default "
                                 "rental income reporting (4BA 4BB 4BC)")
-            if simplified_income_reporting > 15000:
-                raise Exception("Simplified rental income reporting (4BE) cannot exceed 15'000€")
-            final_net_profit = simplified_income_reporting * 0.7  # 30% rebate automatically applied
+            if simplified_income_reporting > tax_rules.simplified_rental_income_ceiling:
+                raise Exception(f"Simplified rental income reporting (4BE) cannot exceed "
+                                f"{format_thousands(tax_rules.simplified_rental_income_ceiling)}€")
+            # 30% rebate automatically applied
+            final_net_profit = simplified_income_reporting * tax_rules.simplified_rental_income_taxed_share
             final_deficit_carryover = 0
         elif net_profit:
             if deficit or global_deficit:
@@ -237,15 +700,16 @@ class TaxSimulator:
             final_net_profit = max(net_profit - previous_deficit, 0)
             final_deficit_carryover = max(0, previous_deficit - net_profit)
         else:
-            if global_deficit > 10700:
-                raise Exception("Rental deficit for global deduction (4BC) cannot exceed 10'700€")
+            if global_deficit > tax_rules.rental_global_deficit_ceiling:
+                raise Exception(f"Rental deficit for global deduction (4BC) cannot exceed "
+                                f"{format_thousands(tax_rules.rental_global_deficit_ceiling)}€")
             final_net_profit = -global_deficit
             final_deficit_carryover = deficit + previous_deficit
 
         self.state[TaxField.RENTAL_INCOME_RESULT] = final_net_profit
         if final_deficit_carryover:
             self.state[TaxField.RENTAL_DEFICIT_CARRYOVER] = final_deficit_carryover
-            self.flags[TaxInfoFlag.RENTAL_DEFICIT_CARRYOVER] = f"{final_deficit_carryover}€"
+            self.flags[TaxInfoFlag.RENTAL_DEFICIT_CARRYOVER] = FlagValue(final_deficit_carryover)
 
     def compute_furnished_rentals(self):
         # This corresponds to "Non-professional furnished rentals" (LMNP in French, for "Location meublées non
@@ -254,7 +718,8 @@ class TaxSimulator:
         incomes = self.state[TaxField.LMNP_MICRO_INCOME_1_5ND] \
                   + self.state[TaxField.LMNP_MICRO_INCOME_2_5OD] \
                   + self.state[TaxField.LMNP_MICRO_INCOME_3_5PD]
-        incomes_rebate = max(incomes * 0.5, 305)  # minimum rebate is 305e
+        # minimum rebate is 305e
+        incomes_rebate = max(incomes * tax_rules.lmnp_rebate_rate, tax_rules.lmnp_rebate_floor)
         self.state[TaxField.TAXABLE_LMNP_INCOME] = max(incomes - incomes_rebate, 0)
 
     def compute_agricultural_income(self):
@@ -273,20 +738,27 @@ class TaxSimulator:
         # https://www.impots.gouv.fr/portail/particulier/questions/comment-puis-je-beneficier-de-la-deduction-forfaitaire-de-10
         fees_10p_floor = self.parameters.fees_10p_deduction_floor
         fees_10p_ceiling = self.parameters.fees_10p_deduction_ceiling
-        incomes_1_10p = tax_round(incomes_1 * 0.1)
+        incomes_1_10p = tax_round(incomes_1 * tax_rules.fees_deduction_rate)
         fee_deduction_1 = max(min(incomes_1_10p, fees_10p_ceiling), fees_10p_floor)
         self.state[TaxField.DEDUCTION_10P_1] = fee_deduction_1
+        if self.trace is not None:
+            self._trace("compute_net_income", Capping, "DEDUCTION_10P_1", incomes_1_10p, fees_10p_floor,
+                        fees_10p_ceiling, fee_deduction_1)
         if incomes_1_10p > fees_10p_ceiling:
-            tax_increment = round(incomes_1_10p - fees_10p_ceiling)
-            self.flags[TaxInfoFlag.FEE_REBATE_INCOME_1] = f"taxable income += {tax_increment}€"
+            self.flags[TaxInfoFlag.FEE_REBATE_INCOME_1] = FlagValue(fees_10p_ceiling, incomes_1_10p, fees_10p_ceiling,
+                                                                    incomes_1_10p - fees_10p_ceiling)
         net_income = incomes_1 - fee_deduction_1
         if self.state[TaxField.MARRIED]:
-            incomes_2_10p = tax_round(incomes_2 * 0.1)
+            incomes_2_10p = tax_round(incomes_2 * tax_rules.fees_deduction_rate)
             fee_deduction_2 = max(min(incomes_2_10p, fees_10p_ceiling), fees_10p_floor)
             self.state[TaxField.DEDUCTION_10P_2] = fee_deduction_2
+            if self.trace is not None:
+                self._trace("compute_net_income", Capping, "DEDUCTION_10P_2", incomes_2_10p, fees_10p_floor,
+                            fees_10p_ceiling, fee_deduction_2)
             if incomes_2_10p > fees_10p_ceiling:
-                tax_increment = round(incomes_2_10p - fees_10p_ceiling)
-                self.flags[TaxInfoFlag.FEE_REBATE_INCOME_2] = f"taxable income += {tax_increment}€"
+                self.flags[TaxInfoFlag.FEE_REBATE_INCOME_2] = FlagValue(fees_10p_ceiling, incomes_2_10p,
+                                                                        fees_10p_ceiling,
+                                                                        incomes_2_10p - fees_10p_ceiling)
             net_income += incomes_2 - fee_deduction_2
         self.state[TaxField.TOTAL_NET_INCOME] = net_income + self.state[TaxField.RENTAL_INCOME_RESULT] \
             + self.state[TaxField.TAXABLE_LMNP_INCOME] + self.state[TaxField.AGRICULTURAL_INCOME]
@@ -297,15 +769,12 @@ class TaxSimulator:
         self.state[TaxField.TAXABLE_INCOME] = self.state[TaxField.TOTAL_NET_INCOME] - total_per
         self.state[TaxField.TAXABLE_INCOME] += self.state[TaxField.TAXABLE_ACQUISITION_GAIN_1TZ]  # Taxable part of RSUs
 
-    def maybe_print(self, *args):
-        if self.debug:
-            print(*args)
-
     def compute_flat_rate_taxes(self):
         # supporting 2TR only for now
         # TODO: support others (2DC, 2FU, 2TS, 2TT, 2WW, 2ZZ, 2TQ, 2TZ)
         self.state[TaxField.TAXABLE_INVESTMENT_INCOME] = self.state[TaxField.FIXED_INCOME_INTERESTS_2TR]
-        self.state[TaxField.INVESTMENT_INCOME_TAX] = tax_round(self.state[TaxField.TAXABLE_INVESTMENT_INCOME] * 0.128)
+        self.state[TaxField.INVESTMENT_INCOME_TAX] = tax_round(self.state[TaxField.TAXABLE_INVESTMENT_INCOME]
+                                                               * tax_rules.investment_income_tax_rate)
 
     def compute_reference_fiscal_income(self):
         self.state[TaxField.REFERENCE_FISCAL_INCOME] = max(self.state[TaxField.TOTAL_NET_INCOME] \
@@ -314,60 +783,18 @@ class TaxSimulator:
                                                            0)
 
     def _compute_income_tax(self, household_shares):
-        # https://www.service-public.fr/particuliers/vosdroits/F1419
-        slices_thresholds = self.parameters.slices_thresholds
-        slices_rates = self.parameters.slices_rates
-        taxable_income = self.state[TaxField.TAXABLE_INCOME]
-        thresholds = [t * household_shares for t in
-                      slices_thresholds]  # scale thresholds to the number of people in the household
-        self.maybe_print("Thresholds: ", thresholds)
-        self.maybe_print("Shares: ", household_shares)
-        tax = 0
-        income_accounted_for = thresholds[0]
-        bucket_n = 0
-        marginal_tax_rate = 0
-        while (taxable_income > income_accounted_for) and (bucket_n < len(thresholds) - 1):
-            self.maybe_print("Accounted for: ", income_accounted_for)
-            self.maybe_print("In bucket ", bucket_n)
-            bucket_amount = thresholds[bucket_n + 1] - thresholds[bucket_n]
-            self.maybe_print("Bucket amount: ", bucket_amount)
-            bucket_tax = slices_rates[bucket_n] * min(bucket_amount, taxable_income - income_accounted_for)
-            marginal_tax_rate = slices_rates[bucket_n]
-            self.maybe_print("Bucket tax: ", bucket_tax)
-            tax += bucket_tax
-            self.maybe_print("Tax now: ", tax)
-            income_accounted_for = thresholds[bucket_n + 1]
-            bucket_n += 1
-        if taxable_income > income_accounted_for:
-            self.maybe_print("We're in the last slice")
-            # we're in the last bucket, we apply the last rate to the rest of the income
-            tax += slices_rates[-1] * (taxable_income - income_accounted_for)
-            marginal_tax_rate = slices_rates[-1]
-        self.maybe_print("Total tax before reductions: ", tax)
-        return tax, marginal_tax_rate
+        return self.income_tax_scale.income_tax(self.state[TaxField.TAXABLE_INCOME], household_shares)
 
     # computes the actual progressive tax
     def compute_tax_before_reductions(self):
-        capping_parameter = self.parameters.family_quotient_benefices_capping
         household_shares = self.state[TaxField.HOUSEHOLD_SHARES]
-        tax_with_family_quotient, marginal_tax_rate = self._compute_income_tax(household_shares)
-        self.flags[TaxInfoFlag.MARGINAL_TAX_RATE] = f"{round(marginal_tax_rate * 100)}%"
         household_shares_without_family_quotient = 2 if self.state[TaxField.MARRIED] else 1
-        tax_without_family_quotient, _ = self._compute_income_tax(household_shares_without_family_quotient)
-        # apply capping of the family quotient benefices, see
-        # https://www.economie.gouv.fr/particuliers/quotient-familial
-        family_quotient_benefices = tax_without_family_quotient - tax_with_family_quotient
-        family_quotient_benefices_capping = capping_parameter * (
-                (household_shares - household_shares_without_family_quotient) * 2)
-        self.maybe_print("Family quotient benefices: ", family_quotient_benefices, "  ;  Capped to: ",
-                         family_quotient_benefices_capping)
-        if family_quotient_benefices > family_quotient_benefices_capping:
-            additional_taxes = family_quotient_benefices - family_quotient_benefices_capping
-            self.flags[
-                TaxInfoFlag.FAMILY_QUOTIENT_CAPPING] = f"tax += {tax_round(additional_taxes, 2)}€"
-            final_income_tax = tax_without_family_quotient - family_quotient_benefices_capping
-        else:
-            final_income_tax = tax_with_family_quotient
+        final_income_tax, marginal_tax_rate, additional_taxes = self.income_tax_scale.capped_income_tax(
+            self.state[TaxField.TAXABLE_INCOME], household_shares, household_shares_without_family_quotient,
+            None if self.trace is None else partial(self._trace, "compute_tax_before_reductions"))
+        self.flags[TaxInfoFlag.MARGINAL_TAX_RATE] = FlagValue(marginal_tax_rate)
+        if additional_taxes is not None:
+            self.flags[TaxInfoFlag.FAMILY_QUOTIENT_CAPPING] = FlagValue(additional_taxes)
         self.state[TaxField.SIMPLE_TAX_RIGHT] = tax_round(final_income_tax)  # "Droits simples" in French
         self.state[TaxField.TAX_BEFORE_REDUCTIONS] = self.state[TaxField.SIMPLE_TAX_RIGHT] + self.state[
             TaxField.INVESTMENT_INCOME_TAX]
@@ -380,30 +807,44 @@ class TaxSimulator:
         # https://www.impots.gouv.fr/portail/particulier/questions/jai-fait-des-dons-une-association-que-puis-je-deduire
         # 75% reduction for "Dons aux organismes d'aide aux personnes en difficulté", up to a ceiling ...
         charity_donation_7ud = self.state[TaxField.CHARITY_DONATION_7UD]
-        capped_or_not = " (capped)" if charity_donation_7ud > 1000 else ""
-        charity_donation_75p = min(charity_donation_7ud, 1000)
-        self.flags[TaxInfoFlag.CHARITY_75P] = f"{charity_donation_75p}€{capped_or_not}"
-        charity_donation_reduction_75p = charity_donation_75p * 0.75
+        charity_donation_75p = min(charity_donation_7ud, tax_rules.charity_75p_ceiling)
+        self.flags[TaxInfoFlag.CHARITY_75P] = FlagValue(charity_donation_75p, charity_donation_7ud,
+                                                        tax_rules.charity_75p_ceiling,
+                                                        charity_donation_7ud - charity_donation_75p)
+        charity_donation_reduction_75p = charity_donation_75p * tax_rules.charity_75p_rate
         # ... then 66% for the rest, plus the "Dons aux organismes d'intérêt général", up to 20% of the taxable income
         charity_donation_7uf = self.state[TaxField.CHARITY_DONATION_7UF]
-        donation_leftover = charity_donation_7uf + max(charity_donation_7ud - 1000, 0)
+        donation_leftover = charity_donation_7uf + max(charity_donation_7ud - tax_rules.charity_75p_ceiling, 0)
         taxable_income = max(self.state[TaxField.TAXABLE_INCOME], 0)
-        capped_or_not = " (capped)" if donation_leftover > taxable_income * 0.20 else ""
-        charity_donation_66p = tax_round(min(donation_leftover, taxable_income * 0.20))
-        charity_donation_reduction_66p = charity_donation_66p * 0.66
-        self.flags[TaxInfoFlag.CHARITY_66P] = f"{int(charity_donation_66p)}€{capped_or_not}"
+        charity_donation_cap = taxable_income * tax_rules.charity_66p_income_share
+        charity_donation_66p = tax_round(min(donation_leftover, charity_donation_cap))
+        charity_donation_reduction_66p = charity_donation_66p * tax_rules.charity_66p_rate
+        self.flags[TaxInfoFlag.CHARITY_66P] = FlagValue(charity_donation_66p, donation_leftover, charity_donation_cap,
+                                                        max(donation_leftover - charity_donation_cap, 0))
+        if self.trace is not None:
+            self._trace("compute_tax_reductions", Capping, "CHARITY_75P", charity_donation_7ud, None,
+                        tax_rules.charity_75p_ceiling, charity_donation_75p)
+            self._trace("compute_tax_reductions", Capping, "CHARITY_66P", donation_leftover, None,
+                        charity_donation_cap, charity_donation_66p)
         # Total reduction
         self.state[TaxField.CHARITY_REDUCTION] = charity_donation_reduction_75p + charity_donation_reduction_66p
 
         # Subscription to PME capital: in 2020 there are 2 segments: before and after Aug.10th (with different reduction
         # rates). See:
         # https://www.impots.gouv.fr/portail/particulier/questions/si-jinvestis-dans-une-entreprise-ai-je-droit-une-reduction-dimpot
-        subscription_capping = 100000 if self.state[TaxField.MARRIED] else 50000
+        subscription_capping = tax_rules.sme_subscription_ceiling_married if self.state[TaxField.MARRIED] \
+            else tax_rules.sme_subscription_ceiling_single
         pme_capital_subscription_before = min(self.state[TaxField.SME_CAPITAL_SUBSCRIPTION_7CF], subscription_capping)
         pme_capital_subscription_after = min(self.state[TaxField.SME_CAPITAL_SUBSCRIPTION_7CH],
                                              subscription_capping - pme_capital_subscription_before)
-        self.state[TaxField.SME_SUBSCRIPTION_REDUCTION] = pme_capital_subscription_before * 0.18 \
-            + pme_capital_subscription_after * 0.25
+        if self.trace is not None:
+            self._trace("compute_tax_reductions", Capping, "SME_SUBSCRIPTION",
+                        self.state[TaxField.SME_CAPITAL_SUBSCRIPTION_7CF]
+                        + self.state[TaxField.SME_CAPITAL_SUBSCRIPTION_7CH], None, subscription_capping,
+                        pme_capital_subscription_before + pme_capital_subscription_after)
+        self.state[TaxField.SME_SUBSCRIPTION_REDUCTION] = \
+            pme_capital_subscription_before * tax_rules.sme_subscription_rate_7cf \
+            + pme_capital_subscription_after * tax_rules.sme_subscription_rate_7ch
 
     def compute_tax_credits(self):
         # Daycare fees, capped & rated at 50%. See:
@@ -422,31 +863,41 @@ class TaxSimulator:
             TaxField.CHILDREN_DAYCARE_FEES_7GF,
             TaxField.CHILDREN_DAYCARE_FEES_7GG
         ]:
-            if fees_key in self.state:
+            if fees_key in self.inputs:
                 nb_children_with_daycare_fees += 1
                 if nb_children_with_daycare_fees > nb_children_lt_6yo:
                     raise Exception(f"You are declaring more children daycare fees ({nb_children_with_daycare_fees}) "
                                     f"than you have children below 6y old ({nb_children_lt_6yo})")
-                total_fees += min(self.state[fees_key], 2300)
-                fees_capped_out += max(self.state[fees_key] - 2300, 0)
-        self.flags[
-            TaxInfoFlag.CHILD_DAYCARE_CREDIT_CAPPING] = f"capped to {total_fees}€ (originally " \
-                                                        f"{total_fees + fees_capped_out}€)"
-        self.state[TaxField.CHILDREN_DAYCARE_TAXCREDIT] = total_fees * 0.5
+                fees = self.state[fees_key]
+                capped_fees = min(fees, tax_rules.daycare_fees_ceiling)
+                total_fees += capped_fees
+                fees_capped_out += max(fees - tax_rules.daycare_fees_ceiling, 0)
+                if self.trace is not None:
+                    self._trace("compute_tax_credits", Capping, fees_key.name, fees, None,
+                                tax_rules.daycare_fees_ceiling, capped_fees)
+        self.flags[TaxInfoFlag.CHILD_DAYCARE_CREDIT_CAPPING] = FlagValue(total_fees, total_fees + fees_capped_out,
+                                                                         None, fees_capped_out)
+        self.state[TaxField.CHILDREN_DAYCARE_TAXCREDIT] = total_fees * tax_rules.daycare_credit_rate
 
         # services at home (cleaning etc.)
         # https://www.impots.gouv.fr/portail/particulier/emploi-domicile
-        home_services_capping = min(12000 + 1500 * self.state[TaxField.NB_CHILDREN], 15000)
+        home_services_capping = min(tax_rules.home_services_ceiling
+                                    + tax_rules.home_services_ceiling_per_child * self.state[TaxField.NB_CHILDREN],
+                                    tax_rules.home_services_max_ceiling)
         home_services = self.state[TaxField.HOME_SERVICES_7DB]
         if home_services > home_services_capping:
-            self.flags[TaxInfoFlag.HOME_SERVICES_CREDIT_CAPPING] = f"capped to {home_services_capping}€" \
-                                                                   + f" (originally {home_services}€)"
+            self.flags[TaxInfoFlag.HOME_SERVICES_CREDIT_CAPPING] = FlagValue(home_services_capping, home_services,
+                                                                             home_services_capping,
+                                                                             home_services - home_services_capping)
         capped_home_services = min(home_services, home_services_capping)
-        self.state[TaxField.HOME_SERVICES_TAXCREDIT] = capped_home_services * 0.5
+        if self.trace is not None:
+            self._trace("compute_tax_credits", Capping, "HOME_SERVICES", home_services, None, home_services_capping,
+                        capped_home_services)
+        self.state[TaxField.HOME_SERVICES_TAXCREDIT] = capped_home_services * tax_rules.home_services_credit_rate
 
     def compute_capital_taxes(self):
         # simple, flat tax based (opting for progressive tax with box "2OP" is not supported in this simulator)
-        self.state[TaxField.CAPITAL_GAIN_TAX] = self.state[TaxField.CAPITAL_GAIN_3VG] * 0.128
+        self.state[TaxField.CAPITAL_GAIN_TAX] = self.state[TaxField.CAPITAL_GAIN_3VG] * tax_rules.capital_gain_tax_rate
 
     def compute_net_taxes(self):
         # Tax reductions and credits are in part capped ("Plafonnement des niches fiscales")
@@ -458,13 +909,18 @@ class TaxSimulator:
             - self.state[TaxField.HOME_SERVICES_TAXCREDIT]
 
         fiscal_advantages = all_taxes_before_capping - partial_taxes_2
-        if fiscal_advantages > 10000:
-            self.flags[TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES] = f"capped to 10'000€ (originally {fiscal_advantages}€)"
-            net_taxes_after_global_capping = all_taxes_before_capping - 10000
+        ceiling = tax_rules.global_fiscal_advantages_ceiling
+        if fiscal_advantages > ceiling:
+            self.flags[TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES] = FlagValue(ceiling, fiscal_advantages, ceiling,
+                                                                         fiscal_advantages - ceiling)
+            net_taxes_after_global_capping = all_taxes_before_capping - ceiling
         else:
-            self.flags[TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES] = f"{fiscal_advantages}€" + \
-                                                               f" (uncapped, {10000 - fiscal_advantages}€ from ceiling)"
+            self.flags[TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES] = FlagValue(fiscal_advantages, fiscal_advantages, ceiling,
+                                                                         0)
             net_taxes_after_global_capping = partial_taxes_2
+        if self.trace is not None:
+            self._trace("compute_net_taxes", Capping, "GLOBAL_FISCAL_ADVANTAGES", fiscal_advantages, None, ceiling,
+                        min(fiscal_advantages, ceiling))
 
         net_taxes = net_taxes_after_global_capping + self.state[TaxField.CAPITAL_GAIN_TAX] - self.state[
             TaxField.INTEREST_TAX_ALREADY_PAID_2CK]
@@ -482,7 +938,7 @@ class TaxSimulator:
         activity_income_crds_base = self.state[TaxField.EXERCISE_GAIN_1_1TT] + self.state[TaxField.EXERCISE_GAIN_2_1UT]
         salary_contrib_10p_base = self.state[TaxField.EXERCISE_GAIN_1_1TT] + self.state[TaxField.EXERCISE_GAIN_2_1UT]
 
-        csg_crds_taxes = tax_round((csg_crds_base + activity_income_crds_base) * 0.097)
-        solidarity_75_taxes = tax_round(csg_crds_base * 0.075)
-        salary_contrib_10p = salary_contrib_10p_base * 0.1
+        csg_crds_taxes = tax_round((csg_crds_base + activity_income_crds_base) * tax_rules.csg_crds_rate)
+        solidarity_75_taxes = tax_round(csg_crds_base * tax_rules.solidarity_rate)
+        salary_contrib_10p = salary_contrib_10p_base * tax_rules.salary_contribution_rate
         self.state[TaxField.NET_SOCIAL_TAXES] = csg_crds_taxes + solidarity_75_taxes + salary_contrib_10p
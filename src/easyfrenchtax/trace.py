@@ -0,0 +1,33 @@
+from collections import namedtuple
+
+from .tax_simulator import TaxField, TaxSimulator, field_ordinals, stages
+# Events of the computation trace of a simulator in debug mode, emitted by the stages themselves (see
+# TaxSimulator._trace), in the unit of the state (cents for FixedPointTaxSimulator)
+from .tax_simulator import Capping, FamilyQuotientCapping, IncomeTaxBracket  # noqa: F401
+
+# How a field was derived: its value, the stage writing it (None for inputs), the events of that stage and the
+# explanations of the fields the stage read
+Explanation = namedtuple("Explanation", ["field", "value", "stage", "events", "sources"])
+
+_writers = {field: stage for stage in reversed(stages) for field in stage.writes}
+
+
+# Explains how a field of a simulation was derived, down to the inputs it was given (events are only there in debug
+# mode)
+def explain(tax_sim: TaxSimulator, field: TaxField) -> Explanation:
+    value = tax_sim[field]
+    stage = _writers.get(field)
+    if stage is None or field in tax_sim.inputs:
+        return Explanation(field, value, None, [], [])
+    events = [event for event in tax_sim.trace or [] if event.stage == stage.method]
+    sources = [explain(tax_sim, read) for read in sorted(stage.reads - {field}, key=lambda f: field_ordinals[f.name])
+               if read in tax_sim.inputs or read in _writers]
+    return Explanation(field, value, stage.method, events, sources)
+
+
+def format_explanation(explanation: Explanation, indent: int = 0) -> str:
+    origin = f"{explanation.stage}" if explanation.stage else "input"
+    lines = [f"{'  ' * indent}{explanation.field.name} = {explanation.value}  ({origin})"]
+    lines += [f"{'  ' * (indent + 2)}{event}" for event in explanation.events]
+    lines += [format_explanation(source, indent + 1) for source in explanation.sources]
+    return "\n".join(lines)
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+from src.easyfrenchtax import TaxField, TaxSimulator
+from src.easyfrenchtax.batch_runner import main, parse_record, read_households, run_batch
+from .test_incremental import all_tax_tests
+
+
+def expected_result(year, inputs):
+    tax_sim = TaxSimulator(year, inputs)
+    return {
+        "state": {field.value: value for field, value in tax_sim.state.items()},
+        "flags": {flag.name: text for flag, text in tax_sim.flags.items()},
+    }
+
+
+def test_parse_record():
+    assert parse_record({"year": "2022", "married": "true", "nb_children": "0", "SALARY_1_1AJ": "30000",
+                         "capital_gain_3VG": "1500.5", "salary_2_1BJ": ""}, csv_values=True) == {
+        TaxField.YEAR: 2022,
+        TaxField.MARRIED: True,
+        TaxField.NB_CHILDREN: 0,
+        TaxField.SALARY_1_1AJ: 30000,
+        TaxField.CAPITAL_GAIN_3VG: 1500.5,
+    }
+    with pytest.raises(Exception, match="Unknown tax field: salary"):
+        parse_record({"salary": 1000})
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch(workers):
+    households = [{TaxField.YEAR: t.year, **t.inputs} for t in all_tax_tests]
+    results = list(run_batch(households, workers=workers, chunk_size=3))
+    assert results == [expected_result(t.year, t.inputs) for t in all_tax_tests]
+
+
+def test_run_batch_errors():
+    results = list(run_batch([
+        {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0},
+        {TaxField.YEAR: 2022, TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0,
+         TaxField.SIMPLIFIED_RENTAL_INCOME_4BE: 20000},
+    ], workers=1))
+    assert results == [
+        {"error": "No statement year (missing 'year' field)"},
+        {"error": "Simplified rental income reporting (4BE) cannot exceed 15'000€"},
+    ]
+
+
+def test_read_households_invalid_records(tmp_path):
+    # a record that can't be read gives an error result in its place, the others are still simulated
+    csv_input = tmp_path / "households.csv"
+    csv_input.write_text("year,married,nb_children,salary_1_1AJ\n"
+                         "2022,false,0,30k\n"
+                         "2022,false,0,30000\n")
+    jsonl_input = tmp_path / "households.jsonl"
+    jsonl_input.write_text('{"year": 2022, "married": false, "nb_children": 0, "salary": 30000}\n'
+                           '{"year": 2022, "married": false, "nb_children": 0, "salary_1_1AJ": 30000}\n')
+    expected = expected_result(2022, {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 30000})
+    for path, error in [(csv_input, "Line 2: Invalid value for salary_1_1AJ: '30k'"),
+                        (jsonl_input, "Line 1: Unknown tax field: salary")]:
+        assert list(run_batch(read_households(str(path)), workers=1)) == [{"error": error}, expected]
+
+
+def test_main(tmp_path):
+    csv_input = tmp_path / "households.csv"
+    csv_input.write_text("married,nb_children,salary_1_1AJ,salary_2_1BJ,child_1_birthyear\n"
+                         "true,1,30000,40000,2015\n"
+                         "false,0,55000,,\n")
+    jsonl_input = tmp_path / "households.jsonl"
+    jsonl_input.write_text('{"married": true, "nb_children": 1, "salary_1_1AJ": 30000, "salary_2_1BJ": 40000, '
+                           '"child_1_birthyear": 2015}\n'
+                           '{"married": false, "nb_children": 0, "salary_1_1AJ": 55000}\n')
+    expected = [
+        expected_result(2022, {TaxField.MARRIED: True, TaxField.NB_CHILDREN: 1, TaxField.SALARY_1_1AJ: 30000,
+                               TaxField.SALARY_2_1BJ: 40000, TaxField.CHILD_1_BIRTHYEAR: 2015}),
+        expected_result(2022, {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 55000}),
+    ]
+    expected = json.loads(json.dumps(expected))
+    for path in [csv_input, jsonl_input]:
+        assert len(list(read_households(str(path)))) == 2
+        output = tmp_path / "results.jsonl"
+        main([str(path), "--year", "2022", "--workers", "2", "-o", str(output)])
+        assert [json.loads(line) for line in output.read_text().splitlines()] == expected
+
+
+def test_run_batch_flags_modes():
+    households = [{TaxField.YEAR: t.year, **t.inputs} for t in all_tax_tests[:5]]
+    for household, result in zip(households, run_batch(households, workers=1, flags="values")):
+        tax_sim = TaxSimulator(household[TaxField.YEAR], {k: v for k, v in household.items() if k != TaxField.YEAR})
+        assert result["flags"] == {flag.name: flag_value._asdict()
+                                   for flag, flag_value in tax_sim.flags.records.items()}
+    for household, result in zip(households, run_batch(households, workers=1, flags="none")):
+        assert "flags" not in result
+    with pytest.raises(Exception, match="Unknown flags mode 'all'"):
+        list(run_batch(households, workers=1, flags="all"))
@@ -0,0 +1,86 @@
+import random
+import re
+from collections import defaultdict
+
+import numpy as np
+import pytest
+from src.easyfrenchtax import TaxField, TaxSimulator
+from src.easyfrenchtax.batch_simulator import BatchTaxSimulator, OPTIONAL_FIELDS, tax_round_array
+from src.easyfrenchtax.tax_simulator import tax_round
+from .test_capital_tax import tax_tests as capital_tax_tests
+from .test_fiscal_advantages import tax_tests as fiscal_advantages_tests
+from .test_income_tax import tax_tests as income_tax_tests
+from .test_rental_tax import tax_tests as rental_tax_tests
+
+all_tax_tests = capital_tax_tests + fiscal_advantages_tests + income_tax_tests + rental_tax_tests
+
+
+def assert_same_as_scalar(batch, i, year, inputs):
+    tax_sim = TaxSimulator(year, inputs)
+    row_state = batch.row_state(i)
+    for field in TaxField:
+        assert row_state[field] == tax_sim.state[field], field
+    assert batch.row_flags(i) == tax_sim.flags
+
+
+def to_columns(inputs_list):
+    columns = {}
+    for field in {f for inputs in inputs_list for f in inputs}:
+        values = [inputs.get(field, 0) for inputs in inputs_list]
+        missing = [field not in inputs for inputs in inputs_list]
+        if field in OPTIONAL_FIELDS:
+            columns[field] = np.ma.masked_array(values, mask=missing)
+        else:
+            columns[field] = np.array(values)
+    return columns
+
+
+@pytest.mark.parametrize("year,inputs",
+                         [pytest.param(t.year, t.inputs) for t in all_tax_tests],
+                         ids=[t.name for t in all_tax_tests])
+def test_batch_single_row(year, inputs):
+    batch = BatchTaxSimulator(year, {k: [v] for k, v in inputs.items()})
+    assert_same_as_scalar(batch, 0, year, inputs)
+
+
+def test_batch_all_rows():
+    tests_by_year = defaultdict(list)
+    for t in all_tax_tests:
+        tests_by_year[t.year].append(t)
+    for year, tests in tests_by_year.items():
+        batch = BatchTaxSimulator(year, to_columns([t.inputs for t in tests]))
+        assert len(batch) == len(tests)
+        for i, t in enumerate(tests):
+            assert_same_as_scalar(batch, i, year, t.inputs)
+            for k, res in t.results.items():
+                assert batch.state[k][i] == res
+
+
+def test_batch_structured_array():
+    households = np.array([(True, 2, 30000, 40000, 2020), (False, 1, 50000, 0, 2010)],
+                          dtype=[("married", bool), ("nb_children", int), ("salary_1_1AJ", int),
+                                 ("salary_2_1BJ", int), ("child_1_birthyear", int)])
+    batch = BatchTaxSimulator(2022, households)
+    for i, household in enumerate(households):
+        inputs = {TaxField(name): household[name].item() for name in households.dtype.names}
+        assert_same_as_scalar(batch, i, 2022, inputs)
+
+
+def test_batch_exception():
+    inputs = {
+        TaxField.MARRIED: [True, True],
+        TaxField.NB_CHILDREN: [0, 0],
+        TaxField.SIMPLIFIED_RENTAL_INCOME_4BE: [12000, 16000],
+    }
+    with pytest.raises(Exception, match=re.escape("Row 1: Simplified rental income reporting (4BE) cannot exceed")):
+        BatchTaxSimulator(2022, inputs)
+
+
+def test_tax_round_array():
+    rng = random.Random(42)
+    values = [rng.uniform(-1e6, 1e6) for _ in range(10000)]
+    values += [0.5, 1.5, 2.5, -0.5, -2.5, 0.125, 1.005, 2.675, 0.49999999999999994, 1e15 + 0.5]
+    values += [round(v, 2) + 0.005 for v in values[:1000]]
+    for places in (0, 2):
+        rounded = tax_round_array(values, places)
+        assert [tax_round(v, places) for v in values] == rounded.tolist()
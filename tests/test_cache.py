@@ -0,0 +1,91 @@
+from threading import Thread
+
+import pytest
+from src.easyfrenchtax import TaxField, TaxInfoFlag, TaxSimulator
+from src.easyfrenchtax.cache import CacheStats, SimulationCache, canonical_input
+from src.easyfrenchtax.fixed_point import FixedPointTaxSimulator
+
+household = {
+    TaxField.MARRIED: True,
+    TaxField.NB_CHILDREN: 2,
+    TaxField.SALARY_1_1AJ: 50000,
+    TaxField.SALARY_2_1BJ: 40000,
+    TaxField.CHARITY_DONATION_7UD: 500,
+}
+
+
+def test_canonical_input():
+    reordered = dict(reversed(list(household.items())))
+    assert canonical_input(reordered) == canonical_input(household)
+    # same value, other type: other key (the flags texts differ)
+    assert canonical_input({**household, TaxField.CHARITY_DONATION_7UD: 500.0}) != canonical_input(household)
+
+
+def test_cache_hits_and_misses():
+    cache = SimulationCache(maxsize=10)
+    result = cache.simulate(2022, household)
+    reference = TaxSimulator(2022, household)
+    assert dict(result.state) == dict(reference.state)
+    assert dict(result.flags) == dict(reference.flags)
+    assert result.flag_values[TaxInfoFlag.CHARITY_75P] == reference.flags.records[TaxInfoFlag.CHARITY_75P]
+    assert cache.simulate(2022, dict(reversed(list(household.items())))) is result
+    assert cache.simulate(2021, household) is not result
+    float_donation = cache.simulate(2022, {**household, TaxField.CHARITY_DONATION_7UD: 500.0})
+    assert float_donation.flags[TaxInfoFlag.CHARITY_75P] == "500.0€"
+    assert cache.stats() == CacheStats(hits=1, misses=3, size=3, maxsize=10)
+    cache.clear()
+    assert cache.stats() == CacheStats(hits=0, misses=0, size=0, maxsize=10)
+
+
+def test_cache_read_only():
+    result = SimulationCache().simulate(2022, household)
+    with pytest.raises(TypeError):
+        result.state[TaxField.NET_TAXES] = 0
+    with pytest.raises(TypeError):
+        result.flags[TaxInfoFlag.MARGINAL_TAX_RATE] = "0%"
+    # reading a field that is not in the state doesn't add it
+    assert result.state.get(TaxField.RENTAL_DEFICIT_CARRYOVER) is None
+    with pytest.raises(KeyError):
+        result.state[TaxField.RENTAL_DEFICIT_CARRYOVER]
+
+
+def test_cache_eviction():
+    cache = SimulationCache(maxsize=2)
+    inputs = [{**household, TaxField.SALARY_1_1AJ: salary} for salary in [10000, 20000, 30000]]
+    first = cache.simulate(2022, inputs[0])
+    cache.simulate(2022, inputs[1])
+    assert cache.simulate(2022, inputs[0]) is first  # now the most recently used
+    cache.simulate(2022, inputs[2])  # evicts inputs[1]
+    assert cache.simulate(2022, inputs[0]) is first
+    cache.simulate(2022, inputs[1])
+    assert cache.stats() == CacheStats(hits=2, misses=4, size=2, maxsize=2)
+    with pytest.raises(Exception, match="at least 1"):
+        SimulationCache(maxsize=0)
+
+
+def test_cache_errors_and_simulator():
+    cache = SimulationCache(simulator=FixedPointTaxSimulator)
+    assert cache.simulate(2022, household).state[TaxField.SALARY_1_1AJ] == 5000000
+    bad_input = {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SIMPLIFIED_RENTAL_INCOME_4BE: 20000}
+    for _ in range(2):
+        with pytest.raises(Exception, match="cannot exceed 15'000€"):
+            cache.simulate(2022, bad_input)
+    assert cache.stats().size == 1
+
+
+def test_cache_threads():
+    cache = SimulationCache(maxsize=8)
+    inputs = [{**household, TaxField.SALARY_1_1AJ: 10000 * (n % 10)} for n in range(200)]
+
+    def run():
+        for tax_input in inputs:
+            cache.simulate(2022, tax_input)
+
+    threads = [Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats.hits + stats.misses == 800
+    assert stats.size == 8
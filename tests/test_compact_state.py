@@ -0,0 +1,48 @@
+import pytest
+from src.easyfrenchtax import TaxField, TaxSimulator
+from src.easyfrenchtax.tax_simulator import TaxState
+from .test_incremental import all_tax_tests, assert_same_simulation
+
+
+@pytest.mark.parametrize("year,inputs",
+                         [pytest.param(t.year, t.inputs) for t in all_tax_tests],
+                         ids=[t.name for t in all_tax_tests])
+def test_compact_simulation(year, inputs):
+    tax_sim = TaxSimulator(year, inputs, compact=True)
+    assert isinstance(tax_sim.state, TaxState)
+    assert_same_simulation(tax_sim, TaxSimulator(year, inputs))
+
+
+def test_compact_update():
+    inputs = {TaxField.MARRIED: True, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 30000}
+    tax_sim = TaxSimulator(2022, inputs, compact=True)
+    tax_sim.update(CHARITY_DONATION_7UF=500, SALARY_2_1BJ=40000)
+    assert_same_simulation(tax_sim, TaxSimulator(2022, {**inputs, TaxField.CHARITY_DONATION_7UF: 500,
+                                                        TaxField.SALARY_2_1BJ: 40000}))
+
+
+def test_tax_state_mapping():
+    state = TaxState({TaxField.MARRIED: True, TaxField.NB_CHILDREN: 2, TaxField.SALARY_1_1AJ: 1234.5})
+    assert len(state) == 3
+    assert list(state) == [TaxField.MARRIED, TaxField.NB_CHILDREN, TaxField.SALARY_1_1AJ]
+    assert state[TaxField.MARRIED] is True
+    assert type(state[TaxField.NB_CHILDREN]) is int
+    assert state[TaxField.SALARY_1_1AJ] == 1234.5
+    # like a defaultdict(int)
+    assert state.get(TaxField.SALARY_2_1BJ) is None
+    assert TaxField.SALARY_2_1BJ not in state
+    assert state[TaxField.SALARY_2_1BJ] == 0
+    assert TaxField.SALARY_2_1BJ in state
+    assert state.pop(TaxField.SALARY_2_1BJ) == 0
+    assert state.pop(TaxField.SALARY_2_1BJ, None) is None
+    with pytest.raises(KeyError):
+        del state[TaxField.SALARY_2_1BJ]
+    state[TaxField.NB_CHILDREN] = 2 ** 60
+    assert state[TaxField.NB_CHILDREN] == 2 ** 60
+    assert dict(state) == {TaxField.MARRIED: True, TaxField.NB_CHILDREN: 2 ** 60, TaxField.SALARY_1_1AJ: 1234.5}
+
+
+def test_simulator_slots():
+    tax_sim = TaxSimulator(2022, {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0})
+    with pytest.raises(AttributeError):
+        tax_sim.some_attribute = 1
@@ -0,0 +1,96 @@
+from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
+import random
+
+import pytest
+from src.easyfrenchtax import TaxField, TaxInfoFlag, TaxSimulator
+from src.easyfrenchtax.fixed_point import FixedPointTaxSimulator, NON_MONETARY_FIELDS, format_euros, to_cents
+from src.easyfrenchtax.tax_simulator import div_half_up, tax_round
+from .test_incremental import all_tax_tests
+
+
+def decimal_tax_round(v, places=0):
+    return float(Decimal(v).quantize(Decimal(10) ** -places, rounding=ROUND_HALF_UP))
+
+
+def test_tax_round():
+    rng = random.Random(7)
+    values = [0.5, 1.5, 2.5, -0.5, -2.5, 0.125, 1.005, 2.675, 0.0, -0.0, 1e15 + 0.5]
+    values += [rng.uniform(-1e6, 1e6) for _ in range(2000)] + [rng.randrange(10 ** 6) / 200 for _ in range(2000)]
+    for v in values:
+        for places in range(4):
+            assert repr(tax_round(v, places)) == repr(decimal_tax_round(v, places)), (v, places)
+
+
+def exact_income_tax(parameters, taxable_income, household_shares):
+    # bracket walk on rationals
+    tax = 0
+    thresholds = [Fraction(t) * Fraction(household_shares) for t in parameters.slices_thresholds] + [None]
+    for bucket_n, rate in enumerate(parameters.slices_rates):
+        lower, upper = thresholds[bucket_n], thresholds[bucket_n + 1]
+        if taxable_income > lower:
+            tax += Fraction(str(rate)) * ((taxable_income if upper is None else min(taxable_income, upper)) - lower)
+    return tax
+
+
+def exact_family_quotient_capping(tax_sim):
+    # the text of the FAMILY_QUOTIENT_CAPPING flag, from the exact additional taxes rounded half up to the cent
+    taxable_income = Fraction(tax_sim.state[TaxField.TAXABLE_INCOME], 100)
+    household_shares = tax_sim.state[TaxField.HOUSEHOLD_SHARES]
+    base_shares = 2 if tax_sim.state[TaxField.MARRIED] else 1
+    benefices = exact_income_tax(tax_sim.parameters, taxable_income, base_shares) \
+        - exact_income_tax(tax_sim.parameters, taxable_income, household_shares)
+    additional_taxes = benefices - tax_sim.parameters.family_quotient_benefices_capping * int(
+        (household_shares - base_shares) * 2)
+    cents = div_half_up(additional_taxes.numerator * 100, additional_taxes.denominator)
+    return f"tax += {format_euros(cents, as_float=True)}€"
+
+
+@pytest.mark.parametrize("year,inputs,results,flags",
+                         [pytest.param(t.year, t.inputs, t.results, t.flags) for t in all_tax_tests],
+                         ids=[t.name for t in all_tax_tests])
+def test_fixed_point(year, inputs, results, flags):
+    tax_sim = FixedPointTaxSimulator(year, inputs)
+    for k, res in results.items():
+        if k in NON_MONETARY_FIELDS:
+            assert tax_sim.state[k] == res
+        else:
+            assert tax_sim.state[k] == to_cents(res), k
+            assert tax_sim.euros(k) == res, k
+    reference_flags = TaxSimulator(year, inputs).flags
+    assert tax_sim.flags.keys() == reference_flags.keys()
+    for flag, text in tax_sim.flags.items():
+        if flag == TaxInfoFlag.FAMILY_QUOTIENT_CAPPING:
+            # deliberately not the float text (see test_family_quotient_capping_half_cent): the exact value
+            assert text == exact_family_quotient_capping(tax_sim)
+        else:
+            assert text == reference_flags[flag], flag
+
+
+def test_family_quotient_capping_half_cent():
+    # The additional taxes of this household are exactly 1447.025€: computed on floats, they are 1447.0249999999996,
+    # which TaxSimulator rounds down. The fixed-point simulator rounds the exact value half up.
+    inputs = {
+        TaxField.MARRIED: False,
+        TaxField.NB_CHILDREN: 1,
+        TaxField.SALARY_1_1AJ: 50000,
+    }
+    assert TaxSimulator(2022, inputs).flags[TaxInfoFlag.FAMILY_QUOTIENT_CAPPING] == "tax += 1447.02€"
+    assert FixedPointTaxSimulator(2022, inputs).flags[TaxInfoFlag.FAMILY_QUOTIENT_CAPPING] == "tax += 1447.03€"
+
+
+def test_fixed_point_exact_sums():
+    # with floats, 0.1 + 0.2 != 0.3: in cents, all sums are exact
+    inputs = {
+        TaxField.MARRIED: False,
+        TaxField.NB_CHILDREN: 0,
+        TaxField.SALARY_1_1AJ: 10000,
+        TaxField.CAPITAL_GAIN_3VG: 0.1,
+        TaxField.FIXED_INCOME_INTERESTS_2TR: 0.2,
+    }
+    tax_sim = FixedPointTaxSimulator(2022, inputs)
+    assert tax_sim.state[TaxField.TAXABLE_INVESTMENT_INCOME] + tax_sim.state[TaxField.CAPITAL_GAIN_3VG] == 30
+    assert tax_sim.state[TaxField.REFERENCE_FISCAL_INCOME] == 900030
+    tax_sim.update(CAPITAL_GAIN_3VG=1000.05)
+    assert tax_sim.state[TaxField.CAPITAL_GAIN_TAX] == 12801  # 128.0064€
+    assert tax_sim.euros(TaxField.CAPITAL_GAIN_TAX) == 128.01
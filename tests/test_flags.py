@@ -0,0 +1,63 @@
+import pytest
+from src.easyfrenchtax import TaxField, TaxInfoFlag, TaxSimulator
+from src.easyfrenchtax.fixed_point import FixedPointTaxSimulator
+from src.easyfrenchtax.tax_simulator import FlagValue, Flags, flag_formats
+
+household = {
+    TaxField.MARRIED: True,
+    TaxField.NB_CHILDREN: 1,
+    TaxField.CHILD_1_BIRTHYEAR: 2019,
+    TaxField.SALARY_1_1AJ: 200000,
+    TaxField.SALARY_2_1BJ: 40000,
+    TaxField.CHILDREN_DAYCARE_FEES_7GA: 2500,
+    TaxField.HOME_SERVICES_7DB: 15000,
+    TaxField.CHARITY_DONATION_7UD: 1200,
+}
+
+
+def test_flag_values():
+    tax_sim = TaxSimulator(2022, household)
+    records = tax_sim.flags.records
+    assert records[TaxInfoFlag.MARGINAL_TAX_RATE] == FlagValue(0.41)
+    assert records[TaxInfoFlag.FEE_REBATE_INCOME_1] == FlagValue(12829, 20000, 12829, 7171)
+    assert records[TaxInfoFlag.CHILD_DAYCARE_CREDIT_CAPPING] == FlagValue(2300, 2500, None, 200)
+    assert records[TaxInfoFlag.HOME_SERVICES_CREDIT_CAPPING] == FlagValue(13500, 15000, 13500, 1500)
+    assert records[TaxInfoFlag.CHARITY_75P] == FlagValue(1000, 1200, 1000, 200)
+    # texts are formatted from the records
+    assert tax_sim.flags[TaxInfoFlag.FEE_REBATE_INCOME_1] == "taxable income += 7171€"
+    assert tax_sim.flags[TaxInfoFlag.CHILD_DAYCARE_CREDIT_CAPPING] == "capped to 2300€ (originally 2500€)"
+    assert tax_sim.flags[TaxInfoFlag.HOME_SERVICES_CREDIT_CAPPING] == "capped to 13500€ (originally 15000€)"
+    assert tax_sim.flags[TaxInfoFlag.CHARITY_75P] == "1000€ (capped)"
+    assert dict(tax_sim.flags) == {flag: flag_formats[flag](record) for flag, record in records.items()}
+
+
+def test_flags_mapping():
+    flags = Flags(flag_formats)
+    flags[TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES] = FlagValue(2500.0, 2500.0, 10000, 0)
+    assert flags == {TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES: "2500.0€ (uncapped, 7500.0€ from ceiling)"}
+    flags[TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES] = FlagValue(10000, 12000.5, 10000, 2000.5)
+    assert flags.get(TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES) == "capped to 10'000€ (originally 12000.5€)"
+    assert flags.get(TaxInfoFlag.CHARITY_66P) is None
+    assert flags.pop(TaxInfoFlag.GLOBAL_FISCAL_ADVANTAGES) == "capped to 10'000€ (originally 12000.5€)"
+    assert len(flags) == 0
+
+
+@pytest.mark.parametrize("simulator", [TaxSimulator, FixedPointTaxSimulator])
+def test_without_flags(simulator):
+    tax_sim = simulator(2022, household, flags=False)
+    assert tax_sim.flags == {}
+    assert tax_sim.state == simulator(2022, household).state
+
+
+def test_flag_value_lazy():
+    tax_sim = TaxSimulator(2022, household, lazy=True)
+    assert tax_sim.flag_value(TaxInfoFlag.CHARITY_75P) == FlagValue(1000, 1200, 1000, 200)
+    assert tax_sim.flag_value(TaxInfoFlag.RENTAL_DEFICIT_CARRYOVER) is None
+
+
+def test_fixed_point_flag_values():
+    # same texts, the amounts of the records are in cents
+    tax_sim = FixedPointTaxSimulator(2022, household)
+    assert tax_sim.flags.records[TaxInfoFlag.HOME_SERVICES_CREDIT_CAPPING] == FlagValue(1350000, 1500000, 1350000,
+                                                                                        150000)
+    assert tax_sim.flags == TaxSimulator(2022, household).flags
@@ -0,0 +1,138 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from currency_converter import CurrencyConverter
+
+from src.easyfrenchtax import StockHelper
+from src.easyfrenchtax.fx import FxRateTable
+
+
+@pytest.fixture(scope="module")
+def converter():
+    return CurrencyConverter(fallback_on_wrong_date=True, fallback_on_missing_rate=True)
+
+
+@pytest.fixture(scope="module")
+def rate_table(converter):
+    return FxRateTable.from_converter(converter)
+
+
+def test_same_as_converter(converter, rate_table):
+    # every day of the history (weekends and holidays are interpolated), and dates out of bounds
+    first_date, last_date = converter.bounds["USD"]
+    day = first_date - timedelta(days=10)
+    while day <= last_date + timedelta(days=10):
+        assert rate_table.convert(100, "USD", "EUR", date=day) == converter.convert(100, "USD", "EUR", date=day)
+        assert rate_table.convert(100, "EUR", "JPY", date=day) == converter.convert(100, "EUR", "JPY", date=day)
+        day += timedelta(days=1)
+    # currencies with a shorter history
+    for currency in ["BGN", "CYP", "ISK", "TRL"]:
+        for day in [date(1998, 1, 1), date(2005, 3, 5), date(2008, 12, 25), date(2030, 1, 1)]:
+            assert rate_table.convert(10, currency, "GBP", date=day) == converter.convert(10, currency, "GBP", date=day)
+    assert rate_table.convert(10, "USD") == converter.convert(10, "USD")
+    assert rate_table.convert(10, "EUR", "USD") == converter.convert(10, "EUR", "USD")
+    assert rate_table.convert(10, "USD", date=datetime(2020, 5, 3, 12)) == converter.convert(10, "USD", date=datetime(2020, 5, 3, 12))
+    assert rate_table.currencies == converter.currencies
+
+
+def test_convert_many(converter, rate_table):
+    dates = [date(2018, 6, 29), date(2018, 6, 30), date(1990, 1, 1), date(2021, 3, 28), date(2040, 1, 1)]
+    amounts = [20, 18.5, 1, 0, 37.25]
+    assert rate_table.convert_many(amounts, "USD", dates) == [converter.convert(a, "USD", date=d)
+                                                              for a, d in zip(amounts, dates)]
+    assert rate_table.convert_many(amounts, "USD", dates, "CHF") == [converter.convert(a, "USD", "CHF", date=d)
+                                                                     for a, d in zip(amounts, dates)]
+    assert rate_table.convert_many(amounts, "EUR", dates) == [float(a) for a in amounts]
+    assert rate_table.convert_many([], "USD", []) == []
+
+
+def test_errors(rate_table):
+    with pytest.raises(Exception, match="XYZ is not a supported currency"):
+        rate_table.convert(10, "XYZ", date=date(2020, 1, 1))
+    with pytest.raises(Exception, match="XYZ is not a supported currency"):
+        rate_table.convert_many([10], "USD", [date(2020, 1, 1)], "XYZ")
+
+
+def test_without_fallbacks():
+    converter = CurrencyConverter()
+    rate_table = FxRateTable.from_converter(converter)
+    # a week-end: no rate
+    with pytest.raises(Exception, match="USD has no rate for 2021-08-01"):
+        rate_table.convert(10, "USD", date=date(2021, 8, 1))
+    with pytest.raises(Exception, match="USD has no rate for 2021-08-01"):
+        rate_table.convert_many([10, 10], "USD", [date(2021, 7, 30), date(2021, 8, 1)])
+    with pytest.raises(Exception, match="not in USD bounds"):
+        rate_table.convert(10, "USD", date=date(1990, 1, 1))
+    assert rate_table.convert(10, "USD", date=date(2021, 7, 30)) == converter.convert(10, "USD", date=date(2021, 7, 30))
+
+
+def test_stock_helper_rate_table(converter):
+    from src.easyfrenchtax import stock_helper
+    assert stock_helper.get_rate_table() is stock_helper.get_rate_table()
+    helper = StockHelper()
+    helper.add_espp("BUD", 200, date(2019, 1, 13), 22, "USD")  # a sunday
+    assert helper.converter is stock_helper.get_rate_table()
+    assert helper.espp_stocks["BUD"][0].acq_price_eur == converter.convert(22, "USD", date=date(2019, 1, 13))
+
+
+def test_snapshot(tmp_path, converter, rate_table):
+    path = tmp_path / "rates.bin"
+    rate_table.save(str(path))
+    snapshot = FxRateTable.load(str(path))
+    assert snapshot.currencies == rate_table.currencies
+    assert snapshot.first_days == rate_table.first_days
+    assert all(list(snapshot.rates[c]) == list(rate_table.rates[c]) for c in rate_table.rates)
+    dates = [date(1990, 1, 1), date(2016, 2, 29), date(2019, 1, 13), date(2030, 1, 1)]
+    for day in dates:
+        assert snapshot.convert(100, "USD", date=day) == converter.convert(100, "USD", date=day)
+    assert snapshot.convert_many([1, 2, 3, 4], "GBP", dates, "JPY") == rate_table.convert_many([1, 2, 3, 4], "GBP",
+                                                                                               dates, "JPY")
+    # missing rates stay missing
+    FxRateTable.from_converter(CurrencyConverter()).save(str(path))
+    with pytest.raises(Exception, match="USD has no rate for 2021-08-01"):
+        FxRateTable.load(str(path)).convert(10, "USD", date=date(2021, 8, 1))
+
+
+def test_snapshot_replaced(tmp_path, rate_table):
+    path = tmp_path / "rates.bin"
+    FxRateTable({"USD": date(2020, 1, 1).toordinal()}, {"USD": [2.0, 4.0]}).save(str(path))
+    old = FxRateTable.load(str(path))
+    rate_table.save(str(path))
+    # the table mapped before keeps the previous file
+    assert old.convert(10, "USD", date=date(2020, 1, 2)) == 2.5
+    assert FxRateTable.load(str(path)).convert(10, "USD", date=date(2020, 1, 2)) == rate_table.convert(
+        10, "USD", date=date(2020, 1, 2))
+    assert [p.name for p in tmp_path.iterdir()] == ["rates.bin"]
+
+
+def test_invalid_snapshot(tmp_path):
+    path = tmp_path / "rates.bin"
+    path.write_bytes(b"not a snapshot of rates")
+    with pytest.raises(Exception, match="is not a rate snapshot"):
+        FxRateTable.load(str(path))
+
+
+def test_snapshot_tool(tmp_path, converter):
+    from src.easyfrenchtax.fx import main
+    path = tmp_path / "rates.bin"
+    main([str(path)])
+    snapshot = FxRateTable.load(str(path))
+    assert snapshot.convert(100, "USD", date=date(2019, 1, 13)) == converter.convert(100, "USD", date=date(2019, 1, 13))
+
+
+def test_stock_helper_snapshot(tmp_path, monkeypatch):
+    from src.easyfrenchtax import stock_helper
+    path = tmp_path / "rates.bin"
+    FxRateTable({"USD": date(2020, 1, 1).toordinal()}, {"USD": [2.0]}).save(str(path))
+    monkeypatch.setenv(stock_helper.RATES_FILE_ENV, str(path))
+    monkeypatch.setattr(stock_helper, "_rate_table", None)
+    monkeypatch.setattr(stock_helper, "_rate_file_id", None)
+    helper = StockHelper()
+    helper.add_espp("BUD", 200, date(2019, 1, 13), 22, "USD")
+    assert helper.espp_stocks["BUD"][0].acq_price_eur == 11
+    assert stock_helper.get_rate_table() is helper.converter
+    # a new snapshot: used by the new StockHelpers
+    FxRateTable({"USD": date(2020, 1, 1).toordinal()}, {"USD": [4.0]}).save(str(path))
+    helper = StockHelper()
+    helper.add_espp("BUD", 200, date(2019, 1, 13), 22, "USD")
+    assert helper.espp_stocks["BUD"][0].acq_price_eur == 5.5
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+from pathlib import Path
+
+# Importing the package to simulate taxes must stay fast: it must not load the stock helper and its currency converter
+# (which parses the whole history of the ECB rates)
+IMPORT_TIME_BUDGET = 0.5  # seconds, far above the actual time, for slow machines
+
+script = """
+import sys, time
+start = time.perf_counter()
+from src.easyfrenchtax import TaxField, TaxSimulator
+TaxSimulator(2022, {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 30000})
+print(time.perf_counter() - start)
+print(",".join(m for m in ["currency_converter", "dateutil", "src.easyfrenchtax.stock_helper"] if m in sys.modules))
+"""
+
+
+def test_import_time():
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).resolve().parent.parent).stdout.split("\n")
+    assert output[1] == ""
+    assert float(output[0]) < IMPORT_TIME_BUDGET
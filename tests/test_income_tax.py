@@ -1,5 +1,8 @@
+import random
+
 import pytest
 from src.easyfrenchtax import TaxInfoFlag, TaxField
+from src.easyfrenchtax.tax_simulator import income_tax_scales, year_tax_parameters
 from .common import TaxTest, tax_testing
 
 # NOTE: all tests value have been checked against the official french tax simulator:
@@ -144,6 +147,33 @@ def test_tax(year, inputs, results, flags):
     tax_testing(year, inputs, results, flags)
 
 
+def bracket_walk_income_tax(parameters, taxable_income, household_shares):
+    # straightforward walk through the tax brackets, as a reference for the compiled income tax scales
+    thresholds = [t * household_shares for t in parameters.slices_thresholds]
+    tax = 0
+    marginal_tax_rate = 0
+    for bucket_n in range(len(thresholds)):
+        if taxable_income <= thresholds[bucket_n]:
+            break
+        upper = thresholds[bucket_n + 1] if bucket_n + 1 < len(thresholds) else taxable_income
+        tax += parameters.slices_rates[bucket_n] * min(upper - thresholds[bucket_n], taxable_income - thresholds[bucket_n])
+        marginal_tax_rate = parameters.slices_rates[bucket_n]
+    return tax, marginal_tax_rate
+
+
+@pytest.mark.parametrize("year", list(year_tax_parameters))
+def test_income_tax_scale(year):
+    rng = random.Random(year)
+    scale = income_tax_scales[year]
+    parameters = year_tax_parameters[year]
+    for household_shares in [1, 1.5, 2, 2.5, 3, 4, 5, 6]:
+        incomes = [rng.uniform(-1000, 600000) for _ in range(500)]
+        incomes += [t * household_shares + delta for t in parameters.slices_thresholds for delta in (-0.01, 0, 0.01)]
+        for taxable_income in incomes:
+            assert scale.income_tax(taxable_income, household_shares) == \
+                   bracket_walk_income_tax(parameters, taxable_income, household_shares)
+
+
 # ----- Useful for TDD phases, to isolate tests and debug -----
 # tax_tests_debug = [
 # ]
@@ -0,0 +1,163 @@
+from collections import defaultdict
+
+import pytest
+from src.easyfrenchtax import TaxField, TaxSimulator
+from src.easyfrenchtax.tax_simulator import stages
+from .test_capital_tax import tax_tests as capital_tax_tests
+from .test_fiscal_advantages import tax_tests as fiscal_advantages_tests
+from .test_income_tax import tax_tests as income_tax_tests
+from .test_rental_tax import tax_tests as rental_tax_tests
+
+all_tax_tests = capital_tax_tests + fiscal_advantages_tests + income_tax_tests + rental_tax_tests
+
+
+class RecordingState(defaultdict):
+    # state recording which fields are read (value or presence) and which ones only got a default value
+    def __init__(self, state):
+        super().__init__(int, state)
+        self.reads = set()
+        self.defaulted = set()
+
+    def __getitem__(self, field):
+        self.reads.add(field)
+        return super().__getitem__(field)
+
+    def __contains__(self, field):
+        self.reads.add(field)
+        return super().__contains__(field)
+
+    def __missing__(self, field):
+        self.defaulted.add(field)
+        return super().__missing__(field)
+
+
+def assert_same_simulation(tax_sim, reference):
+    for field in TaxField:
+        assert tax_sim.state[field] == reference.state[field], field
+    assert tax_sim.flags == reference.flags
+
+
+@pytest.mark.parametrize("year,inputs",
+                         [pytest.param(t.year, t.inputs) for t in all_tax_tests],
+                         ids=[t.name for t in all_tax_tests])
+def test_stage_declarations(year, inputs):
+    tax_sim = TaxSimulator(year, inputs)
+    tax_sim.state = defaultdict(int, inputs)
+    tax_sim.state[TaxField.YEAR] = year
+    tax_sim.flags = {}
+    for stage in stages:
+        before = dict(tax_sim.state)
+        flags_before = dict(tax_sim.flags)
+        tax_sim.state = RecordingState(tax_sim.state)
+        getattr(tax_sim, stage.method)()
+        # (a stage may read back what it just wrote)
+        assert tax_sim.state.reads <= stage.reads | stage.writes, stage.method
+        writes = {f for f, v in tax_sim.state.items() if f not in tax_sim.state.defaulted and before.get(f) != v}
+        assert writes <= stage.writes, stage.method
+        assert {f for f, v in tax_sim.flags.items() if flags_before.get(f) != v} <= stage.flags, stage.method
+
+
+@pytest.mark.parametrize("changes", [
+    {TaxField.CHARITY_DONATION_7UF: 500},
+    {TaxField.CHARITY_DONATION_7UD: 1500},
+    {TaxField.PER_TRANSFERS_1_6NS: 3000},
+    {TaxField.SALARY_1_1AJ: 45000},
+    {TaxField.FIXED_INCOME_INTERESTS_2TR: 1000},
+    {TaxField.SME_CAPITAL_SUBSCRIPTION_7CH: 20000, TaxField.HOME_SERVICES_7DB: 4000},
+], ids=["7UF", "7UD", "6NS", "1AJ", "2TR", "7CH_7DB"])
+def test_update(changes):
+    for t in all_tax_tests:
+        tax_sim = TaxSimulator(t.year, t.inputs)
+        tax_sim.update(changes)
+        assert_same_simulation(tax_sim, TaxSimulator(t.year, {**t.inputs, **changes}))
+
+
+def test_update_recomputes_downstream_only():
+    tax_sim = TaxSimulator(2022, {
+        TaxField.MARRIED: True,
+        TaxField.NB_CHILDREN: 0,
+        TaxField.SALARY_1_1AJ: 30000,
+        TaxField.SALARY_2_1BJ: 40000,
+    })
+    assert tax_sim.update(CHARITY_DONATION_7UF=500) == ["compute_tax_reductions", "compute_net_taxes"]
+    assert tax_sim.update(PER_TRANSFERS_1_6NS=4000) == ["compute_taxable_income", "compute_tax_before_reductions",
+                                                        "compute_tax_reductions", "compute_net_taxes"]
+    # same value again: nothing downstream changes
+    assert tax_sim.update(PER_TRANSFERS_1_6NS=4000) == ["compute_taxable_income"]
+
+
+def test_update_remove_input():
+    inputs = {
+        TaxField.MARRIED: True,
+        TaxField.NB_CHILDREN: 2,
+        TaxField.CHILD_1_BIRTHYEAR: 2020,
+        TaxField.CHILD_2_BIRTHYEAR: 2018,
+        TaxField.SALARY_1_1AJ: 10000,
+        TaxField.SALARY_2_1BJ: 10000,
+        TaxField.CHILDREN_DAYCARE_FEES_7GA: 2500,
+        TaxField.CHILDREN_DAYCARE_FEES_7GB: 2000,
+    }
+    tax_sim = TaxSimulator(2021, inputs)
+    tax_sim.update(CHILDREN_DAYCARE_FEES_7GB=None, CHILD_2_BIRTHYEAR=2010)
+    del inputs[TaxField.CHILDREN_DAYCARE_FEES_7GB]
+    assert_same_simulation(tax_sim, TaxSimulator(2021, {**inputs, TaxField.CHILD_2_BIRTHYEAR: 2010}))
+
+
+def test_update_after_read():
+    # reading an absent input (which stores a 0 in the state) does not declare it
+    inputs = {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 50000}
+    tax_sim = TaxSimulator(2022, inputs)
+    assert tax_sim.state[TaxField.CHILDREN_DAYCARE_FEES_7GA] == 0
+    assert tax_sim.state[TaxField.CHILD_1_BIRTHYEAR] == 0
+    tax_sim.update({TaxField.HOME_SERVICES_7DB: 1000})
+    assert tax_sim.state[TaxField.NET_TAXES] == 6922
+    assert_same_simulation(tax_sim, TaxSimulator(2022, {**inputs, TaxField.HOME_SERVICES_7DB: 1000}))
+
+
+def test_update_year():
+    tax_sim = TaxSimulator(2022, {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0})
+    with pytest.raises(Exception, match="The statement year cannot be updated"):
+        tax_sim.update(YEAR=2023)
+
+
+@pytest.mark.parametrize("year,inputs",
+                         [pytest.param(t.year, t.inputs) for t in all_tax_tests],
+                         ids=[t.name for t in all_tax_tests])
+def test_lazy(year, inputs):
+    reference = TaxSimulator(year, inputs)
+    for field in TaxField:
+        assert TaxSimulator(year, inputs, lazy=True)[field] == reference.state[field], field
+    for flag in reference.flags:
+        assert TaxSimulator(year, inputs, lazy=True).flag(flag) == reference.flags[flag], flag
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_lazy_read_absent_input(compact):
+    inputs = {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 50000}
+    tax_sim = TaxSimulator(2022, inputs, lazy=True, compact=compact)
+    assert tax_sim[TaxField.CHILDREN_DAYCARE_FEES_7GA] == 0
+    assert TaxField.CHILDREN_DAYCARE_FEES_7GA not in tax_sim.state
+    assert tax_sim[TaxField.NET_TAXES] == TaxSimulator(2022, inputs).state[TaxField.NET_TAXES]
+
+
+def test_lazy_runs_required_stages_only():
+    tax_sim = TaxSimulator(2022, {
+        TaxField.MARRIED: True,
+        TaxField.NB_CHILDREN: 1,
+        TaxField.SALARY_1_1AJ: 30000,
+        TaxField.SALARY_2_1BJ: 40000,
+        TaxField.CAPITAL_GAIN_3VG: 2000,
+        TaxField.CHARITY_DONATION_7UF: 500,
+    }, lazy=True)
+    assert not tax_sim.computed_stages
+    assert tax_sim[TaxField.NET_SOCIAL_TAXES] == 344
+    assert tax_sim.computed_stages == {"compute_rental_income", "compute_furnished_rentals", "compute_flat_rate_taxes",
+                                       "compute_social_taxes"}
+    assert tax_sim[TaxField.REFERENCE_FISCAL_INCOME] == 65000
+    assert "compute_tax_reductions" not in tax_sim.computed_stages
+    assert tax_sim.flags == {}
+    # updates invalidate the stages depending on the change, which are run again on demand
+    tax_sim.update(CAPITAL_GAIN_3VG=3000)
+    assert "compute_social_taxes" not in tax_sim.computed_stages
+    assert tax_sim[TaxField.NET_SOCIAL_TAXES] == 516
+    assert tax_sim[TaxField.REFERENCE_FISCAL_INCOME] == 66000
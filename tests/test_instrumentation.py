@@ -0,0 +1,64 @@
+import pytest
+from src.easyfrenchtax import TaxField, TaxSimulator, tax_simulator
+from src.easyfrenchtax.fixed_point import FixedPointTaxSimulator
+from src.easyfrenchtax.instrumentation import Registry, disable, enable, enabled, instrumented
+from src.easyfrenchtax.tax_simulator import stages
+from .test_incremental import all_tax_tests, assert_same_simulation
+
+household = {
+    TaxField.MARRIED: True,
+    TaxField.NB_CHILDREN: 2,
+    TaxField.SALARY_1_1AJ: 50000,
+    TaxField.SALARY_2_1BJ: 40000,
+}
+
+
+def test_instrumentation():
+    original_net_income = TaxSimulator.compute_net_income
+    original_tax_round = tax_simulator.tax_round
+    stats = Registry()
+    with instrumented(stats):
+        assert enabled()
+        for t in all_tax_tests:
+            assert_same_simulation(TaxSimulator(t.year, t.inputs), TaxSimulator(t.year, t.inputs))
+    assert not enabled()
+    assert TaxSimulator.compute_net_income is original_net_income
+    assert tax_simulator.tax_round is original_tax_round
+    dump = stats.dump()
+    for stage in stages:
+        assert dump[stage.method]["calls"] == 2 * len(all_tax_tests)
+        assert dump[stage.method]["seconds"] > 0
+    assert dump["tax_round"]["calls"] >= 2 * 6 * len(all_tax_tests)
+
+
+def test_instrumentation_subclass_and_lazy():
+    stats = Registry()
+    with instrumented(stats):
+        FixedPointTaxSimulator(2022, household)
+        TaxSimulator(2022, household, lazy=True)[TaxField.TAXABLE_INCOME]
+    assert stats.calls["compute_net_income"] == 2
+    assert stats.calls["compute_net_taxes"] == 1
+    assert stats.calls["tax_round"] == 2  # the fixed point simulator doesn't round floats
+
+
+def test_instrumentation_prometheus():
+    stats = Registry()
+    with instrumented(stats):
+        TaxSimulator(2022, household)
+        TaxSimulator(2022, household)
+    text = stats.prometheus()
+    assert "# TYPE easyfrenchtax_calls_total counter\n" in text
+    assert 'easyfrenchtax_calls_total{name="compute_tax_credits"} 2\n' in text
+    assert f'easyfrenchtax_seconds_total{{name="compute_tax_credits"}} {stats.seconds["compute_tax_credits"]!r}\n' \
+           in text
+    stats.reset()
+    assert stats.dump() == {}
+
+
+def test_instrumentation_enable_twice():
+    enable(Registry())
+    try:
+        with pytest.raises(Exception, match="already enabled"):
+            enable()
+    finally:
+        disable()
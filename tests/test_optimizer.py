@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from src.easyfrenchtax import TaxField, TaxSimulator
+from src.easyfrenchtax.batch_simulator import BatchTaxSimulator
+from src.easyfrenchtax.optimizer import optimize_deductions
+
+instruments = [TaxField.PER_TRANSFERS_1_6NS, TaxField.CHARITY_DONATION_7UD, TaxField.SME_CAPITAL_SUBSCRIPTION_7CH]
+
+households = [
+    {TaxField.MARRIED: True, TaxField.NB_CHILDREN: 2, TaxField.SALARY_1_1AJ: 60000, TaxField.SALARY_2_1BJ: 40000},
+    {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 90000},
+    {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 30000},
+    {TaxField.MARRIED: True, TaxField.NB_CHILDREN: 1, TaxField.SALARY_1_1AJ: 250000, TaxField.HOME_SERVICES_7DB: 10000},
+    {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 45000,
+     TaxField.CHARITY_DONATION_7UD: 500},
+]
+
+
+def grid_search(year, inputs, budget, steps):
+    # the amounts of the optimizer are whole euros: so are the ones of the grid
+    amounts = np.unique(np.round(np.linspace(0, budget, steps + 1)).astype(int))
+    per, donation, subscription = (a.ravel() for a in np.meshgrid(amounts, amounts, amounts, indexing="ij"))
+    within_budget = per + donation + subscription <= budget
+    columns = dict(inputs)
+    for field, allocated in zip(instruments, [per, donation, subscription]):
+        columns[field] = allocated[within_budget] + inputs.get(field, 0)
+    return BatchTaxSimulator(year, columns).state[TaxField.NET_TAXES].min()
+
+
+def random_household(rng):
+    married = bool(rng.integers(2))
+    household = {TaxField.MARRIED: married, TaxField.NB_CHILDREN: int(rng.integers(4)),
+                 TaxField.SALARY_1_1AJ: int(rng.integers(0, 300000))}
+    if married:
+        household[TaxField.SALARY_2_1BJ] = int(rng.integers(0, 150000))
+    optional = [(TaxField.CHARITY_DONATION_7UD, 3000), (TaxField.HOME_SERVICES_7DB, 12000),
+                (TaxField.SME_CAPITAL_SUBSCRIPTION_7CH, 30000), (TaxField.PER_TRANSFERS_1_6NS, 10000)]
+    for field, high in optional:
+        if rng.random() < 0.25:
+            household[field] = int(rng.integers(0, high))
+    return household
+
+
+@pytest.mark.parametrize("inputs", households)
+@pytest.mark.parametrize("budget", [2000, 10000, 40000])
+def test_optimize_deductions(inputs, budget):
+    allocation = optimize_deductions(2022, inputs, budget)
+    assert allocation.spent == sum(allocation.changes.values()) <= budget
+    assert set(allocation.changes) <= set(instruments)
+    applied = {**inputs, **{f: inputs.get(f, 0) + v for f, v in allocation.changes.items()}}
+    assert TaxSimulator(2022, applied).state[TaxField.NET_TAXES] == allocation.net_taxes
+    # at least as good as a grid search over tens of thousands of allocations, with a few hundreds
+    assert allocation.net_taxes <= grid_search(2022, inputs, budget, 60)
+    assert allocation.candidates < 2000
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_optimize_deductions_random(seed):
+    rng = np.random.default_rng(seed)
+    inputs = random_household(rng)
+    budget = int(rng.integers(100, 80000))
+    allocation = optimize_deductions(2022, inputs, budget)
+    assert allocation.spent <= budget
+    assert allocation.net_taxes <= grid_search(2022, inputs, budget, 60)
+
+
+def test_optimize_deductions_per_and_donation_cap():
+    # the donation cap (20% of the taxable income) shrinks as the PER transfer grows: the best split puts both at the
+    # cap, 150'000 - 12'829 of fees = 137'171 of taxable income, PER + 1'000 + 20% * (137'171 - PER) = budget
+    single = {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 150000}
+    allocation = optimize_deductions(2022, single, 50000)
+    assert allocation.changes == {TaxField.PER_TRANSFERS_1_6NS: 26958, TaxField.CHARITY_DONATION_7UD: 23042}
+    assert allocation.net_taxes == pytest.approx(15611.28)
+    allocation = optimize_deductions(2022, single, 30000)
+    assert allocation.changes == {TaxField.PER_TRANSFERS_1_6NS: 1958, TaxField.CHARITY_DONATION_7UD: 28042}
+    assert allocation.net_taxes == pytest.approx(22561.28)
+
+
+def test_optimize_deductions_caps():
+    # PER transfers down to the 30% bracket, then donations up to the 20% cap, SME subscriptions for the rest
+    allocation = optimize_deductions(2022, households[1], 40000)
+    assert allocation.changes == {
+        TaxField.PER_TRANSFERS_1_6NS: 6455,
+        TaxField.CHARITY_DONATION_7UD: 15909,
+        TaxField.SME_CAPITAL_SUBSCRIPTION_7CH: 17636,
+    }
+    # no need to spend the whole budget once there are no taxes left
+    allocation = optimize_deductions(2022, households[2], 10000)
+    assert allocation.net_taxes == 0
+    assert allocation.spent < 10000
@@ -0,0 +1,65 @@
+import tracemalloc
+from itertools import islice
+
+import pytest
+from src.easyfrenchtax import TaxField, TaxInfoFlag, TaxSimulator
+from src.easyfrenchtax.pipeline import simulate_stream
+from .test_incremental import all_tax_tests
+
+fields = [TaxField.NET_TAXES, TaxField.NET_SOCIAL_TAXES, TaxField.REFERENCE_FISCAL_INCOME]
+flags = [TaxInfoFlag.MARGINAL_TAX_RATE, TaxInfoFlag.FAMILY_QUOTIENT_CAPPING]
+
+
+def households(n, consumed=None):
+    for i in range(n):
+        if consumed is not None:
+            consumed.append(i)
+        yield {TaxField.YEAR: 2022, TaxField.MARRIED: i % 2 == 0, TaxField.NB_CHILDREN: i % 3,
+               TaxField.SALARY_1_1AJ: 20000 + 37 * i, TaxField.CAPITAL_GAIN_3VG: i % 1000}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_simulate_stream(workers):
+    inputs = [{TaxField.YEAR: t.year, **t.inputs} for t in all_tax_tests]
+    results = list(simulate_stream(iter(inputs), fields, flags, workers=workers, chunk_size=4))
+    assert len(results) == len(all_tax_tests)
+    for t, result in zip(all_tax_tests, results):
+        tax_sim = TaxSimulator(t.year, t.inputs)
+        assert result.error is None
+        assert result.net_taxes == tax_sim.state[TaxField.NET_TAXES]
+        assert result.net_social_taxes == tax_sim.state[TaxField.NET_SOCIAL_TAXES]
+        assert result.reference_fiscal_income == tax_sim.state[TaxField.REFERENCE_FISCAL_INCOME]
+        assert result.MARGINAL_TAX_RATE == tax_sim.flags[TaxInfoFlag.MARGINAL_TAX_RATE]
+        assert result.FAMILY_QUOTIENT_CAPPING == tax_sim.flags.get(TaxInfoFlag.FAMILY_QUOTIENT_CAPPING)
+
+
+def test_simulate_stream_error():
+    results = list(simulate_stream([
+        {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 10000},
+        {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.RENTAL_INCOME_GLOBAL_DEFICIT_4BC: 20000},
+    ], [TaxField.NET_TAXES], default_year=2022))
+    assert results[0].error is None
+    assert (results[1].net_taxes, results[1].error) == (None, "Rental deficit for global deduction (4BC) cannot "
+                                                              "exceed 10'700€")
+
+
+def test_simulate_stream_bounded_input():
+    # the input is consumed as results are: at most 2 chunks per worker in flight (plus the chunk being built)
+    consumed = []
+    stream = simulate_stream(households(100000, consumed), fields, workers=2, chunk_size=10)
+    assert len(list(islice(stream, 5))) == 5
+    assert len(consumed) <= 2 * 2 * 10 + 10
+    stream.close()
+
+
+def test_simulate_stream_flat_memory():
+    def peak(n):
+        tracemalloc.start()
+        for _ in simulate_stream(households(n), fields, flags):
+            pass
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak_memory
+
+    # retaining 5000 simulations would take about 10MB
+    assert peak(5000) < 1_000_000
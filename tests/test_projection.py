@@ -0,0 +1,88 @@
+import pytest
+from src.easyfrenchtax import TaxField, TaxInfoFlag, TaxSimulator
+from src.easyfrenchtax.projection import RentalDeficit, TaxProjection
+
+household = {
+    TaxField.MARRIED: True,
+    TaxField.NB_CHILDREN: 0,
+    TaxField.SALARY_1_1AJ: 50000,
+    TaxField.SALARY_2_1BJ: 40000,
+}
+
+
+def hand_chained(yearly_inputs):
+    simulations = {}
+    carryover = 0
+    for year, inputs in sorted(yearly_inputs.items()):
+        inputs = dict(inputs)
+        if carryover:
+            inputs[TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD] = carryover
+        simulations[year] = TaxSimulator(year, inputs)
+        carryover = simulations[year].state.get(TaxField.RENTAL_DEFICIT_CARRYOVER, 0)
+    return simulations
+
+
+yearly_inputs = {
+    2021: {**household, TaxField.RENTAL_INCOME_GLOBAL_DEFICIT_4BC: 10700, TaxField.REAL_RENTAL_INCOME_DEFICIT_4BB: 6000},
+    2022: {**household, TaxField.REAL_RENTAL_PROFIT_4BA: 2500},
+    2023: {**household, TaxField.REAL_RENTAL_INCOME_DEFICIT_4BB: 3000},
+    2024: {**household, TaxField.REAL_RENTAL_PROFIT_4BA: 4000},
+    2025: {**household, TaxField.REAL_RENTAL_PROFIT_4BA: 4000},
+}
+
+
+def test_projection_chaining():
+    projection = TaxProjection(yearly_inputs)
+    reference = hand_chained(yearly_inputs)
+    for year in yearly_inputs:
+        assert projection.simulations[year].state == reference[year].state
+        assert projection.simulations[year].flags == reference[year].flags
+    assert projection.field(TaxField.RENTAL_DEFICIT_CARRYOVER) == {2021: 6000, 2022: 3500, 2023: 6500, 2024: 2500,
+                                                                   2025: 0}
+    # oldest deficits are consumed first
+    assert projection.remaining[2023] == [RentalDeficit(2021, 3500), RentalDeficit(2023, 3000)]
+    assert projection.remaining[2024] == [RentalDeficit(2023, 2500)]
+    assert projection.flags(TaxInfoFlag.RENTAL_DEFICIT_CARRYOVER) == {2021: "6000€", 2022: "3500€", 2023: "6500€",
+                                                                      2024: "2500€", 2025: None}
+
+
+def test_projection_expiry():
+    inputs = {year: {**household, TaxField.REAL_RENTAL_PROFIT_4BA: 1000} for year in range(2022, 2034)}
+    inputs[2022] = {**household, TaxField.REAL_RENTAL_INCOME_DEFICIT_4BB: 15000}
+    inputs[2025] = {**household, TaxField.REAL_RENTAL_INCOME_DEFICIT_4BB: 500}
+    projection = TaxProjection(inputs, previous_deficits=[RentalDeficit(2013, 2000), RentalDeficit(2020, 400)])
+    # the deficit of 2013 could be used until 2023, but there was no rental profit before
+    assert projection.expired[2024] == [RentalDeficit(2013, 1000)]
+    assert projection.deficits[2024] == [RentalDeficit(2020, 400), RentalDeficit(2022, 15000)]
+    # deficit of 2022: 15000, minus the 600 of 2024 (after the 400 of 2020) and 1000 each year from 2026 to 2032
+    assert projection.expired[2033] == [RentalDeficit(2022, 7400)]
+    assert projection.deficits[2033] == [RentalDeficit(2025, 500)]
+    assert projection.simulations[2033].state[TaxField.RENTAL_INCOME_RESULT] == 500
+    # after expiry, the 4BD declared is what is left
+    assert projection.simulations[2033].state[TaxField.PREVIOUS_RENTAL_INCOME_DEFICIT_4BD] == 500
+
+
+def test_projection_update():
+    projection = TaxProjection(yearly_inputs)
+    # only the years receiving a different deficit are updated
+    assert projection.update(2024, REAL_RENTAL_PROFIT_4BA=5000) == [2024, 2025]
+    assert projection.update(2025, SALARY_1_1AJ=60000) == [2025]
+    assert projection.update(2021, REAL_RENTAL_INCOME_DEFICIT_4BB=8000) == [2021, 2022, 2023, 2024, 2025]
+    updated_inputs = {year: dict(inputs) for year, inputs in yearly_inputs.items()}
+    updated_inputs[2024][TaxField.REAL_RENTAL_PROFIT_4BA] = 5000
+    updated_inputs[2025][TaxField.SALARY_1_1AJ] = 60000
+    updated_inputs[2021][TaxField.REAL_RENTAL_INCOME_DEFICIT_4BB] = 8000
+    reference = hand_chained(updated_inputs)
+    for year in yearly_inputs:
+        assert projection.simulations[year].state == reference[year].state
+        assert projection.simulations[year].flags == reference[year].flags
+    # a change that is absorbed before the end of the projection stops there
+    assert projection.update(2022, SALARY_2_1BJ=45000) == [2022]
+
+
+def test_projection_errors():
+    with pytest.raises(Exception, match="The years of a projection must be consecutive"):
+        TaxProjection({2021: household, 2023: household})
+    projection = TaxProjection(yearly_inputs)
+    with pytest.raises(Exception, match="Previous rental deficits"):
+        projection.update(2022, PREVIOUS_RENTAL_INCOME_DEFICIT_4BD=1000)
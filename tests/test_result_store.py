@@ -0,0 +1,85 @@
+import pickle
+import sqlite3
+
+import pytest
+from src.easyfrenchtax import TaxField, TaxSimulator, tax_simulator
+from src.easyfrenchtax.batch_runner import run_batch
+from src.easyfrenchtax.fixed_point import FixedPointTaxSimulator
+from src.easyfrenchtax.result_store import ResultStore, result_key
+from .test_incremental import all_tax_tests
+
+household = {
+    TaxField.MARRIED: True,
+    TaxField.NB_CHILDREN: 2,
+    TaxField.SALARY_1_1AJ: 50000,
+    TaxField.SALARY_2_1BJ: 40000,
+    TaxField.CHARITY_DONATION_7UD: 500,
+    TaxField.FIXED_INCOME_INTERESTS_2TR: 150.5,
+}
+
+
+def test_store(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    for t in all_tax_tests:
+        reference = TaxSimulator(t.year, t.inputs)
+        for _ in range(2):
+            stored = store.simulate(t.year, t.inputs)
+            assert stored.state == reference.state
+            assert stored.flags == reference.flags
+            assert stored.flags.records == reference.flags.records
+    assert (store.hits, store.misses) == (len(all_tax_tests), len(all_tax_tests))
+    assert len(store) == len(all_tax_tests)
+    # values keep their type
+    stored = store.get(2022, household)
+    assert stored is None
+    store.simulate(2022, household)
+    stored = store.get(2022, household)
+    assert type(stored.state[TaxField.SALARY_1_1AJ]) is int
+    assert type(stored.state[TaxField.FIXED_INCOME_INTERESTS_2TR]) is float
+    assert stored.state[TaxField.MARRIED] is True
+    store.clear()
+    assert len(store) == 0
+    store.close()
+
+
+def test_store_persistence_and_wal(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = ResultStore(path)
+    store.simulate(2022, household)
+    store.close()
+    reopened = ResultStore(path)
+    assert reopened.get(2022, household) is not None
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    copy = pickle.loads(pickle.dumps(reopened))
+    assert copy.get(2022, household) is not None
+
+
+def test_result_key(monkeypatch):
+    key = result_key(TaxSimulator, 2022, household)
+    assert result_key(TaxSimulator, 2022, dict(reversed(list(household.items())))) == key
+    assert result_key(TaxSimulator, 2022, {**household, TaxField.SALARY_1_1AJ: 50000.0}) != key
+    assert result_key(TaxSimulator, 2023, household) != key
+    assert result_key(FixedPointTaxSimulator, 2022, household) != key
+    monkeypatch.setattr("src.easyfrenchtax.result_store.RULES_VERSION", tax_simulator.RULES_VERSION + 1)
+    assert result_key(TaxSimulator, 2022, household) != key
+
+
+def test_store_invalidation(tmp_path, monkeypatch):
+    store = ResultStore(str(tmp_path / "results.db"))
+    store.simulate(2022, household)
+    parameters = tax_simulator.year_tax_parameters[2022]
+    monkeypatch.setitem(tax_simulator.year_tax_parameters, 2022, parameters._replace(fees_10p_deduction_floor=500))
+    assert store.get(2022, household) is None
+    monkeypatch.setitem(tax_simulator.year_tax_parameters, 2022, parameters)
+    assert store.get(2022, household) is not None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch_with_store(tmp_path, workers):
+    store = ResultStore(str(tmp_path / "results.db"))
+    households = [{TaxField.YEAR: t.year, **t.inputs} for t in all_tax_tests]
+    expected = list(run_batch(households, workers=1))
+    assert list(run_batch(households, workers=workers, chunk_size=4, store=store)) == expected
+    assert len(store) == len(all_tax_tests)
+    assert list(run_batch(households, workers=workers, chunk_size=4, store=store)) == expected
+    assert len(store) == len(all_tax_tests)
@@ -0,0 +1,79 @@
+import pytest
+from src.easyfrenchtax import TaxField, TaxInfoFlag, TaxSimulator
+from src.easyfrenchtax.solver import solve, solve_marginal_tax_rate
+
+family = {
+    TaxField.MARRIED: True,
+    TaxField.NB_CHILDREN: 2,
+    TaxField.SALARY_2_1BJ: 40000,
+}
+single = {
+    TaxField.MARRIED: False,
+    TaxField.NB_CHILDREN: 0,
+    TaxField.SALARY_1_1AJ: 90000,
+}
+
+
+def net_taxes(inputs):
+    return TaxSimulator(2022, inputs).state[TaxField.NET_TAXES]
+
+
+@pytest.mark.parametrize("target", [600, 1000, 5000.5, 20000, 60000, 200000])
+def test_solve_salary(target):
+    solution = solve(2022, family, TaxField.SALARY_1_1AJ, target)
+    salary = solution.value
+    assert net_taxes({**family, TaxField.SALARY_1_1AJ: salary}) == solution.output <= target
+    assert net_taxes({**family, TaxField.SALARY_1_1AJ: salary + 1}) > target
+    assert solution.evaluations <= 20
+
+
+
+@pytest.mark.parametrize("target", [0, 10])
+def test_solve_flat_output(target):
+    # no taxes up to the décote: flat output at the start of the bracket, the secant steps are safeguarded by bisection
+    no_salary = {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0}
+    solution = solve(2022, no_salary, TaxField.SALARY_1_1AJ, target)
+    salary = solution.value
+    assert net_taxes({**no_salary, TaxField.SALARY_1_1AJ: salary}) == solution.output <= target
+    assert net_taxes({**no_salary, TaxField.SALARY_1_1AJ: salary + 1}) > target
+    assert solution.evaluations <= 2 * 20 + 2  # 2 * log2(1000000) bisections, and the bounds
+
+def test_solve_decreasing():
+    # the more PER transfers, the less taxes: lowest transfer bringing net taxes under 10'000€
+    solution = solve(2022, single, TaxField.PER_TRANSFERS_1_6NS, 10000, high=80000)
+    assert solution == (27405, 10000, solution.evaluations)
+    assert net_taxes({**single, TaxField.PER_TRANSFERS_1_6NS: 27404}) > 10000
+    assert solution.evaluations <= 10
+
+
+def test_solve_float_tolerance():
+    solution = solve(2022, family, TaxField.SALARY_1_1AJ, 5000, low=0.0, tolerance=0.01)
+    assert net_taxes({**family, TaxField.SALARY_1_1AJ: solution.value}) <= 5000
+    assert net_taxes({**family, TaxField.SALARY_1_1AJ: solution.value + 0.01}) > 5000
+
+
+def test_solve_other_output():
+    solution = solve(2022, family, TaxField.CAPITAL_GAIN_3VG, 1000, output=TaxField.NET_SOCIAL_TAXES)
+    assert solution.value == 5819  # 9.7% + 7.5% social taxes, each rounded to the euro
+    assert TaxSimulator(2022, {**family, TaxField.CAPITAL_GAIN_3VG: 5820}).state[TaxField.NET_SOCIAL_TAXES] > 1000
+    assert solution.evaluations <= 12
+
+
+def test_solve_marginal_tax_rate():
+    solution = solve_marginal_tax_rate(2022, single, TaxField.PER_TRANSFERS_1_6NS, 0.30)
+    assert solution.value == 6455
+    assert TaxSimulator(2022, {**single, TaxField.PER_TRANSFERS_1_6NS: 6455}) \
+        .flags[TaxInfoFlag.MARGINAL_TAX_RATE] == "30%"
+    assert TaxSimulator(2022, {**single, TaxField.PER_TRANSFERS_1_6NS: 6454}) \
+        .flags[TaxInfoFlag.MARGINAL_TAX_RATE] == "41%"
+    # highest salary keeping the family at 11%
+    solution = solve_marginal_tax_rate(2022, family, TaxField.SALARY_1_1AJ, 0.11)
+    assert solution.value == 46900
+    assert solution.evaluations <= 6
+
+
+def test_solve_errors():
+    with pytest.raises(Exception, match="The target 100 is not crossed by net_taxes"):
+        solve(2022, family, TaxField.SALARY_1_1AJ, 100)
+    with pytest.raises(Exception, match="Unknown marginal tax rate 0.2"):
+        solve_marginal_tax_rate(2022, single, TaxField.PER_TRANSFERS_1_6NS, 0.2)
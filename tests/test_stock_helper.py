@@ -1,11 +1,12 @@
 from collections.abc import Callable
+from copy import deepcopy
 
 import pytest
 from src.easyfrenchtax import StockHelper
 from datetime import date
 from currency_converter import CurrencyConverter
 
-from src.easyfrenchtax.stock_helper import StockType
+from src.easyfrenchtax.stock_helper import SortedLots, StockGroup, StockType
 
 
 @pytest.fixture
@@ -208,3 +209,151 @@ def test_estimate_stock_options_exercise():
     income_tax, social_tax = stock_helper.estimate_tax(agi, {}, marginal_rate)
     assert income_tax == (16000 + 32000) * 0.9 * marginal_rate
     assert social_tax == (16000 + 32000) * (0.097 + 0.1)  # CSG / CRDS / 10% Salary contribution
+
+
+class FixedRateConverter:
+    def __init__(self, rate):
+        self.rate = rate
+        self.calls = 0
+
+    def convert(self, amount, currency, new_currency, date=None):
+        self.calls += 1
+        return amount * self.rate if currency != new_currency else amount
+
+
+def test_injected_converter():
+    converter = FixedRateConverter(0.5)
+    stock_helper = StockHelper(converter=converter)
+    stock_helper.add_espp("BUD", 200, date(2019, 1, 15), 22, "USD")
+    assert stock_helper.espp_stocks["BUD"][0].acq_price_eur == 11
+    stock_helper.sell_espp_legacy("BUD", 100, date(2021, 8, 2), sell_price=30, fees=0, currency="USD")
+    assert stock_helper.stock_sales[2021][0].sell_price_eur == 15
+    assert converter.calls == 2
+
+
+def test_shared_converter():
+    from src.easyfrenchtax import stock_helper
+    assert stock_helper.get_currency_converter() is stock_helper.get_currency_converter()
+    assert stock_helper.cc is stock_helper.get_currency_converter()
+
+
+def test_sorted_lots():
+    def lot(name, acq_date):
+        return StockGroup(count=1, available=1, acq_price=1, acq_price_eur=1, acq_date=acq_date, plan_name=name)
+
+    lots = SortedLots([lot("b", date(2020, 2, 1)), lot("a", date(2020, 1, 1))])
+    lots.add(lot("c", date(2020, 1, 15)))
+    lots.add(lot("b2", date(2020, 2, 1)))  # after the lots of the same date
+    lots.extend([lot("e", date(2021, 1, 1)), lot("d", date(2020, 12, 1))])
+    lots.extend([lot("a2", date(2020, 1, 1)), lot("a3", date(2020, 1, 1))])
+    assert [l.plan_name for l in lots] == ["a", "a2", "a3", "c", "b", "b2", "d", "e"]
+    assert lots.days == [l.acq_date.toordinal() for l in lots]
+    assert len(lots) == 8 and lots[-1].plan_name == "e" and [l.plan_name for l in lots[1:3]] == ["a2", "a3"]
+
+
+def test_bulk_acquisitions():
+    converter = FixedRateConverter(0.5)
+    vestings = [(10, date(2019, 1, 28), 23), (240, date(2018, 6, 29), 20), (10, date(2018, 7, 30), 18)]
+    one_by_one = StockHelper(converter=converter)
+    one_by_one.rsu_plan("Cake1", date(2016, 6, 28), "CAKE", "USD")
+    for count, acq_date, acq_price in vestings:
+        one_by_one.rsu_vesting("CAKE", "Cake1", count, acq_date, acq_price)
+        one_by_one.add_espp("BUD", count, acq_date, acq_price, "USD")
+    bulk = StockHelper(converter=converter)
+    bulk.rsu_plan("Cake1", date(2016, 6, 28), "CAKE", "USD")
+    bulk.rsu_vestings_bulk("CAKE", "Cake1", vestings)
+    bulk.add_espp_bulk("BUD", vestings, "USD")
+    assert list(bulk.rsus["CAKE"]) == list(one_by_one.rsus["CAKE"])
+    assert list(bulk.espp_stocks["BUD"]) == list(one_by_one.espp_stocks["BUD"])
+    assert [r.acq_date for r in bulk.rsus["CAKE"]] == sorted(v[1] for v in vestings)
+
+
+def test_bulk_acquisitions_rate_table():
+    # the rate table converts all the prices at once, with the same results
+    vestings = [(10, date(2019, 1, 28), 23), (240, date(2018, 6, 30), 20), (10, date(2018, 7, 30), 18)]
+    one_by_one = StockHelper()
+    for count, acq_date, acq_price in vestings:
+        one_by_one.add_espp("BUD", count, acq_date, acq_price, "USD")
+    bulk = StockHelper()
+    bulk.add_espp_bulk("BUD", vestings, "USD")
+    assert list(bulk.espp_stocks["BUD"]) == list(one_by_one.espp_stocks["BUD"])
+
+
+def test_lots_take():
+    def lot(count, acq_date):
+        return StockGroup(count=count, available=count, acq_price=1, acq_price_eur=1, acq_date=acq_date,
+                          plan_name="p")
+
+    lots = SortedLots([lot(10, date(2020, 1, 1)), lot(0, date(2020, 2, 1)), lot(10, date(2020, 3, 1)),
+                       lot(10, date(2020, 4, 1))])
+    assert lots.count_before(date(2020, 3, 1)) == 2
+    taken = lots.take(15, date(2020, 3, 2))
+    assert [(l.acq_date, count) for l, count in taken] == [(date(2020, 1, 1), 10), (date(2020, 3, 1), 5)]
+    assert lots.cursor == 2
+    # only stocks acquired before the date
+    assert [count for _, count in lots.take(15, date(2020, 4, 1))] == [5]
+    assert lots.cursor == 3
+    # a lot acquired earlier, added afterwards, is sold first
+    lots.add(lot(3, date(2019, 6, 1)))
+    assert lots.cursor == 0
+    assert [(l.acq_date, count) for l, count in lots.take(5, date(2021, 1, 1))] == [(date(2019, 6, 1), 3),
+                                                                                     (date(2020, 4, 1), 2)]
+    assert lots.cursor == 4
+    lots.extend([lot(1, date(2018, 1, 1))])
+    assert lots.cursor == 0
+    assert lots.take(10, date(2018, 1, 1)) == []
+    assert [count for _, count in lots.take(10, date(2021, 1, 1))] == [1, 8]
+    assert lots.cursor == len(lots)
+
+
+def test_rsu_sell_to_cover():
+    # monthly vestings, and a sale of some stocks at each one: each sale takes from the oldest lots still available
+    converter = FixedRateConverter(1)
+    stock_helper = StockHelper(converter=converter)
+    stock_helper.rsu_plan("Cake1", date(2016, 6, 28), "CAKE", "USD")
+    vest_dates = [date(2018 + m // 12, m % 12 + 1, 15) for m in range(48)]
+    stock_helper.rsu_vestings_bulk("CAKE", "Cake1", [(10, d, 20) for d in vest_dates])
+    for d in vest_dates[1:]:
+        assert stock_helper.sell_rsus_legacy("CAKE", 4, d, sell_price=25, fees=0, currency="USD") == 4
+    assert [r.available for r in stock_helper.rsus["CAKE"]] == [0] * 18 + [2] + [10] * 29
+    assert stock_helper.rsus["CAKE"].cursor == 18
+    assert [(s.acq_date, s.nb_stocks_sold) for s in stock_helper.stock_sales[2018][:4]] == [
+        (date(2018, 1, 15), 4), (date(2018, 1, 15), 4), (date(2018, 1, 15), 2), (date(2018, 2, 15), 2)]
+
+
+def test_parse_tsv_sales(tmp_path, stock_helper_with_plan):
+    # the sales of two files, out of order, are replayed chronologically, like with the legacy functions
+    (tmp_path / "2019.tsv").write_text(
+        "Symbol\tStock type\tOwner\tSell date\tCount\tSell price\tCurrency\tFees\n"
+        "CAKE\tRSU\t\t2019-06-03\t200\t22\tUSD\t0\n"
+        "BUD\tESPP\t\t03 Jun 2019\t150\t25.5\tUSD\t10\n")
+    (tmp_path / "2021.csv").write_text(
+        "Symbol,Stock type,Owner,Sell date,Count,Sell price,Currency,Fees\n"
+        "PZZA,RSU,,2021-04-01,1000,40,USD,0\n"
+        "PZZA,StockOption,1,2021-04-01,100,40,USD,0\n"
+        "CAKE,RSU,,2019-01-02,50,15,EUR,0\n")
+    replayed = deepcopy(stock_helper_with_plan)
+    replayed.sell_rsus_legacy("CAKE", 50, date(2019, 1, 2), 15, 0, "EUR")
+    replayed.sell_rsus_legacy("CAKE", 200, date(2019, 6, 3), 22, 0, "USD")
+    replayed.sell_espp_legacy("BUD", 150, date(2019, 6, 3), 25.5, 10, "USD")
+    replayed.sell_rsus_legacy("PZZA", 1000, date(2021, 4, 1), 40, 0, "USD")
+    replayed.sell_stockoptions_legacy(1, "PZZA", 100, date(2021, 4, 1), 40, 0, "USD")
+    stock_helper_with_plan.parse_tsv_sales(str(tmp_path / "*.*sv"))
+    assert stock_helper_with_plan.stock_sales == replayed.stock_sales
+    assert list(stock_helper_with_plan.rsus["CAKE"]) == list(replayed.rsus["CAKE"])
+    assert [s.nb_stocks_sold for s in stock_helper_with_plan.stock_sales[2019]] == [50, 190, 10, 150]
+
+
+def test_parse_tsv_sales_unsupported_type(tmp_path):
+    (tmp_path / "sales.tsv").write_text("Symbol\tStock type\tOwner\tSell date\tCount\tSell price\tCurrency\tFees\n"
+                                        "CAKE\tBond\t\t2019-06-03\t200\t22\tUSD\t0\n")
+    with pytest.raises(Exception, match="Unsupported stock type"):
+        StockHelper().parse_tsv_sales(str(tmp_path / "*.tsv"))
+
+
+def test_parse_tsv_sales_stock_options_without_owner(tmp_path):
+    (tmp_path / "sales.csv").write_text("Symbol,Stock type,Owner,Sell date,Count,Sell price,Currency,Fees\n"
+                                        "PZZA,RSU,,2021-04-01,1000,40,USD,0\n"
+                                        "PZZA,StockOption,,2021-04-01,100,40,USD,0\n")
+    with pytest.raises(Exception, match=r"Missing owner of the stock options sold in .*sales.csv, line 3"):
+        StockHelper().parse_tsv_sales(str(tmp_path / "*.csv"))
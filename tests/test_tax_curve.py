@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from src.easyfrenchtax import TaxField, TaxInfoFlag, TaxSimulator
+from src.easyfrenchtax.batch_simulator import BatchTaxSimulator
+from src.easyfrenchtax.tax_curve import tax_curve
+
+household = {
+    TaxField.MARRIED: True,
+    TaxField.NB_CHILDREN: 2,
+    TaxField.SALARY_2_1BJ: 40000,
+}
+
+
+def test_tax_curve_values():
+    curve = tax_curve(2022, household, TaxField.SALARY_1_1AJ, range(0, 300001, 5000))
+    assert len(curve.values) == 61
+    for i, salary in enumerate(curve.values):
+        tax_sim = TaxSimulator(2022, {**household, TaxField.SALARY_1_1AJ: salary.item()})
+        assert curve.net_taxes[i] == tax_sim.state[TaxField.NET_TAXES]
+        assert curve.net_social_taxes[i] == tax_sim.state[TaxField.NET_SOCIAL_TAXES]
+        assert f"{round(curve.marginal_tax_rates[i] * 100)}%" == tax_sim.flags[TaxInfoFlag.MARGINAL_TAX_RATE]
+
+
+def _regime(batch, kind):
+    return batch.marginal_tax_rate if kind == TaxInfoFlag.MARGINAL_TAX_RATE else batch.flags[kind].mask
+
+
+def test_tax_curve_breakpoints():
+    curve = tax_curve(2022, household, TaxField.SALARY_1_1AJ, range(0, 300001, 50000))
+    assert [(b.kind, b.value) for b in curve.breakpoints] == [
+        (TaxInfoFlag.FAMILY_QUOTIENT_CAPPING, pytest.approx(29976.157894736843)),
+        (TaxInfoFlag.MARGINAL_TAX_RATE, 46900),
+        (TaxInfoFlag.FEE_REBATE_INCOME_1, 128295),
+        (TaxInfoFlag.MARGINAL_TAX_RATE, 200464),
+    ]
+    for breakpoint in curve.breakpoints:
+        # the regime is "before" below the threshold, "after" above it
+        salaries = breakpoint.value + np.array([-1, -0.01, 0.01, 1])
+        regime = _regime(BatchTaxSimulator(2022, {**household, TaxField.SALARY_1_1AJ: salaries}), breakpoint.kind)
+        assert regime.tolist() == [breakpoint.before] * 2 + [breakpoint.after] * 2
+
+
+@pytest.mark.parametrize("field,other_field,other_value", [
+    (TaxField.SALARY_1_1AJ, TaxField.EXERCISE_GAIN_1_1TT, 0),
+    (TaxField.EXERCISE_GAIN_1_1TT, TaxField.SALARY_1_1AJ, 12345.6),
+    (TaxField.TAXABLE_ACQUISITION_GAIN_1TZ, TaxField.SALARY_1_1AJ, 20000),
+])
+def test_tax_curve_exact_breakpoints(field, other_field, other_value):
+    # the breakpoints do not depend on the samples, and match a fine sweep around each of them
+    base = {**household, other_field: other_value}
+    coarse = tax_curve(2022, base, field, [0, 500000]).breakpoints
+    assert coarse == tax_curve(2022, base, field, range(0, 500001, 1000)).breakpoints
+    assert len(coarse) >= 4
+    for breakpoint in coarse:
+        values = breakpoint.value + np.arange(-200, 201) * 0.01
+        regime = _regime(BatchTaxSimulator(2022, {**base, field: values}), breakpoint.kind)
+        assert (regime[:200] == breakpoint.before).all()
+        assert (regime[201:] == breakpoint.after).all()
+
+
+def test_tax_curve_decreasing_field():
+    # PER transfers lower the taxable income, hence the marginal tax rate
+    single = {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 60000}
+    curve = tax_curve(2022, single, TaxField.PER_TRANSFERS_1_6NS, [0, 10000, 20000, 30000])
+    assert curve.marginal_tax_rates.tolist() == [0.30, 0.30, 0.30, 0.11]
+    assert len(curve.breakpoints) == 1
+    breakpoint = curve.breakpoints[0]
+    assert (breakpoint.before, breakpoint.after) == (0.30, 0.11)
+    # 60000 - 10% = 54000 of taxable income, the 11% bracket ends at 26070
+    assert breakpoint.value == 54000 - 26070
+    assert TaxSimulator(2022, {**single, TaxField.PER_TRANSFERS_1_6NS: breakpoint.value - 0.01}) \
+        .flags[TaxInfoFlag.MARGINAL_TAX_RATE] == "30%"
+    assert TaxSimulator(2022, {**single, TaxField.PER_TRANSFERS_1_6NS: breakpoint.value}) \
+        .flags[TaxInfoFlag.MARGINAL_TAX_RATE] == "11%"
+
+
+def test_tax_curve_bisected_breakpoints():
+    # no known effect of the rental income on the taxable income: breakpoints bisected to the tolerance
+    single = {TaxField.MARRIED: False, TaxField.NB_CHILDREN: 0, TaxField.SALARY_1_1AJ: 20000}
+    curve = tax_curve(2022, single, TaxField.REAL_RENTAL_PROFIT_4BA, range(0, 40001, 10000), tolerance=1)
+    assert [(b.kind, b.value) for b in curve.breakpoints] == [(TaxInfoFlag.MARGINAL_TAX_RATE, 8071)]
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+from src.easyfrenchtax import TaxField, TaxSimulator
+from src.easyfrenchtax.batch_simulator import BatchTaxSimulator
+from src.easyfrenchtax.fixed_point import FixedPointTaxSimulator, cents_income_tax_scales
+from src.easyfrenchtax.tax_parameters import DEFAULT_PARAMETERS_FILE, Indexation, ParameterRegistry, TaxParameters, \
+    index_parameters, registry
+from src.easyfrenchtax.tax_simulator import income_tax_scales, year_tax_parameters
+
+household = {
+    TaxField.MARRIED: True,
+    TaxField.NB_CHILDREN: 2,
+    TaxField.SALARY_1_1AJ: 50000,
+    TaxField.SALARY_2_1BJ: 40000,
+}
+
+parameters_2025 = TaxParameters(family_quotient_benefices_capping=1791, slices_thresholds=[11497, 29315, 83823, 180294],
+                                slices_rates=[0.11, 0.30, 0.41, 0.45], fees_10p_deduction_ceiling=14426,
+                                fees_10p_deduction_floor=504)
+
+
+def test_declared_years():
+    assert list(year_tax_parameters) == [2021, 2022, 2023, 2024, 2025]
+    assert year_tax_parameters[2025] == parameters_2025
+    assert registry.version == 1
+
+
+def test_shared_scales():
+    assert TaxSimulator(2022, household).income_tax_scale is TaxSimulator(2022, household).income_tax_scale
+    assert TaxSimulator(2022, household).income_tax_scale is income_tax_scales[2022]
+    assert FixedPointTaxSimulator(2022, household).income_tax_scale is cents_income_tax_scales[2022]
+    assert BatchTaxSimulator(2022, household).income_tax_scale is income_tax_scales[2022]
+
+
+def test_indexation():
+    parameters_2026 = index_parameters(parameters_2025, 0.018)
+    assert parameters_2026 == TaxParameters(family_quotient_benefices_capping=1823,
+                                            slices_thresholds=[11704, 29843, 85332, 183539],
+                                            slices_rates=[0.11, 0.30, 0.41, 0.45], fees_10p_deduction_ceiling=14686,
+                                            fees_10p_deduction_floor=513)
+    assert registry.parameters(2026) == parameters_2026
+    assert registry.parameters(2028) == index_parameters(index_parameters(parameters_2026, 0.018), 0.018)
+    assert registry.parameters(2028) is registry.parameters(2028)  # computed once
+    tax_sim = TaxSimulator(2027, household)
+    assert tax_sim.parameters is registry.parameters(2027)
+    assert tax_sim.income_tax_scale is income_tax_scales[2027]
+    assert tax_sim.state[TaxField.NET_TAXES] < TaxSimulator(2025, household).state[TaxField.NET_TAXES]
+
+
+def test_indexation_rules():
+    test_registry = ParameterRegistry({2025: parameters_2025}, [Indexation(2026, 0.02, None), Indexation(2028, 0, None)])
+    assert test_registry.parameters(2027).fees_10p_deduction_floor == 524
+    assert test_registry.parameters(2029) == test_registry.parameters(2027)
+    assert test_registry.tables(lambda p: p.slices_thresholds[0])[2026] == 11727
+    with pytest.raises(Exception, match="no indexation rule from 2025 to 2026"):
+        ParameterRegistry({2025: parameters_2025}).parameters(2026)
+
+
+def test_unknown_years():
+    # no silent fallback on the parameters of another year
+    with pytest.raises(Exception, match="No tax parameters for 2020"):
+        TaxSimulator(2020, household)
+    with pytest.raises(Exception, match="No tax parameters for 2019"):
+        BatchTaxSimulator(2019, household)
+    with pytest.raises(Exception, match="no indexation rule from 2025 to 2026"):
+        ParameterRegistry({2025: parameters_2025}, [Indexation(2027, 0.01, None)]).parameters(2026)
+
+
+def test_load(tmp_path):
+    with open(DEFAULT_PARAMETERS_FILE) as f:
+        data = json.load(f)
+    path = tmp_path / "parameters.json"
+    path.write_text(json.dumps(data))
+    assert ParameterRegistry.load(path).declared == year_tax_parameters
+
+
+@pytest.mark.parametrize("change,message", [
+    (lambda data: data.pop("version"), "has no version"),
+    (lambda data: data["years"]["2022"].pop("slices_rates"), "2022 has fields"),
+    (lambda data: data["years"]["2022"].update(slices_rates=[0.11, 0.30, 0.41]), "as many income tax slices"),
+    (lambda data: data["years"]["2022"].update(slices_thresholds=[10225, 26070, 24545, 160336]), "increasing"),
+    (lambda data: data["years"]["2022"].update(slices_rates=[0.11, 0.30, 41, 0.45]), "must be in \\[0, 1\\)"),
+    (lambda data: data["years"]["2022"].update(fees_10p_deduction_floor="448"), "must be a positive number"),
+    (lambda data: data["years"]["2022"].update(fees_10p_deduction_floor=20000), "floor of 2022 is above"),
+    (lambda data: data["indexation"].append({"from_year": 2024, "rate": 0.01}), "not after the last declared year"),
+])
+def test_validation(tmp_path, change, message):
+    with open(DEFAULT_PARAMETERS_FILE) as f:
+        data = json.load(f)
+    change(data)
+    path = tmp_path / "parameters.json"
+    path.write_text(json.dumps(data))
+    with pytest.raises(Exception, match=f"Invalid tax parameters: .*{message}"):
+        ParameterRegistry.load(path)
@@ -0,0 +1,79 @@
+import pytest
+from src.easyfrenchtax import TaxField, TaxInfoFlag, TaxSimulator
+from src.easyfrenchtax.fixed_point import FixedPointTaxSimulator
+from src.easyfrenchtax.trace import Capping, FamilyQuotientCapping, IncomeTaxBracket, format_explanation
+
+household = {
+    TaxField.MARRIED: True,
+    TaxField.NB_CHILDREN: 2,
+    TaxField.SALARY_1_1AJ: 90000,
+    TaxField.SALARY_2_1BJ: 70000,
+    TaxField.HOME_SERVICES_7DB: 20000,
+}
+
+
+def test_no_trace_without_debug():
+    tax_sim = TaxSimulator(2022, household)
+    assert tax_sim.trace is None
+
+
+def test_trace_events(capsys):
+    tax_sim = TaxSimulator(2022, household, debug=True)
+    assert str(tax_sim.trace[0]) in capsys.readouterr().out
+    brackets = [e for e in tax_sim.trace if isinstance(e, IncomeTaxBracket)]
+    by_shares = {}
+    for bracket in brackets:
+        by_shares[bracket.household_shares] = by_shares.get(bracket.household_shares, 0) + bracket.tax
+    assert set(by_shares) == {2, 3}
+    capping = next(e for e in tax_sim.trace if isinstance(e, FamilyQuotientCapping))
+    assert capping.tax_with_family_quotient == pytest.approx(by_shares[3])
+    assert capping.tax_without_family_quotient == pytest.approx(by_shares[2])
+    assert tax_sim.flags[TaxInfoFlag.FAMILY_QUOTIENT_CAPPING] == f"tax += {round(capping.additional_taxes, 2)}€"
+    assert tax_sim.state[TaxField.SIMPLE_TAX_RIGHT] == round(by_shares[2] - capping.capping)
+    home_services = next(e for e in tax_sim.trace if isinstance(e, Capping) and e.item == "HOME_SERVICES")
+    assert home_services == Capping("compute_tax_credits", "HOME_SERVICES", 20000, None, 15000, 15000)
+    assert tax_sim.state[TaxField.HOME_SERVICES_TAXCREDIT] == home_services.retained * 0.5
+
+
+def test_trace_update():
+    tax_sim = TaxSimulator(2022, household, debug=True)
+    tax_sim.update({TaxField.HOME_SERVICES_7DB: 10000})
+    home_services = [e for e in tax_sim.trace if isinstance(e, Capping) and e.item == "HOME_SERVICES"]
+    assert home_services == [Capping("compute_tax_credits", "HOME_SERVICES", 10000, None, 15000, 10000)]
+
+
+def test_fixed_point_trace():
+    # the same events as the float simulator, with amounts in cents
+    tax_sim = FixedPointTaxSimulator(2022, household, debug=True)
+    reference = TaxSimulator(2022, household, debug=True).trace
+    assert [(type(e), e.stage) for e in tax_sim.trace] == [(type(e), e.stage) for e in reference]
+    for event, reference_event in zip(tax_sim.trace, reference):
+        if isinstance(event, Capping):
+            assert event.item == reference_event.item
+            assert event.retained == pytest.approx(reference_event.retained * 100, abs=1)
+    home_services = next(e for e in tax_sim.trace if isinstance(e, Capping) and e.item == "HOME_SERVICES")
+    assert home_services == Capping("compute_tax_credits", "HOME_SERVICES", 2000000, None, 1500000, 1500000)
+    capping = next(e for e in tax_sim.trace if isinstance(e, FamilyQuotientCapping))
+    assert tax_sim.flag_value(TaxInfoFlag.FAMILY_QUOTIENT_CAPPING).value == capping.additional_taxes
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_explain(lazy):
+    tax_sim = TaxSimulator(2022, household, debug=True, lazy=lazy)
+    explanation = tax_sim.explain(TaxField.NET_TAXES)
+    assert explanation.value == tax_sim.state[TaxField.NET_TAXES]
+    assert explanation.stage == "compute_net_taxes"
+    assert [e.item for e in explanation.events] == ["GLOBAL_FISCAL_ADVANTAGES"]
+    inputs = set()
+
+    def collect(e):
+        if e.stage is None:
+            inputs.add(e.field)
+        for source in e.sources:
+            collect(source)
+
+    collect(explanation)
+    assert {TaxField.SALARY_1_1AJ, TaxField.SALARY_2_1BJ, TaxField.HOME_SERVICES_7DB} <= inputs
+    text = format_explanation(explanation)
+    assert text.startswith(f"NET_TAXES = {tax_sim.state[TaxField.NET_TAXES]}  (compute_net_taxes)")
+    assert "SALARY_1_1AJ = 90000  (input)" in text